@@ -161,3 +161,17 @@ class APIManager:
             return func
 
         return decorator
+
+    def websocket(self, path: str, **kwargs):
+        def decorator(func):
+            if self.is_excluded(path):
+                return func
+
+            self.app.websocket(path, **kwargs)(func)
+
+            self.registered_apis[path] = func
+            self.logger.info(f"Registered API: WEBSOCKET {path}")
+
+            return func
+
+        return decorator
@@ -3,6 +3,7 @@ from fastapi import HTTPException
 from modules.api import utils as api_utils
 from modules.api.Api import APIManager
 from modules.core.models import zoo
+from modules.core.models.tts.InferCache import InferCache
 
 
 def setup(app: APIManager):
@@ -25,3 +26,22 @@ def setup(app: APIManager):
     async def unload_models():
         model_ids = zoo.model_zoo.get_model_ids()
         return api_utils.success_response(model_ids)
+
+    @app.get(
+        "/v1/models/cache/stats",
+        response_model=api_utils.BaseResponse,
+        tags=["Models"],
+        description="Get size, hit rate and eviction stats of the infer cache",
+    )
+    async def get_cache_stats():
+        return api_utils.success_response(InferCache.stats())
+
+    @app.get(
+        "/v1/models/cache/clear",
+        response_model=api_utils.BaseResponse,
+        tags=["Models"],
+        description="Clear the in-memory infer cache",
+    )
+    async def clear_cache():
+        InferCache.clear()
+        return api_utils.success_response("Infer cache cleared")
@@ -1,11 +1,8 @@
-import io
 from typing import List, Optional
 
-import numpy as np
 from fastapi import Body, File, Form, HTTPException, Request, UploadFile
 from numpy import clip
 from pydantic import BaseModel, Field
-from pydub import AudioSegment
 
 from modules.api import utils as api_utils
 from modules.api.Api import APIManager
@@ -19,6 +16,7 @@ from modules.core.handler.datacls.enhancer_model import EnhancerConfig
 from modules.core.handler.datacls.stt_model import STTConfig, STTOutputFormat
 from modules.core.handler.datacls.tts_model import InferConfig, TTSConfig
 from modules.core.handler.datacls.vc_model import VCConfig
+from modules.core.handler.encoder.StreamDecoder import AudioDecodeError
 from modules.core.handler.STTHandler import STTHandler
 from modules.core.handler.TTSHandler import TTSHandler
 from modules.core.spk.SpkMgr import spk_mgr
@@ -194,16 +192,6 @@ openai api document:
         tags=["OpenAI API"],
     )(openai_speech_api)
 
-    def pydub_to_numpy(audio_segment: AudioSegment) -> np.ndarray:
-        raw_data = audio_segment.raw_data
-        sample_width = audio_segment.sample_width
-        channels = audio_segment.channels
-        audio_data = np.frombuffer(raw_data, dtype=np.int16)
-        if channels > 1:
-            audio_data = audio_data.reshape((-1, channels))
-            audio_data = audio_data.mean(axis=1).astype(np.int16)
-        return audio_data
-
     @app.post(
         "/v1/audio/transcriptions",
         # NOTE: 其实最好是不设置这个model...因为这个接口可以返回很多情况...
@@ -227,14 +215,6 @@ openai api document:
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid response format.")
 
-        audio_bytes = await file.read()
-        audio_segment: AudioSegment = AudioSegment.from_file(io.BytesIO(audio_bytes))
-
-        sample_rate = audio_segment.frame_rate
-        samples = pydub_to_numpy(audio_segment=audio_segment)
-
-        input_audio = (sample_rate, samples)
-
         sst_config = STTConfig(
             mid=model,
             prompt=prompt,
@@ -244,10 +224,15 @@ openai api document:
         )
 
         try:
-            handler = STTHandler(input_audio=input_audio, stt_config=sst_config)
+            handler = STTHandler(input_audio=None, stt_config=sst_config)
 
-            result = await handler.enqueue()
+            result = await handler.enqueue_upload(file)
             return {"text": result.text}
+        except AudioDecodeError as e:
+            import logging
+
+            logging.exception(e)
+            raise HTTPException(status_code=400, detail=f"Invalid audio file: {e}")
         except Exception as e:
             import logging
 
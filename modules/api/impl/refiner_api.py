@@ -120,6 +120,15 @@ async def text_normalize_post(request: TextNormalizeRequest):
             raise HTTPException(status_code=500, detail=str(e))
 
 
+async def text_normalize_stats():
+    """
+    每个 TN pipeline 的缓存命中情况和各个 block 的耗时
+    """
+    return api_utils.success_response(
+        data={pipe_id: pipe.stats() for pipe_id, pipe in pipelines.items()}
+    )
+
+
 def setup(app: APIManager):
     app.post(
         "/v1/prompt/refine",
@@ -164,3 +173,10 @@ This endpoint supports different TN implementations to perform text normalizatio
 A normalized version of the input text, suitable for use in speech synthesis or downstream NLP tasks.
 """,
     )(text_normalize_post)
+
+    app.get(
+        "/v1/text/normalize/stats",
+        response_model=api_utils.BaseResponse,
+        tags=["Text"],
+        description="Cache hit rate and per-block timings of each TN pipeline.",
+    )(text_normalize_stats)
@@ -1,3 +1,5 @@
+import asyncio
+import logging
 from typing import Optional
 import torch
 from fastapi import Depends, HTTPException, Query, Request
@@ -5,6 +7,8 @@ from pydantic import BaseModel
 
 from modules.api import utils as api_utils
 from modules.api.Api import APIManager
+from modules.core.models import zoo
+from modules.core.models.SpkConditionCache import SpkConditionCache
 from modules.core.models.tts import ChatTtsModel
 from modules.core.spk.SpkMgr import spk_mgr
 from modules.core.spk.TTSSpeaker import TTSSpeaker
@@ -42,6 +46,12 @@ class SpeakersUpdate(BaseModel):
     speakers: list[dict]
 
 
+class SpeakersPrebake(BaseModel):
+    model_ids: list[str]
+    # 为空时处理所有 speaker
+    speaker_ids: Optional[list[str]] = None
+
+
 class SpkListParams(BaseModel):
     detailed: bool = Query(False, description="Return all detailed big data")
 
@@ -227,3 +237,56 @@ Fetch metadata of a specific speaker by ID.
         return api_utils.success_response(
             speaker.to_json(just_info=not request.with_emb)
         )
+
+    @app.post(
+        "/v1/speakers/prebake",
+        response_model=api_utils.BaseResponse,
+        tags=["Speaker"],
+        description="""
+Precompute the reference-audio conditioning (speaker embedding, prompt tokens, etc.) of speakers for the given models.
+
+- `model_ids`: Models to prebake for, they will be loaded if needed.
+- `speaker_ids`: Speakers to prebake, all speakers if empty.
+
+Results are kept in memory, and persisted when `--spk_cond_cache_dir` is set, so the first request of a cloned voice does not pay for it.
+""",
+    )
+    async def prebake_speakers(request: SpeakersPrebake):
+        models = []
+        for model_id in request.model_ids:
+            model = zoo.model_zoo.models.get(model_id)
+            if model is None:
+                raise HTTPException(
+                    status_code=404, detail=f"Model not found: {model_id}"
+                )
+            models.append(model)
+
+        if request.speaker_ids:
+            spks = [spk_mgr.get_speaker_by_id(id) for id in request.speaker_ids]
+            missing = [
+                id for id, spk in zip(request.speaker_ids, spks) if spk is None
+            ]
+            if missing:
+                raise HTTPException(
+                    status_code=404, detail=f"Speaker not found: {missing}"
+                )
+        else:
+            spks = spk_mgr.list_speakers()
+
+        def prebake():
+            result = {}
+            for model in models:
+                result[model.model_id] = {
+                    spk.id: model.prebake_spk(spk) for spk in spks if spk.has_refs
+                }
+            return result
+
+        try:
+            # NOTE: 计算特征需要跑模型，放到线程中避免阻塞 event loop
+            result = await asyncio.to_thread(prebake)
+        except Exception as e:
+            logging.exception(e)
+            raise HTTPException(status_code=500, detail=str(e))
+        return api_utils.success_response(
+            dict(prebaked=result, stats=SpkConditionCache.stats())
+        )
@@ -1,14 +1,29 @@
-import io
-from typing import Optional
+import dataclasses
+import json
+import logging
+from typing import AsyncIterable, Literal, Optional
 
 import numpy as np
-from fastapi import Depends, File, Form, HTTPException, UploadFile
+from fastapi import (
+    Depends,
+    File,
+    Form,
+    HTTPException,
+    Query,
+    Request,
+    UploadFile,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.responses import StreamingResponse
+from faster_whisper.vad import VadOptions
 from pydantic import BaseModel
-from pydub import AudioSegment
+from starlette.types import Receive, Scope, Send
 
 from modules.api import utils as api_utils
 from modules.api.Api import APIManager
 from modules.core.handler.datacls.stt_model import STTConfig, STTOutputFormat
+from modules.core.handler.encoder.StreamDecoder import AudioDecodeError
 from modules.core.handler.STTHandler import STTHandler
 
 
@@ -75,6 +90,130 @@ class TranscriptionsForm(BaseModel):
         )
 
 
+class StreamTranscriptionsParams(BaseModel):
+    model: str = "whisper.large"
+
+    prompt: Optional[str] = None
+    prefix: Optional[str] = None
+    language: Optional[str] = None
+    temperature: Optional[float] = None
+    beam_size: Optional[int] = None
+
+    # 输入的 PCM 格式，单声道
+    sample_rate: int = 16000
+    encoding: Literal["s16le", "f32le"] = "s16le"
+
+    @classmethod
+    def as_query(
+        cls,
+        model: str = Query("whisper.large"),
+        prompt: Optional[str] = Query(None),
+        prefix: Optional[str] = Query(None),
+        language: Optional[str] = Query(None),
+        temperature: Optional[float] = Query(None),
+        beam_size: Optional[int] = Query(None),
+        sample_rate: int = Query(16000, gt=0),
+        encoding: Literal["s16le", "f32le"] = Query("s16le"),
+    ):
+        return cls(
+            model=model,
+            prompt=prompt,
+            prefix=prefix,
+            language=language,
+            temperature=temperature,
+            beam_size=beam_size,
+            sample_rate=sample_rate,
+            encoding=encoding,
+        )
+
+    def to_stt_config(self) -> STTConfig:
+        return STTConfig(
+            mid=self.model,
+            prompt=self.prompt,
+            prefix=self.prefix,
+            language=self.language,
+            temperature=self.temperature,
+            beam_size=self.beam_size,
+            # 流式识别不支持文稿匹配
+            refrence_transcript="",
+        )
+
+
+def ws_close_reason(e: Exception) -> str:
+    """
+    websocket 关闭帧的 reason 最多 123 字节
+    """
+    return str(e).encode("utf-8")[:123].decode("utf-8", errors="ignore")
+
+
+async def decode_pcm_frames(
+    chunks: AsyncIterable[bytes], encoding: str
+) -> AsyncIterable[np.ndarray]:
+    """
+    把 PCM 字节流转为 float32 音频帧，chunk 边界不一定对齐采样点，多出来的字节留给下一个 chunk
+    """
+    dtype = np.int16 if encoding == "s16le" else np.float32
+    width = np.dtype(dtype).itemsize
+    remainder = b""
+    async for chunk in chunks:
+        data = remainder + chunk
+        size = len(data) - len(data) % width
+        remainder = data[size:]
+        if size == 0:
+            continue
+        frame = np.frombuffer(data[:size], dtype="<" + np.dtype(dtype).str[1:])
+        if dtype == np.int16:
+            frame = frame.astype(np.float32) / np.iinfo(np.int16).max
+        yield frame
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse 发送响应时会同时 receive 监听客户端断开，会把还没读取的请求体消息丢掉
+
+    这里边读请求体边发送响应，所以只发送，客户端断开会在读取请求体时以 ClientDisconnect 抛出
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+class VadForm(BaseModel):
+    file: UploadFile
+
+    threshold: float = 0.5
+    min_silence_duration_ms: int = 2000
+    speech_pad_ms: int = 400
+    max_speech_duration_s: float = 30.0
+
+    @classmethod
+    def as_form(
+        cls,
+        file: UploadFile = File(...),
+        threshold: float = Form(0.5),
+        min_silence_duration_ms: int = Form(2000),
+        speech_pad_ms: int = Form(400),
+        max_speech_duration_s: float = Form(30.0, gt=0, le=600),
+    ):
+        return cls(
+            file=file,
+            threshold=threshold,
+            min_silence_duration_ms=min_silence_duration_ms,
+            speech_pad_ms=speech_pad_ms,
+            max_speech_duration_s=max_speech_duration_s,
+        )
+
+    def to_vad_options(self) -> VadOptions:
+        return VadOptions(
+            threshold=self.threshold,
+            min_silence_duration_ms=self.min_silence_duration_ms,
+            speech_pad_ms=self.speech_pad_ms,
+            max_speech_duration_s=self.max_speech_duration_s,
+        )
+
+
 class TranscriptionsResponseData(BaseModel):
     text: str
     segments: list
@@ -88,16 +227,6 @@ class TranscriptionsResponse(BaseModel):
 
 def setup(app: APIManager):
 
-    def pydub_to_numpy(audio_segment: AudioSegment) -> np.ndarray:
-        raw_data = audio_segment.raw_data
-        sample_width = audio_segment.sample_width
-        channels = audio_segment.channels
-        audio_data = np.frombuffer(raw_data, dtype=np.int16)
-        if channels > 1:
-            audio_data = audio_data.reshape((-1, channels))
-            audio_data = audio_data.mean(axis=1).astype(np.int16)
-        return audio_data
-
     @app.post(
         "/v1/stt/transcribe",
         response_model=TranscriptionsResponse,
@@ -130,14 +259,6 @@ Transcribes audio into the input language.
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid response format.")
 
-        audio_bytes = await file.read()
-        audio_segment: AudioSegment = AudioSegment.from_file(io.BytesIO(audio_bytes))
-
-        sample_rate = audio_segment.frame_rate
-        samples = pydub_to_numpy(audio_segment=audio_segment)
-
-        input_audio = (sample_rate, samples)
-
         sst_config = STTConfig(
             mid=model,
             prompt=prompt,
@@ -156,13 +277,15 @@ Transcribes audio into the input language.
         )
 
         try:
-            handler = STTHandler(input_audio=input_audio, stt_config=sst_config)
+            handler = STTHandler(input_audio=None, stt_config=sst_config)
 
-            result = await handler.enqueue()
+            # 上传的文件边读取边解码识别，不会一次性读入内存
+            result = await handler.enqueue_upload(file)
             return api_utils.success_response(result.__dict__)
+        except AudioDecodeError as e:
+            logging.exception(e)
+            raise HTTPException(status_code=400, detail=f"Invalid audio file: {e}")
         except Exception as e:
-            import logging
-
             logging.exception(e)
 
             if isinstance(e, HTTPException):
@@ -170,16 +293,108 @@ Transcribes audio into the input language.
             else:
                 raise HTTPException(status_code=500, detail=str(e))
 
+    @app.post(
+        "/v1/stt/vad",
+        tags=["STT"],
+        description="""
+Detects speech regions in the audio without transcribing it.
+
+Returns the audio `duration` and the speech `regions` (`start` / `end` in seconds).
+Speech longer than `max_speech_duration_s` is split into several regions.
+Results are cached by audio content, so repeated requests for the same audio are cheap.
+""",
+    )
+    async def detect_speech(form_data: VadForm = Depends(VadForm.as_form)):
+        try:
+            duration, regions = await STTHandler.detect_speech(
+                form_data.file, vad_options=form_data.to_vad_options()
+            )
+        except AudioDecodeError as e:
+            logging.exception(e)
+            raise HTTPException(status_code=400, detail=f"Invalid audio file: {e}")
+        except Exception as e:
+            logging.exception(e)
+            raise HTTPException(status_code=500, detail=str(e))
+
+        return api_utils.success_response(
+            data={
+                "duration": duration,
+                "regions": [dataclasses.asdict(region) for region in regions],
+            }
+        )
+
     @app.post(
         "/v1/stt/stream",
         tags=["STT"],
+        response_class=DuplexStreamingResponse,
         description="""
 Transcribes audio into the input language in real-time.
 
-* Not implemented yet (WIP)
+The request body is raw mono PCM (`encoding` and `sample_rate` query params) sent with chunked transfer encoding.
+The response is newline-delimited JSON events:
+
+* `{"type": "partial", "segments": [...]}`: hypothesis of the sentence being spoken, replaced by later events
+* `{"type": "final", "segments": [...]}`: finalized segments with word timings
 """,
     )
     async def transcribe_stream(
-        form_data: TranscriptionsForm = Depends(TranscriptionsForm.as_form),
+        request: Request,
+        params: StreamTranscriptionsParams = Depends(
+            StreamTranscriptionsParams.as_query
+        ),
+    ):
+        try:
+            handler = STTHandler(input_audio=None, stt_config=params.to_stt_config())
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        async def generate():
+            frames = decode_pcm_frames(request.stream(), params.encoding)
+            async for event in handler.enqueue_stream(
+                frames=frames, sample_rate=params.sample_rate
+            ):
+                yield json.dumps(dataclasses.asdict(event), ensure_ascii=False) + "\n"
+
+        return DuplexStreamingResponse(generate(), media_type="application/x-ndjson")
+
+    @app.websocket("/v1/stt/stream")
+    async def transcribe_stream_ws(
+        websocket: WebSocket,
+        params: StreamTranscriptionsParams = Depends(
+            StreamTranscriptionsParams.as_query
+        ),
     ):
-        raise HTTPException(status_code=501, detail="Not implemented")
+        """
+        客户端发送二进制 PCM 帧，发送文本 "EOS" 表示输入结束
+
+        服务端每产生一个事件就发送一条 json ，输入结束后发送完剩下的 final 事件再关闭连接
+        """
+        await websocket.accept()
+        try:
+            handler = STTHandler(input_audio=None, stt_config=params.to_stt_config())
+        except Exception as e:
+            await websocket.close(code=1008, reason=ws_close_reason(e))
+            return
+
+        async def receive_chunks():
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(message.get("code", 1000))
+                if message.get("bytes"):
+                    yield message["bytes"]
+                elif message.get("text") == "EOS":
+                    return
+
+        try:
+            frames = decode_pcm_frames(receive_chunks(), params.encoding)
+            async for event in handler.enqueue_stream(
+                frames=frames, sample_rate=params.sample_rate
+            ):
+                await websocket.send_json(dataclasses.asdict(event))
+            await websocket.close()
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            logging.exception(e)
+            await websocket.close(code=1011, reason=ws_close_reason(e))
@@ -19,9 +19,14 @@ from modules.core.handler.encoder.encoders import (
     RawEncoder,
     WavEncoder,
 )
+from modules.core.handler.encoder.InProcessEncoder import (
+    InProcessFlacEncoder,
+    InProcessWavEncoder,
+)
 from modules.core.handler.encoder.StreamEncoder import StreamEncoder
 from modules.core.handler.encoder.WavFile import WAVFileBytes
 from modules.core.pipeline.processor import NP_AUDIO
+from modules.utils import audio_utils
 
 logger = logging.getLogger(__name__)
 # logger.setLevel(logging.DEBUG)
@@ -33,9 +38,9 @@ def remove_wav_bytes_header(wav_bytes: bytes):
 
 
 def covert_to_s16le(audio_data: np.ndarray) -> bytes:
-    audio_data: np.ndarray = audio_data / np.max(np.abs(audio_data))
-    audio_data = (audio_data * 32767).astype(np.int16)
-    return audio_data.tobytes()
+    # NOTE: 不再按每个 chunk 自己的峰值缩放（流式时会导致音量忽大忽小），
+    #   响度由后处理的 normalizer / limiter 决定，这里只截断超出范围的部分
+    return audio_utils.float_to_int16(audio_data).tobytes()
 
 
 class AudioHandler:
@@ -80,12 +85,20 @@ class AudioHandler:
         bitrate = encoder_config.bitrate or None
         acodec = encoder_config.acodec or None
 
+        # NOTE: wav / flac / raw 在进程内编码，不需要启动 ffmpeg ，
+        #   指定了其他 acodec 时才回退到 ffmpeg
         if format == AudioFormat.wav:
-            encoder = WavEncoder()
+            if InProcessWavEncoder.supports(acodec):
+                encoder = InProcessWavEncoder()
+            else:
+                encoder = WavEncoder()
         elif format == AudioFormat.mp3:
             encoder = Mp3Encoder()
         elif format == AudioFormat.flac:
-            encoder = FlacEncoder()
+            if InProcessFlacEncoder.supports(acodec):
+                encoder = InProcessFlacEncoder()
+            else:
+                encoder = FlacEncoder()
         # OGG 和 ACC 编码有问题，不知道为啥
         # FIXME: BrokenPipeError: [Errno 32] Broken pipe
         elif format == AudioFormat.acc:
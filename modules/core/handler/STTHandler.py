@@ -1,15 +1,40 @@
-from typing import AsyncGenerator, Generator
+import asyncio
+import hashlib
+import os
+import tempfile
+from typing import (
+    AsyncGenerator,
+    AsyncIterable,
+    Awaitable,
+    Callable,
+    Generator,
+    Iterator,
+    Optional,
+    TypeVar,
+)
+
+import numpy as np
+from fastapi import UploadFile
+from faster_whisper.vad import VadOptions
 
 from modules.core.handler.datacls.stt_model import STTConfig
+from modules.core.handler.encoder.StreamDecoder import AudioDecodeError, StreamDecoder
 from modules.core.models.stt.STTChunker import STTChunker
 from modules.core.models.stt.STTModel import STTModel, TranscribeResult
+from modules.core.models.stt.STTStreamer import STTStreamer, STTStreamEvent
+from modules.core.models.stt.VadCache import SpeechRegion, VadCache
 from modules.core.models.zoo.ModelZoo import model_zoo
 from modules.core.pipeline.processor import NP_AUDIO
 
+T = TypeVar("T")
+
 
 class STTHandler:
 
-    def __init__(self, input_audio: NP_AUDIO, stt_config: STTConfig) -> None:
+    # 每次从上传文件读取的字节数
+    upload_chunk_size = 1 << 20
+
+    def __init__(self, input_audio: Optional[NP_AUDIO], stt_config: STTConfig) -> None:
         assert isinstance(stt_config, STTConfig), "stt_config must be STTConfig"
 
         self.input_audio = input_audio
@@ -31,11 +56,202 @@ class STTHandler:
         raise Exception(f"Model {model_id} is not supported")
 
     async def enqueue(self) -> str:
-        result = self.chunker.transcribe(audio=self.input_audio, config=self.stt_config)
+        # 在线程中识别，不阻塞事件循环，并发的请求可以使用不同的模型副本
+        result = await asyncio.to_thread(
+            self.chunker.transcribe, audio=self.input_audio, config=self.stt_config
+        )
         # result = self.model.transcribe(audio=self.input_audio, config=self.stt_config)
         return result
 
-    async def enqueue_stream(self) -> AsyncGenerator[str, None]:
-        raise NotImplementedError(
-            "Method 'enqueue_stream' must be implemented by subclass"
+    async def enqueue_encoded(self, chunks: AsyncIterable[bytes]) -> TranscribeResult:
+        """
+        chunks 为任意格式的音频文件内容，边接收边用 ffmpeg 解码为 16k 单声道 float32 ，
+        解码出来的音频直接交给 chunker 增量切分和识别，不会在内存中保留完整的音频
+        """
+        return await self.decode_encoded(chunks, self.transcribe_frames)
+
+    async def enqueue_file(self, path: str) -> TranscribeResult:
+        return await self.decode_file(path, self.transcribe_frames)
+
+    async def enqueue_upload(self, file: UploadFile) -> TranscribeResult:
+        """
+        vad 结果按上传文件内容的摘要缓存，同一个文件再次识别时直接按缓存的语音段落切分
+        """
+        key = await self.get_upload_key(file, STTChunker.get_vad_options())
+
+        def transcribe(frames: Iterator[np.ndarray]) -> TranscribeResult:
+            return self.chunker.transcribe_frames(
+                frames, self.stt_config, cache_key=key
+            )
+
+        return await self.decode_upload(file, transcribe)
+
+    def transcribe_frames(self, frames: Iterator[np.ndarray]) -> TranscribeResult:
+        return self.chunker.transcribe_frames(frames, self.stt_config)
+
+    @classmethod
+    async def get_upload_key(
+        cls, file: UploadFile, vad_options: VadOptions
+    ) -> tuple[str, str, str]:
+        """
+        上传文件的 VadCache key ，读完文件之后回到开头
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        while chunk := await file.read(cls.upload_chunk_size):
+            digest.update(chunk)
+        await file.seek(0)
+        return ("upload", digest.hexdigest(), repr(vad_options))
+
+    @classmethod
+    async def detect_speech(
+        cls, file: UploadFile, vad_options: VadOptions
+    ) -> tuple[float, list[SpeechRegion]]:
+        """
+        只做 vad ，返回 (音频时长, 语音段落)
+
+        结果按上传文件内容的摘要缓存，未命中时边解码边做 vad ，不会在内存中保留完整的音频
+        """
+        key = await cls.get_upload_key(file, vad_options)
+        cached = VadCache.get(key)
+        if cached is not None:
+            duration, regions = cached
+            return duration, list(regions)
+
+        def detect(frames: Iterator[np.ndarray]):
+            received = 0
+
+            def count(frames: Iterator[np.ndarray]):
+                nonlocal received
+                for frame in frames:
+                    received += len(frame)
+                    yield frame
+
+            regions = list(VadCache.iter_speech_regions(count(frames), vad_options))
+            return received / VadCache.SAMPLE_RATE, regions
+
+        duration, regions = await cls.decode_upload(file, detect)
+        VadCache.put(key, (duration, tuple(regions)))
+        return duration, regions
+
+    @classmethod
+    async def decode_encoded(
+        cls, chunks: AsyncIterable[bytes], consume: Callable[[Iterator[np.ndarray]], T]
+    ) -> T:
+        """
+        边接收 chunks 边解码，consume 在线程中读取解码出来的音频帧
+        """
+        decoder = StreamDecoder(sample_rate=STTChunker.STREAM_SAMPLE_RATE)
+        decoder.open()
+
+        async def feed():
+            try:
+                async for chunk in chunks:
+                    await asyncio.to_thread(decoder.write, chunk)
+            except AudioDecodeError:
+                # ffmpeg 提前退出，具体的错误由 iter_frames 抛出
+                pass
+            finally:
+                decoder.close_input()
+
+        return await cls.consume_decoded(decoder, feed(), consume)
+
+    @classmethod
+    async def decode_file(
+        cls, path: str, consume: Callable[[Iterator[np.ndarray]], T]
+    ) -> T:
+        decoder = StreamDecoder(sample_rate=STTChunker.STREAM_SAMPLE_RATE)
+        decoder.open(input=path)
+        return await cls.consume_decoded(decoder, None, consume)
+
+    @classmethod
+    async def consume_decoded(
+        cls,
+        decoder: StreamDecoder,
+        feed: Optional[Awaitable],
+        consume: Callable[[Iterator[np.ndarray]], T],
+    ) -> T:
+        consuming = asyncio.ensure_future(
+            asyncio.to_thread(consume, decoder.iter_frames())
+        )
+        # 处理出错时结束 ffmpeg ，否则 feed 会一直阻塞在写入上
+        consuming.add_done_callback(lambda _: decoder.terminate())
+        try:
+            if feed is not None:
+                await feed
+            return await consuming
+        finally:
+            decoder.terminate()
+
+    @classmethod
+    async def decode_upload(
+        cls, file: UploadFile, consume: Callable[[Iterator[np.ndarray]], T]
+    ) -> T:
+        async def read_upload():
+            while chunk := await file.read(cls.upload_chunk_size):
+                yield chunk
+
+        try:
+            return await cls.decode_encoded(read_upload(), consume)
+        except AudioDecodeError as e:
+            if e.decoded > 0:
+                raise e
+
+        # mp4 / m4a 等格式的索引可能在文件末尾，无法从管道解码，写入临时文件之后再解码
+        await file.seek(0)
+        suffix = os.path.splitext(file.filename or "")[1]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, f"input{suffix}")
+            with open(path, "wb") as f:
+                async for chunk in read_upload():
+                    f.write(chunk)
+            return await cls.decode_file(path, consume)
+
+    async def enqueue_stream(
+        self,
+        frames: AsyncIterable[np.ndarray],
+        sample_rate: int = STTStreamer.SAMPLE_RATE,
+    ) -> AsyncGenerator[STTStreamEvent, None]:
+        """
+        frames 为单声道 float32 音频帧，vad 和识别在线程中进行，不阻塞事件循环
+
+        NOTE: 识别期间继续接收音频帧，识别跟不上输入时，积压的帧合并成一次 feed ，
+        这样 partial 不会排队，每次只识别最新的音频
+        """
+        streamer = STTStreamer(
+            model=self.model, config=self.stt_config, sample_rate=sample_rate
         )
+        # 音频帧，None 表示输入结束，Exception 表示接收时出错
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def receive() -> None:
+            try:
+                async for frame in frames:
+                    queue.put_nowait(frame)
+                queue.put_nowait(None)
+            except Exception as e:
+                queue.put_nowait(e)
+
+        receiver = asyncio.create_task(receive())
+        try:
+            ended = False
+            while not ended:
+                items = [await queue.get()]
+                while not queue.empty():
+                    items.append(queue.get_nowait())
+                pending: list[np.ndarray] = []
+                for item in items:
+                    if isinstance(item, Exception):
+                        raise item
+                    if item is None:
+                        ended = True
+                        break
+                    pending.append(item)
+                if len(pending) == 0:
+                    continue
+                frame = np.concatenate(pending)
+                for event in await asyncio.to_thread(streamer.feed, frame):
+                    yield event
+            for event in await asyncio.to_thread(streamer.flush):
+                yield event
+        finally:
+            receiver.cancel()
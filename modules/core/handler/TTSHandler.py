@@ -97,8 +97,7 @@ class TTSHandler(AudioHandler):
         return ctx
 
     def interrupt(self):
-        self.ctx.stop = True
-        self.pipeline.model.interrupt()
+        self.pipeline.interrupt()
 
     def get_sample_rate(self):
         return self.pipeline.model.get_sample_rate()
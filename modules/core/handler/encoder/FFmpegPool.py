@@ -0,0 +1,98 @@
+import atexit
+import logging
+import subprocess
+import threading
+
+from modules import config
+
+logger = logging.getLogger(__name__)
+
+
+class FFmpegPool:
+    """
+    预先启动的 ffmpeg 编码进程池
+
+    一个 ffmpeg 进程只能编码一个音频（stdin 关闭即结束），所以这里不是复用进程，
+    而是在取走一个进程之后，后台立即按相同参数再启动一个，下一个请求拿到的就是已经初始化好的进程，
+    不需要等待 ffmpeg 启动和编码器初始化
+
+    key 就是完整的 ffmpeg 参数，也就是 (format, acodec, bitrate, sample_rate, channels ...)
+    每个 key 最多保留 encoder_pool_size 个空闲进程，为 0 时不预启动
+    """
+
+    idle: dict[tuple[str, ...], list[subprocess.Popen]] = {}
+    refilling: set[tuple[str, ...]] = set()
+    lock = threading.Lock()
+
+    @classmethod
+    def get_size(cls) -> int:
+        size = config.runtime_env_vars.encoder_pool_size
+        return 1 if size is None else max(0, int(size))
+
+    @classmethod
+    def spawn(cls, args: list[str]) -> subprocess.Popen:
+        return subprocess.Popen(
+            args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            # NOTE: 这里设置为0可以低延迟解码，但是容易阻塞影响ffmpeg效率，所以最好还是设置上，因为编码相较于生成其实多不了多少时间
+            bufsize=65536,
+        )
+
+    @classmethod
+    def acquire(cls, args: list[str]) -> subprocess.Popen:
+        key = tuple(args)
+        p = None
+        with cls.lock:
+            procs = cls.idle.get(key, [])
+            while procs:
+                candidate = procs.pop()
+                if candidate.poll() is None:
+                    p = candidate
+                    break
+        if p is None:
+            p = cls.spawn(args)
+        cls.refill(key)
+        return p
+
+    @classmethod
+    def refill(cls, key: tuple[str, ...]) -> None:
+        size = cls.get_size()
+        if size <= 0:
+            return
+        with cls.lock:
+            if key in cls.refilling:
+                return
+            cls.refilling.add(key)
+
+        def run():
+            try:
+                while True:
+                    with cls.lock:
+                        procs = cls.idle.setdefault(key, [])
+                        procs[:] = [p for p in procs if p.poll() is None]
+                        if len(procs) >= size:
+                            return
+                    p = cls.spawn(list(key))
+                    with cls.lock:
+                        cls.idle[key].append(p)
+            except Exception as e:
+                logger.warning(f"Failed to pre-start ffmpeg encoder: {e}")
+            finally:
+                with cls.lock:
+                    cls.refilling.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    @classmethod
+    def shutdown(cls) -> None:
+        with cls.lock:
+            procs = [p for procs in cls.idle.values() for p in procs]
+            cls.idle.clear()
+        for p in procs:
+            if p.poll() is None:
+                p.kill()
+
+
+atexit.register(FFmpegPool.shutdown)
@@ -0,0 +1,226 @@
+import io
+import logging
+import struct
+import threading
+
+import numpy as np
+import soundfile as sf
+
+from modules.core.handler.encoder.StreamEncoder import StreamEncoder
+
+logger = logging.getLogger(__name__)
+
+
+def wav_header(
+    *, channels=1, sample_width=2, sample_rate=24000, data_size: int = None
+) -> bytes:
+    """
+    PCM WAV 文件头
+
+    :param data_size: 音频数据字节数，None 表示长度未知（流式输出），按惯例填 0xFFFFFFFF
+    """
+    if data_size is None:
+        riff_size = data_size = 0xFFFFFFFF
+    else:
+        riff_size = min(36 + data_size, 0xFFFFFFFF)
+    block_align = channels * sample_width
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        riff_size,
+        b"WAVE",
+        b"fmt ",
+        16,
+        1,  # PCM
+        channels,
+        sample_rate,
+        sample_rate * block_align,
+        block_align,
+        sample_width * 8,
+        b"data",
+        data_size,
+    )
+
+
+class InProcessEncoder(StreamEncoder):
+    """
+    不启动 ffmpeg 子进程，直接在当前进程内编码的 StreamEncoder
+
+    输出在 read 的时候才生成：
+    - 流式 (每次 write 之后 read) 时，按照 "长度未知" 的方式输出文件头
+    - 非流式 (全部 write ，close 之后 read_all) 时，可以输出长度准确的完整文件
+
+    NOTE: 输入和 StreamEncoder 一样是 pcm s16le bytes
+    """
+
+    # 支持的 acodec ，其他 acodec 需要使用 ffmpeg 编码器
+    acodecs: tuple[str, ...] = ()
+
+    @classmethod
+    def supports(cls, acodec: str = None) -> bool:
+        return not acodec or acodec in cls.acodecs
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.lock = threading.Lock()
+        self.opened = False
+        self.closed = False
+
+    def open(self, format: str = "", acodec: str = "", bitrate: str = "", **kwargs):
+        self.opened = True
+        logger.info(
+            f"{self.__class__.__name__} opened, sample_rate: {self.sample_rate}, channels: {self.channels}, sample_width: {self.sample_width}"
+        )
+
+    def write_header_data(self):
+        # NOTE: 文件头由编码器自己在输出时生成
+        pass
+
+    def write(self, data: bytes):
+        if not self.opened or self.closed:
+            raise Exception("Encoder is not open")
+        with self.lock:
+            self.encode(data)
+
+    def encode(self, data: bytes) -> None:
+        raise NotImplementedError
+
+    def finish(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        """
+        返回上次 drain 之后新产生的输出
+        """
+        raise NotImplementedError
+
+    def read(self) -> bytes:
+        with self.lock:
+            return self.drain()
+
+    def read_all(self) -> bytes:
+        return self.read()
+
+    def close(self):
+        with self.lock:
+            if self.closed or not self.opened:
+                return
+            self.finish()
+            self.closed = True
+
+    def terminate(self):
+        pass
+
+
+class InProcessWavEncoder(InProcessEncoder):
+    acodecs = ("pcm_s16le",)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.chunks: list[bytes] = []
+        self.data_size = 0
+        self.header_sent = False
+
+    def encode(self, data: bytes) -> None:
+        if len(data) == 0:
+            return
+        self.chunks.append(data)
+        self.data_size += len(data)
+
+    def drain(self) -> bytes:
+        if self.header_sent and len(self.chunks) == 0:
+            return b""
+        out = []
+        if not self.header_sent:
+            out.append(
+                wav_header(
+                    channels=self.channels,
+                    sample_width=self.sample_width,
+                    sample_rate=self.sample_rate,
+                    data_size=self.data_size if self.closed else None,
+                )
+            )
+            self.header_sent = True
+        out.extend(self.chunks)
+        self.chunks = []
+        return b"".join(out)
+
+
+class InProcessRawEncoder(InProcessWavEncoder):
+    """
+    raw 格式: 长度为 0 的 wav 头 + pcm 数据，客户端可以直接按 pcm 拼接播放
+    """
+
+    def drain(self) -> bytes:
+        if not self.header_sent:
+            self.chunks.insert(
+                0,
+                wav_header(
+                    channels=self.channels,
+                    sample_width=self.sample_width,
+                    sample_rate=self.sample_rate,
+                    data_size=0,
+                ),
+            )
+            self.header_sent = True
+        out = b"".join(self.chunks)
+        self.chunks = []
+        return out
+
+
+class StreamSink(io.BytesIO):
+    """
+    给 soundfile 写入的可 seek 的内存文件，记录已经输出到哪里
+
+    NOTE: 编码器关闭时会 seek 回文件头更新统计信息 (比如 flac 的 total samples)，
+        如果文件头已经被流式输出了，这部分更新会被忽略，流式输出的文件头保持 "长度未知"
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.emitted = 0
+
+    def drain(self) -> bytes:
+        pos = self.tell()
+        end = self.seek(0, io.SEEK_END)
+        data = b""
+        if end > self.emitted:
+            self.seek(self.emitted)
+            data = self.read(end - self.emitted)
+            self.emitted = end
+        self.seek(pos)
+        return data
+
+
+class InProcessFlacEncoder(InProcessEncoder):
+    acodecs = ("flac",)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.sink = StreamSink()
+        self.file: sf.SoundFile = None
+
+    def open(self, format: str = "", acodec: str = "", bitrate: str = "", **kwargs):
+        self.file = sf.SoundFile(
+            self.sink,
+            mode="w",
+            samplerate=self.sample_rate,
+            channels=self.channels,
+            format="FLAC",
+            subtype="PCM_16",
+        )
+        super().open(format=format, acodec=acodec, bitrate=bitrate)
+
+    def encode(self, data: bytes) -> None:
+        if len(data) == 0:
+            return
+        samples = np.frombuffer(data, dtype=np.int16)
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels)
+        self.file.write(samples)
+
+    def finish(self) -> None:
+        self.file.close()
+
+    def drain(self) -> bytes:
+        return self.sink.drain()
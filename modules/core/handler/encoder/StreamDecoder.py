@@ -0,0 +1,160 @@
+import collections
+import logging
+import queue
+import subprocess
+import threading
+from typing import Iterator
+
+import numpy as np
+import pydub.utils
+
+from modules.core.handler.encoder.FFmpegPool import FFmpegPool
+
+logger = logging.getLogger(__name__)
+
+
+class AudioDecodeError(Exception):
+    def __init__(self, message: str, decoded: int = 0) -> None:
+        super().__init__(message)
+        # 出错之前已经解码出来的采样数
+        self.decoded = decoded
+
+
+class StreamDecoder:
+    """
+    用一个 ffmpeg 进程把任意格式的音频解码为单声道 float32 PCM ，边写入边解码
+
+    输出队列有长度上限，读取跟不上时 ffmpeg 的 stdout 会阻塞，ffmpeg 不再读取 stdin ，
+    write 也就跟着阻塞，所以不管输入多长，内存中只有固定大小的待处理数据
+    """
+
+    def __init__(self, sample_rate: int = 16000, max_queue_size: int = 16) -> None:
+        self.decoder = pydub.utils.get_encoder_name()
+        self.sample_rate = sample_rate
+        self.p: subprocess.Popen = None
+        # 每个元素最多 65536 字节
+        self.output_queue = queue.Queue(maxsize=max_queue_size)
+        self.stderr_lines = collections.deque(maxlen=20)
+        self.read_thread = None
+        self.stderr_thread = None
+        self.decoded = 0
+
+    def build_args(self, input: str) -> list[str]:
+        return [
+            self.decoder,
+            "-hide_banner",
+            "-nostats",
+            "-i",
+            input,
+            "-f",
+            "f32le",
+            "-acodec",
+            "pcm_f32le",
+            "-ac",
+            "1",
+            "-ar",
+            str(self.sample_rate),
+            "-",
+        ]
+
+    def open(self, input: str = "pipe:0"):
+        """
+        :param input: 默认从 stdin 输入，也可以是文件路径
+        """
+        args = self.build_args(input=input)
+        if input == "pipe:0":
+            self.p = FFmpegPool.acquire(args)
+        else:
+            self.p = FFmpegPool.spawn(args)
+            self.p.stdin.close()
+        self.read_thread = threading.Thread(target=self._read_output)
+        self.read_thread.daemon = True
+        self.read_thread.start()
+        self.stderr_thread = threading.Thread(target=self._read_stderr)
+        self.stderr_thread.daemon = True
+        self.stderr_thread.start()
+
+    def _read_output(self):
+        stdout = self.p.stdout
+        try:
+            while True:
+                data = stdout.read1(65536)
+                if not data:
+                    break
+                self.output_queue.put(data)
+        except (ValueError, OSError):
+            pass
+        finally:
+            self.output_queue.put(None)
+
+    def _read_stderr(self):
+        stderr = self.p.stderr
+        try:
+            for line in iter(stderr.readline, b""):
+                line = line.decode(errors="ignore").strip()
+                logger.debug(f"FFmpeg stderr: {line}")
+                self.stderr_lines.append(line)
+        except (ValueError, OSError):
+            pass
+
+    def error(self, message: str) -> AudioDecodeError:
+        detail = "\n".join(self.stderr_lines)
+        return AudioDecodeError(f"{message}\n{detail}".strip(), decoded=self.decoded)
+
+    def write(self, data: bytes):
+        """
+        ffmpeg 已经退出 (输入无法解码，或者被 terminate) 时抛出 AudioDecodeError
+        """
+        if self.p is None:
+            raise Exception("Decoder is not open")
+        try:
+            self.p.stdin.write(data)
+            self.p.stdin.flush()
+        except (BrokenPipeError, ValueError, OSError):
+            raise self.error("FFmpeg stopped reading input")
+
+    def close_input(self):
+        if self.p is not None and not self.p.stdin.closed:
+            try:
+                self.p.stdin.close()
+            except (BrokenPipeError, OSError):
+                pass
+
+    def iter_frames(self) -> Iterator[np.ndarray]:
+        """
+        阻塞读取解码好的采样直到 ffmpeg 输出结束，ffmpeg 出错时抛出 AudioDecodeError
+        """
+        remainder = b""
+        while True:
+            data = self.output_queue.get()
+            if data is None:
+                break
+            data = remainder + data
+            size = len(data) - len(data) % 4
+            remainder = data[size:]
+            if size == 0:
+                continue
+            frame = np.frombuffer(data[:size], dtype="<f4")
+            self.decoded += frame.size
+            yield frame
+
+        returncode = self.p.wait()
+        if returncode != 0:
+            raise self.error(f"FFmpeg exited with code {returncode}")
+
+    def terminate(self):
+        if self.p is None:
+            return
+        if self.p.poll() is None:
+            self.p.terminate()
+            self.p.wait()
+        # 读取线程可能阻塞在满了的队列上，清空之后它才能读到 EOF 退出
+        # 结束标记要留给 iter_frames
+        while True:
+            try:
+                data = self.output_queue.get_nowait()
+            except queue.Empty:
+                break
+            if data is None:
+                self.output_queue.put(None)
+                break
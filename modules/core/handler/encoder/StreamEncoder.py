@@ -5,11 +5,12 @@ import queue
 import subprocess
 import threading
 import wave
-from time import sleep
 
 import pydub
 import pydub.utils
 
+from modules.core.handler.encoder.FFmpegPool import FFmpegPool
+
 logger = logging.getLogger(__name__)
 
 
@@ -38,6 +39,9 @@ class StreamEncoder:
         self.sample_width = 2
         self.sample_rate = 24000
         self.stderr_thread = None
+        # stdout 读到 EOF 之后为 True
+        self.eof = False
+        self.stdin_closed = False
 
     def set_header(
         self, *, frame_input=b"", channels=1, sample_width=2, sample_rate=24000
@@ -84,39 +88,10 @@ class StreamEncoder:
         :param input_dtype: 输入数据类型 s16le or s32le
         """
         encoder = self.encoder
-        self.p = subprocess.Popen(
-            [
-                encoder,
-                "-re",
-                "-threads",
-                str(os.cpu_count() or 4),
-                # NOTE: 指定输入格式为 16 位 PCM
-                "-f",
-                input_dtype,
-                "-ar",
-                str(self.sample_rate),  # 输入采样率
-                "-ac",
-                str(self.channels),  # 输入单声道
-                "-i",
-                "pipe:0",
-                "-f",
-                format,
-                "-acodec",
-                acodec,
-                "-b:a",
-                bitrate,
-                "-flush_packets",
-                "1",
-                "-max_delay",
-                "0",
-                "-",
-            ],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            # NOTE: 这里设置为0可以低延迟解码，但是容易阻塞影响ffmpeg效率，所以最好还是设置上，因为编码相较于生成其实多不了多少时间
-            bufsize=65536,
+        args = self.build_args(
+            format=format, acodec=acodec, bitrate=bitrate, input_dtype=input_dtype
         )
+        self.p = FFmpegPool.acquire(args)
         self.read_thread = threading.Thread(target=self._read_output)
         self.read_thread.daemon = True
         self.read_thread.start()
@@ -128,28 +103,60 @@ class StreamEncoder:
             f"StreamEncoder opened, encoder: {encoder}, format: {format}, acodec: {acodec}, bitrate: {bitrate}, sample_rate: {self.sample_rate}, channels: {self.channels}, sample_width: {self.sample_width}"
         )
 
+    def build_args(
+        self, format: str, acodec: str, bitrate: str, input_dtype: str
+    ) -> list[str]:
+        # NOTE: 不使用 -re ，-re 会按实时速度读取输入，非流式请求要等音频时长那么久才能编码完
+        return [
+            self.encoder,
+            "-hide_banner",
+            "-nostats",
+            "-threads",
+            str(os.cpu_count() or 4),
+            # NOTE: 指定输入格式为 16 位 PCM
+            "-f",
+            input_dtype,
+            "-ar",
+            str(self.sample_rate),  # 输入采样率
+            "-ac",
+            str(self.channels),  # 输入单声道
+            "-i",
+            "pipe:0",
+            "-f",
+            format,
+            "-acodec",
+            acodec,
+            "-b:a",
+            bitrate,
+            "-flush_packets",
+            "1",
+            "-max_delay",
+            "0",
+            "-",
+        ]
+
     def _read_output(self):
-        buffer_size = 65536
-        stdout_buffer = io.BufferedReader(self.p.stdout, buffer_size=buffer_size)
-        while self.p:
-            peeked_data = stdout_buffer.peek(buffer_size)
-            if peeked_data:
-                data = stdout_buffer.read1(len(peeked_data))
-                # logger.debug(f"Read {len(data)} bytes dynamically from stdout")
+        # NOTE: read1 在有数据时立即返回，没有数据时阻塞，EOF 时返回空，不需要 sleep 轮询
+        stdout = self.p.stdout
+        try:
+            while True:
+                data = stdout.read1(65536)
+                if not data:
+                    break
                 self.output_queue.put(data)
-                # print("queue: ", len(data))
-            else:
-                # 无数据时短暂休眠
-                sleep(self.timeout)
-        stdout_buffer.close()
+        except (ValueError, OSError):
+            # terminate 之后 stdout 被关闭
+            pass
+        finally:
+            self.output_queue.put(None)
 
     def _read_stderr(self):
-        while self.p and self.p.stderr:
-            line = self.p.stderr.readline()
-            if line:
+        stderr = self.p.stderr
+        try:
+            for line in iter(stderr.readline, b""):
                 logger.debug(f"FFmpeg stderr: {line.decode().strip()}")
-            else:
-                sleep(self.timeout)
+        except (ValueError, OSError):
+            pass
 
     def write(self, data: bytes):
         if self.p is None:
@@ -158,39 +165,47 @@ class StreamEncoder:
         self.p.stdin.write(data)
         self.p.stdin.flush()
 
-    def read(self) -> bytes:
+    def _get(self, block: bool) -> bytes:
+        if self.eof:
+            return b""
         try:
-            data = self.output_queue.get(timeout=self.timeout)
-            # print("read: ", len(data))
-            return data
+            data = self.output_queue.get(block=block)
         except queue.Empty:
             return b""
+        if data is None:
+            self.eof = True
+            return b""
+        return data
+
+    def read(self) -> bytes:
+        """
+        编码器打开时不阻塞，返回当前已经编码好的数据
+        close 之后阻塞直到读到数据或者 EOF
+        """
+        if self.read_thread is None:
+            return b""
+        return self._get(block=self.stdin_closed)
 
     def read_all(self) -> bytes:
-        data = b""
-
-        def is_end():
-            if self.p is None:
-                return True
-            if not isinstance(self.p, subprocess.Popen):
-                return True
-            return self.p.poll() is not None
-
-        while not is_end() or not self.output_queue.empty():
-            try:
-                while not is_end() or not self.output_queue.empty():
-                    data += self.output_queue.get(timeout=self.timeout)
-                    # print("read_all: ", len(data))
-            except queue.Empty:
-                pass
-            sleep(self.timeout)
-        return data
+        """
+        阻塞直到 ffmpeg 输出结束，需要先 close
+        """
+        if self.read_thread is None:
+            return b""
+        chunks = []
+        while True:
+            data = self._get(block=True)
+            if not data:
+                break
+            chunks.append(data)
+        return b"".join(chunks)
 
     def close(self):
         if self.p is None:
             return
         if not self.p.stdin.closed:
             self.p.stdin.close()
+        self.stdin_closed = True
         try:
             self.p.wait(timeout=10)  # 等待最多10秒
         except subprocess.TimeoutExpired:
@@ -200,7 +215,8 @@ class StreamEncoder:
     def terminate(self):
         if self.p is None:
             return
-        self.p.terminate()
+        if self.p.poll() is None:
+            self.p.terminate()
         self.p = None
 
     # NOTE: 貌似因为多线程导致这个函数不会触发，所以需要手动调用 terminate
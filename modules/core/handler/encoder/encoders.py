@@ -1,3 +1,4 @@
+from modules.core.handler.encoder.InProcessEncoder import InProcessRawEncoder
 from modules.core.handler.encoder.StreamEncoder import StreamEncoder
 
 
@@ -36,22 +37,5 @@ class AacEncoder(StreamEncoder):
         return super().open("aac", acodec, bitrate)
 
 
-class RawEncoder(StreamEncoder):
-
-    def __init__(self) -> None:
-        super().__init__()
-
-        # FIXME: This is a hack to make the encoder work with the current implementation of the StreamEncoder.
-        self.p = True
-
-    def open(self, format: str = "", acodec: str = "", bitrate: str = ""):
-        pass
-
-    def write(self, data: bytes):
-        self.output_queue.put(data)
-
-    def close(self):
-        pass
-
-    def terminate(self):
-        pass
+class RawEncoder(InProcessRawEncoder):
+    pass
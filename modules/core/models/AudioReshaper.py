@@ -1,7 +1,8 @@
-import librosa
 import numpy as np
 
 from modules.core.pipeline.processor import NP_AUDIO
+from modules.utils import resampler
+from modules.utils.resampler import StreamResampler
 
 
 class AudioReshaper:
@@ -12,9 +13,17 @@ class AudioReshaper:
 
         if sr == target_sr:
             return sr, data
-        data = librosa.resample(data, orig_sr=sr, target_sr=target_sr)
+        # NOTE: 多相滤波器按 (sr, target_sr) 缓存，常见的几组采样率不会重复设计滤波器
+        data = resampler.resample(data, src_sr=sr, dst_sr=target_sr)
         return target_sr, data
 
+    @staticmethod
+    def create_stream_resampler(sr: int, target_sr: int) -> StreamResampler:
+        """
+        流式重采样，保留跨 chunk 的滤波器状态
+        """
+        return resampler.get_resampler(sr, target_sr).create_stream()
+
     @staticmethod
     def ensure_float32(audio: NP_AUDIO) -> NP_AUDIO:
         sr, data = audio
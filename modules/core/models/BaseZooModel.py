@@ -1,8 +1,68 @@
+import hashlib
+from pathlib import Path
+from typing import Any, Callable, Union
+
+import torch
+
+from modules.core.models.SpkConditionCache import SpkConditionCache
+from modules.core.spk.dcls import DcSpkReference
+from modules.core.spk.TTSSpeaker import TTSSpeaker
+
+
+def digest_model_files(paths: list[Path]) -> str:
+    """
+    根据权重文件的 (路径, 大小, 修改时间) 计算摘要，不读取文件内容
+    """
+    if len(paths) == 0:
+        return ""
+    digest = hashlib.blake2b(digest_size=16)
+    for path in sorted(set(Path(p) for p in paths)):
+        if path.is_file():
+            files = [path]
+        elif path.is_dir():
+            files = sorted(p for p in path.rglob("*") if p.is_file())
+        else:
+            digest.update(f"{path}|missing\n".encode("utf-8"))
+            continue
+        for file in files:
+            stat = file.stat()
+            digest.update(
+                f"{file.as_posix()}|{stat.st_size}|{stat.st_mtime_ns}\n".encode("utf-8")
+            )
+    return digest.hexdigest()
+
+
 class BaseZooModel:
 
     def __init__(self, model_id: str) -> None:
         self.model_id = model_id
-        self.hash = ""
+        self._hash: Union[str, None] = None
+
+    def get_model_paths(self) -> list[Path]:
+        """
+        模型权重所在的文件或目录，用于计算 hash
+        """
+        return []
+
+    @property
+    def hash(self) -> str:
+        """
+        模型版本，InferCache 和 SpkConditionCache 的 key 都包含它，
+        替换权重之后旧的缓存 (包括磁盘上的) 不会再被命中
+
+        第一次使用时根据权重文件计算，加载模型时调用 update_hash 重新计算
+        """
+        if self._hash is None:
+            self.update_hash()
+        return self._hash
+
+    @hash.setter
+    def hash(self, value: str) -> None:
+        self._hash = value
+
+    def update_hash(self) -> str:
+        self._hash = digest_model_files(self.get_model_paths())
+        return self._hash
 
     def reset(self) -> None:
         """
@@ -30,3 +90,45 @@ class BaseZooModel:
         检查模型是否已经安装 比如在 webui 页面是否显示
         """
         return True
+
+    def get_spk_condition(self, spk: TTSSpeaker, emotion: str = "") -> Any:
+        """
+        从 speaker 参考音频计算出来的条件特征 (speaker embedding / prompt token 等)
+        不需要参考音频的模型返回 None
+        """
+        return None
+
+    def cached_spk_condition(
+        self,
+        spk: Union[TTSSpeaker, None],
+        emotion: Union[str, None],
+        kind: str,
+        compute: Callable[[DcSpkReference], Any],
+        device: Union[torch.device, str, None] = None,
+    ) -> Any:
+        """
+        按参考音频内容缓存 compute(ref) 的结果，具体见 SpkConditionCache
+        """
+        if spk is None:
+            return None
+        ref = spk.get_ref(lambda x: x.emotion == emotion)
+        if ref is None:
+            return None
+        return SpkConditionCache.get_or_compute(
+            model_id=self.model_id,
+            model_hash=self.hash,
+            kind=kind,
+            ref_digest=spk.ref_digest(ref),
+            compute=lambda: compute(ref),
+            device=device,
+        )
+
+    def prebake_spk(self, spk: TTSSpeaker) -> int:
+        """
+        预先计算 speaker 每个 emotion 对应的条件特征，返回计算成功的数量
+        """
+        count = 0
+        for emotion in spk.get_emotions():
+            if self.get_spk_condition(spk=spk, emotion=emotion) is not None:
+                count += 1
+        return count
@@ -0,0 +1,103 @@
+import threading
+from typing import Callable, Optional, Union
+
+import numpy as np
+from cachetools import LRUCache
+
+from modules.core.models.AudioReshaper import AudioReshaper
+from modules.core.spk.dcls import DcSpkReference
+from modules.core.spk.SpkMgr import spk_mgr
+from modules.core.spk.TTSSpeaker import TTSSpeaker
+from modules.utils import audio_utils
+
+
+class RefWavCache:
+    """
+    speaker 参考音频的解码 + 重采样缓存
+
+    参考音频以 int16 bytes 存在 DcSpkReference 中，每次使用都需要解码再重采样到模型的采样率，
+    同一个音色被反复请求时这部分是重复的 CPU 开销
+
+    key: (spk.id, ref 下标, ref 采样率, ref 字节数, target_sr)
+    NOTE: ref 字节数只是一个廉价的校验，speaker 文件被修改时 SpeakerManager 的 generation 会变化，
+    此时整个缓存失效
+    """
+
+    cache = LRUCache(maxsize=256 * 1024 * 1024, getsizeof=lambda wav: wav.nbytes)
+    lock = threading.Lock()
+    generation: Union[int, None] = None
+
+    @classmethod
+    def get_key(
+        cls, spk: TTSSpeaker, ref: DcSpkReference, target_sr: Union[int, None]
+    ) -> Union[tuple, None]:
+        refs = spk._data.refs or []
+        for index, item in enumerate(refs):
+            if item is ref:
+                return (str(spk.id), index, ref.wav_sr, len(ref.wav), target_sr)
+        return None
+
+    @classmethod
+    def decode(cls, ref: DcSpkReference, target_sr: Union[int, None]) -> np.ndarray:
+        wav = audio_utils.bytes_to_librosa_array(
+            audio_bytes=ref.wav, sample_rate=ref.wav_sr
+        )
+        if target_sr is None:
+            return wav
+        _, wav = AudioReshaper.normalize_audio(
+            audio=(ref.wav_sr, wav), target_sr=target_sr
+        )
+        return wav
+
+    @classmethod
+    def get_ref_wav(
+        cls, spk: TTSSpeaker, ref: DcSpkReference, target_sr: Union[int, None] = None
+    ) -> np.ndarray:
+        """
+        返回解码并重采样到 target_sr 的参考音频，target_sr 为 None 时保持原采样率
+
+        NOTE: 返回的是副本，调用方可以随意修改
+        """
+        key = cls.get_key(spk=spk, ref=ref, target_sr=target_sr)
+        if key is None:
+            return cls.decode(ref=ref, target_sr=target_sr)
+
+        with cls.lock:
+            cls.check_generation()
+            wav = cls.cache.get(key)
+        if wav is None:
+            wav = cls.decode(ref=ref, target_sr=target_sr)
+            with cls.lock:
+                if wav.nbytes <= cls.cache.maxsize:
+                    cls.cache[key] = wav
+        return wav.copy()
+
+    @classmethod
+    def get_spk_ref_wav(
+        cls,
+        spk: TTSSpeaker,
+        get_func: Optional[Callable[[DcSpkReference], bool]] = None,
+        target_sr: Union[int, None] = None,
+    ) -> Union[tuple[np.ndarray, str], tuple[None, None]]:
+        ref = spk.get_ref(get_func)
+        if ref is None:
+            return None, None
+        wav = cls.get_ref_wav(spk=spk, ref=ref, target_sr=target_sr)
+        return wav, ref.text
+
+    @classmethod
+    def check_generation(cls) -> None:
+        if cls.generation != spk_mgr.generation:
+            cls.cache.clear()
+            cls.generation = spk_mgr.generation
+
+    @classmethod
+    def invalidate(cls, spk_id: str) -> None:
+        with cls.lock:
+            for key in [key for key in cls.cache.keys() if key[0] == str(spk_id)]:
+                cls.cache.pop(key, None)
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls.lock:
+            cls.cache.clear()
@@ -0,0 +1,122 @@
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Union
+
+import torch
+from cachetools import LRUCache
+
+from modules import config
+from modules.core.models.tts.InferCache import InferCache
+
+logger = logging.getLogger(__name__)
+
+
+class SpkConditionCache:
+    """
+    speaker 条件特征缓存
+
+    各个模型从参考音频计算出来的条件特征（speaker embedding、prompt token、mel feat 等），
+    计算一次之后按 (model_id, model_hash, kind, 参考音频摘要) 缓存
+
+    - 内存层: LRU
+    - 磁盘层: 配置了 spk_cond_cache_dir 时，以 torch.save 保存到 {dir}/{model_id}/{digest}.pt ，
+      重启之后不需要重新计算，可以通过 /v1/speakers/prebake 预先生成
+
+    NOTE: key 使用参考音频的内容摘要而不是 speaker id ，speaker 被修改之后自然不会命中旧的特征
+    """
+
+    cache = LRUCache(maxsize=256)
+    lock = threading.Lock()
+
+    hits = 0
+    misses = 0
+
+    @classmethod
+    def get_dir(cls) -> Union[Path, None]:
+        cache_dir = config.runtime_env_vars.spk_cond_cache_dir
+        return Path(cache_dir) if cache_dir else None
+
+    @classmethod
+    def get_key(
+        cls, model_id: str, model_hash: str, kind: str, ref_digest: str
+    ) -> str:
+        return InferCache.get_digest(
+            model_id=model_id, model_hash=model_hash, kind=kind, ref=ref_digest
+        )
+
+    @classmethod
+    def load_file(cls, path: Path, device: Union[torch.device, str, None]):
+        try:
+            return torch.load(path, map_location=device or "cpu")
+        except Exception as e:
+            logger.warning(f"Failed to load speaker condition {path}: {e}")
+            return None
+
+    @classmethod
+    def save_file(cls, path: Path, value: Any) -> None:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            torch.save(value, tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to save speaker condition {path}: {e}")
+
+    @classmethod
+    def get_or_compute(
+        cls,
+        *,
+        model_id: str,
+        model_hash: str,
+        kind: str,
+        ref_digest: str,
+        compute: Callable[[], Any],
+        device: Union[torch.device, str, None] = None,
+    ):
+        """
+        :param compute: 未命中时调用，返回值会被缓存，调用方不应该原地修改返回值
+        :param device: 从磁盘加载时 tensor 放到哪个设备
+        """
+        key = cls.get_key(
+            model_id=model_id, model_hash=model_hash, kind=kind, ref_digest=ref_digest
+        )
+        with cls.lock:
+            if key in cls.cache:
+                cls.hits += 1
+                return cls.cache[key]
+
+        cache_dir = cls.get_dir()
+        path = cache_dir / model_id / f"{key}.pt" if cache_dir else None
+        if path is not None and path.exists():
+            value = cls.load_file(path=path, device=device)
+            if value is not None:
+                with cls.lock:
+                    cls.hits += 1
+                    cls.cache[key] = value
+                return value
+
+        value = compute()
+        with cls.lock:
+            cls.misses += 1
+            cls.cache[key] = value
+        if path is not None:
+            cls.save_file(path=path, value=value)
+        return value
+
+    @classmethod
+    def stats(cls) -> dict:
+        with cls.lock:
+            cache_dir = cls.get_dir()
+            return dict(
+                entries=len(cls.cache),
+                hits=cls.hits,
+                misses=cls.misses,
+                dir=str(cache_dir) if cache_dir else None,
+            )
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls.lock:
+            cls.cache.clear()
@@ -1,11 +1,11 @@
 from typing import Generator, Union
 
-from modules.core.models.AudioReshaper import AudioReshaper
 from modules.core.models.BaseZooModel import BaseZooModel
+from modules.core.models.RefWavCache import RefWavCache
 from modules.core.models.tts.InferCache import InferCache
 from modules.core.pipeline.dcls import TTSSegment
 from modules.core.pipeline.processor import NP_AUDIO, TTSPipelineContext
-from modules.utils import audio_utils
+from modules.core.spk.TTSSpeaker import TTSSpeaker
 
 
 class TTSModel(BaseZooModel):
@@ -50,42 +50,33 @@ class TTSModel(BaseZooModel):
             return None
         return token.tokens[0]
 
-    def get_cache_kwargs(self, segments: list[TTSSegment], context: TTSPipelineContext):
-        texts = [segment.text for segment in segments]
-
-        # NOTE: 这里感觉有点蛋疼...如果增加新属性，都得改这里，但是如果改用 JSON 直接作为 cache key 的话，又可能太长了...
-        # TODO: 得换个好点的方法
-
-        seg0 = segments[0]
-        spk = seg0.spk
-        spk_id = spk.id if spk else None
-        top_P = seg0.top_p
-        top_K = seg0.top_k
-        temperature = seg0.temperature
-        # repetition_penalty = seg0.repetition_penalty
-        # max_new_token = seg0.max_new_token
-        prompt1 = seg0.prompt1
-        prompt2 = seg0.prompt2
-        prefix = seg0.prefix
-        emotion = seg0.emotion
-        # use_decoder = seg0.use_decoder
-        seed = seg0.infer_seed
-        chunk_size = context.infer_config.stream_chunk_size
+    def get_cache_kwargs(self, segment: TTSSegment, context: TTSPipelineContext):
+        """
+        单个 segment 的 cache key
 
+        NOTE: 以 segment 为单位缓存，同一句话不管和哪些句子一起 batch 都可以命中
+        NOTE: spk 使用 fingerprint 而不是 id ，speaker 的 token/参考音频 修改之后不会命中旧的缓存
+        NOTE: duration_ms / speed_rate 在 after_process 中处理，缓存的是处理前的音频，所以不参与 key
+        """
+        spk = segment.spk
+        if isinstance(spk, TTSSpeaker):
+            spk = spk.fingerprint(self.model_id)
+
+        # NOTE: model_id 由 InferCache.get_cache_val / set_cache_val 单独传入
         kwargs = dict(
-            text="|".join(texts),
-            spk_id=spk_id,
-            top_P=top_P,
-            top_K=top_K,
-            temperature=temperature,
-            repetition_penalty=None,
-            max_new_token=None,
-            prompt1=prompt1,
-            prompt2=prompt2,
-            prefix=prefix,
-            stream_chunk_size=chunk_size,
-            seed=seed,
-            emotion=emotion,
+            model_hash=self.hash,
+            text=segment.text,
+            spk=spk,
+            top_P=segment.top_p,
+            top_K=segment.top_k,
+            temperature=segment.temperature,
+            prompt=segment.prompt,
+            prompt1=segment.prompt1,
+            prompt2=segment.prompt2,
+            prefix=segment.prefix,
+            emotion=segment.emotion,
+            seed=segment.infer_seed,
+            stream_chunk_size=context.infer_config.stream_chunk_size,
         )
         return kwargs
 
@@ -100,15 +91,30 @@ class TTSModel(BaseZooModel):
 
         return False
 
-    def get_cache(
+    def get_segment_caches(
         self, segments: list[TTSSegment], context: TTSPipelineContext
-    ) -> Union[list[NP_AUDIO], None]:
+    ) -> list[Union[NP_AUDIO, None]]:
+        """
+        逐个 segment 查询 cache ，未命中的位置为 None
+        """
         if self._is_skip_cache(segments=segments, context=context):
-            return None
+            return [None] * len(segments)
 
-        kwargs = self.get_cache_kwargs(segments=segments, context=context)
+        results = []
+        for segment in segments:
+            kwargs = self.get_cache_kwargs(segment=segment, context=context)
+            results.append(InferCache.get_cache_val(model_id=self.model_id, **kwargs))
+        return results
 
-        cached = InferCache.get_cache_val(model_id=self.model_id, **kwargs)
+    def get_cache(
+        self, segments: list[TTSSegment], context: TTSPipelineContext
+    ) -> Union[list[NP_AUDIO], None]:
+        """
+        所有 segment 都命中时才返回
+        """
+        cached = self.get_segment_caches(segments=segments, context=context)
+        if any(item is None for item in cached):
+            return None
         return cached
 
     def set_cache(
@@ -120,23 +126,45 @@ class TTSModel(BaseZooModel):
         if self._is_skip_cache(segments=segments, context=context):
             return
 
-        kwargs = self.get_cache_kwargs(segments=segments, context=context)
-        InferCache.set_cache_val(model_id=self.model_id, value=value, **kwargs)
+        for segment, item in zip(segments, value):
+            kwargs = self.get_cache_kwargs(segment=segment, context=context)
+            InferCache.set_cache_val(model_id=self.model_id, value=item, **kwargs)
 
-    def get_ref_wav(self, segment: TTSSegment):
+    def generate_batch_cached(
+        self, segments: list[TTSSegment], context: TTSPipelineContext
+    ) -> list[NP_AUDIO]:
+        """
+        命中 cache 的 segment 直接返回，只把未命中的 segment 交给 generate_batch
+        """
+        results = self.get_segment_caches(segments=segments, context=context)
+        missing = [i for i, item in enumerate(results) if item is None]
+        if len(missing) == 0:
+            return results
+
+        generated = self.generate_batch(
+            segments=[segments[i] for i in missing], context=context
+        )
+        for i, item in zip(missing, generated):
+            results[i] = item
+        return results
+
+    def get_ref_text(self, segment: TTSSegment):
         spk = segment.spk
         if spk is None:
-            return None, None
+            return None
         emotion = segment.emotion
         ref_data = spk.get_ref(lambda x: x.emotion == emotion)
         if ref_data is None:
+            return None
+        return ref_data.text
+
+    def get_ref_wav(self, segment: TTSSegment):
+        spk = segment.spk
+        if spk is None:
             return None, None
-        wav = audio_utils.bytes_to_librosa_array(
-            audio_bytes=ref_data.wav, sample_rate=ref_data.wav_sr
-        )
-        _, wav = AudioReshaper.normalize_audio(
-            audio=(ref_data.wav_sr, wav),
+        emotion = segment.emotion
+        return RefWavCache.get_spk_ref_wav(
+            spk=spk,
+            get_func=lambda x: x.emotion == emotion,
             target_sr=self.get_sample_rate(),
         )
-        text = ref_data.text
-        return wav, text
@@ -1,13 +1,17 @@
+import itertools
+from collections import deque
 from dataclasses import dataclass
+from typing import Hashable, Iterable, Iterator, Optional
 
 import numpy as np
 from faster_whisper.transcribe import Segment, TranscriptionInfo, Word
-from faster_whisper.vad import get_speech_timestamps
+from faster_whisper.vad import VadOptions
 from tqdm import tqdm
 
 from modules import config as global_config
 from modules.core.handler.datacls.stt_model import STTConfig
 from modules.core.models.stt.STTModel import STTModel, TranscribeResult
+from modules.core.models.stt.VadCache import SpeechRegion, StreamVad, VadCache
 from modules.core.models.stt.whisper.whisper_dcls import SttResult, SttSegment, SttWord
 from modules.core.models.stt.whisper.writer import get_writer
 from modules.core.pipeline.processor import NP_AUDIO
@@ -18,8 +22,8 @@ from modules.utils.monkey_tqdm import disable_tqdm
 @dataclass(frozen=True, eq=False)
 class STTChunkData:
     audio: NP_AUDIO
-    start_s: int
-    end_s: int
+    start_s: float
+    end_s: float
 
 
 class RefrenceTranscript:
@@ -63,23 +67,32 @@ class STTChunker:
     然后拼接，产生最终的asr识别结果
     """
 
+    MAX_DURATION = 30.0  # seconds
+    # iter_chunks 输入的采样率
+    STREAM_SAMPLE_RATE = 16000
+
     def __init__(self, model: STTModel):
         self.model = model
 
+    @classmethod
+    def get_vad_options(cls) -> VadOptions:
+        # NOTE: vad 限制段落长度时已经算上了两边的 speech_pad
+        return VadOptions(max_speech_duration_s=cls.MAX_DURATION)
+
     def get_chunks(self, audio: NP_AUDIO):
         """
         根据vad结果，尽量将audio分为小于30s的短音频
 
         如果小于30s就尝试和后续的合并
         如果大于30s直接作为chunk
+
+        NOTE: vad 在 16k 的副本上进行，结果按音频内容缓存，同一段音频重复识别时不再做 vad
         """
         sr, data = audio
-        index_to_s = lambda index: int(index / sr)
-        get_duration_s = lambda start, end: index_to_s(end - start)
-        duration_s = get_duration_s(0, len(data))
-        MAX_DURATION = 30.0  # seconds
+        to_index = lambda seconds: round(seconds * sr)
+        duration_s = len(data) / sr
 
-        if duration_s < MAX_DURATION:
+        if duration_s < self.MAX_DURATION:
             return [
                 STTChunkData(
                     audio=audio,
@@ -87,56 +100,42 @@ class STTChunker:
                     end_s=duration_s,
                 )
             ]
-        speech_timestamps = get_speech_timestamps(data.astype(np.float32))
+        regions = VadCache.get_speech_regions(audio, vad_options=self.get_vad_options())
+
+        def to_chunk(start_s: float, end_s: float) -> STTChunkData:
+            start, end = to_index(start_s), to_index(end_s)
+            return STTChunkData(
+                audio=(sr, data[start:end]), start_s=start / sr, end_s=end / sr
+            )
+
         chunks: list[STTChunkData] = []
 
         buffer_start = None
         buffer_end = None
 
-        for speech in speech_timestamps:
-            start, end = speech["start"], speech["end"]
-            speech_duration = get_duration_s(start, end)
+        for region in regions:
+            start, end = region.start, region.end
 
-            if speech_duration >= MAX_DURATION:
+            if end - start >= self.MAX_DURATION:
                 # 大段，直接作为 chunk
-                chunks.append(
-                    STTChunkData(
-                        audio=(sr, data[start:end]),
-                        start_s=index_to_s(start),
-                        end_s=index_to_s(end),
-                    )
-                )
+                chunks.append(to_chunk(start, end))
                 continue
 
             if buffer_start is None:
                 buffer_start = start
                 buffer_end = end
+            elif end - buffer_start <= self.MAX_DURATION:
+                # 合并
+                buffer_end = end
             else:
-                # 尝试合并
-                new_duration = get_duration_s(buffer_start, end)
-                if new_duration <= MAX_DURATION:
-                    buffer_end = end  # 合并
-                else:
-                    # 提交当前 buffer
-                    chunks.append(
-                        STTChunkData(
-                            audio=(sr, data[buffer_start:buffer_end]),
-                            start_s=index_to_s(buffer_start),
-                            end_s=index_to_s(buffer_end),
-                        )
-                    )
-                    buffer_start = start
-                    buffer_end = end
+                # 提交当前 buffer
+                chunks.append(to_chunk(buffer_start, buffer_end))
+                buffer_start = start
+                buffer_end = end
 
         # 收尾处理剩余的 buffer
         if buffer_start is not None:
-            chunks.append(
-                STTChunkData(
-                    audio=(sr, data[buffer_start:buffer_end]),
-                    start_s=index_to_s(buffer_start),
-                    end_s=index_to_s(buffer_end),
-                )
-            )
+            chunks.append(to_chunk(buffer_start, buffer_end))
 
         return chunks
 
@@ -170,13 +169,171 @@ class STTChunker:
         return SttResult(
             duration=-1,
             segments=merged_segments,
-            language=results[0].language,
+            language=results[0].language if results else "",
         )
 
+    def iter_chunks(
+        self, frames: Iterable[np.ndarray], cache_key: Optional[Hashable] = None
+    ) -> Iterator[STTChunkData]:
+        """
+        get_chunks 的增量版本，输入 16k 单声道 float32 音频帧，边输入边切分
+
+        - vad 由 StreamVad 增量进行，只输出后面已经跟着足够长静音、不会再变化的语音段落
+        - 语音段落按顺序合并为不超过 30s 的 chunk ，buffer 中只保留之后的 chunk 还会用到的音频
+        - cache_key 不为 None 时，vad 结果以 (音频时长, 语音段落) 缓存在 VadCache 中，
+          和 STTHandler.detect_speech 的缓存相同，命中时直接按缓存的段落切分，不再做 vad
+        """
+        sr = self.STREAM_SAMPLE_RATE
+        max_samples = int(self.MAX_DURATION * sr)
+        to_index = lambda seconds: round(seconds * sr)
+
+        cached = VadCache.get(cache_key) if cache_key is not None else None
+        # 命中缓存时按顺序取出缓存的段落，否则边输入边做 vad
+        known = deque(cached[1]) if cached is not None else None
+        vad = StreamVad(self.get_vad_options()) if cached is None else None
+        detected: list[SpeechRegion] = []
+
+        buffer = np.empty(0, dtype=np.float32)
+        # buffer[0] 在整个音频中的位置
+        offset = 0
+        received = 0
+        # 正在合并的 chunk ，单位为秒
+        chunk_start = chunk_end = None
+
+        def to_chunk(start_s: float, end_s: float) -> STTChunkData:
+            start, end = to_index(start_s), to_index(end_s)
+            return STTChunkData(
+                audio=(sr, buffer[start - offset : end - offset].copy()),
+                start_s=start / sr,
+                end_s=end / sr,
+            )
+
+        def merge(regions: Iterable[SpeechRegion]) -> Iterator[STTChunkData]:
+            nonlocal chunk_start, chunk_end
+            for region in regions:
+                if chunk_start is None:
+                    chunk_start, chunk_end = region.start, region.end
+                elif region.end - chunk_start <= self.MAX_DURATION:
+                    chunk_end = region.end
+                else:
+                    yield to_chunk(chunk_start, chunk_end)
+                    chunk_start, chunk_end = region.start, region.end
+
+        def pop_known() -> list[SpeechRegion]:
+            regions = []
+            while known and to_index(known[0].end) <= received:
+                regions.append(known.popleft())
+            return regions
+
+        for frame in frames:
+            frame = np.asarray(frame, dtype=np.float32)
+            buffer = np.concatenate([buffer, frame])
+            received += len(frame)
+            if vad is not None:
+                regions = vad.push(frame)
+                detected.extend(regions)
+            else:
+                regions = pop_known()
+            yield from merge(regions)
+
+            if received < max_samples:
+                # 短音频不切分，需要保留全部音频
+                continue
+            # 之后的段落不会早于 needed ，正在合并的 chunk 从 chunk_start 开始
+            if vad is not None:
+                needed = vad.offset
+            else:
+                needed = to_index(known[0].start) if known else received
+            if chunk_start is not None:
+                needed = min(needed, to_index(chunk_start))
+            if needed > offset:
+                buffer = buffer[needed - offset :]
+                offset = needed
+
+        if received == 0:
+            return
+        if received < max_samples:
+            # 和 get_chunks 一样，短音频不切分，也不需要做 vad
+            yield to_chunk(0, received / sr)
+            return
+
+        if vad is not None:
+            regions = vad.flush()
+            detected.extend(regions)
+            if cache_key is not None:
+                VadCache.put(cache_key, (received / sr, tuple(detected)))
+        else:
+            regions = list(known)
+        yield from merge(regions)
+        if chunk_start is not None:
+            yield to_chunk(chunk_start, chunk_end)
+
     def transcribe_to_result(self, audio: NP_AUDIO, config: STTConfig) -> SttResult:
-        ref_script = RefrenceTranscript(config.refrence_transcript)
         chunks = self.get_chunks(audio)
+        return self.merge_transcribed(self.transcribe_chunks(chunks, config))
+
+    def transcribe_frames_to_result(
+        self,
+        frames: Iterable[np.ndarray],
+        config: STTConfig,
+        cache_key: Optional[Hashable] = None,
+    ) -> SttResult:
+        """
+        frames 为 16k 单声道 float32 音频帧，切分和识别都是增量进行的，不需要完整的音频
+        """
+        chunks = self.iter_chunks(frames, cache_key=cache_key)
+        return self.merge_transcribed(self.transcribe_chunks(chunks, config))
+
+    def merge_transcribed(
+        self, transcribed: Iterable[tuple[STTChunkData, SttResult]]
+    ) -> SttResult:
+        chunks: list[STTChunkData] = []
         results: list[SttResult] = []
+        for chunk, result in transcribed:
+            # 识别完之后不再需要 chunk 的音频
+            chunks.append(
+                STTChunkData(audio=None, start_s=chunk.start_s, end_s=chunk.end_s)
+            )
+            results.append(result)
+        return self.merge_results(chunks, results)
+
+    def transcribe_chunks(
+        self, chunks: Iterable[STTChunkData], config: STTConfig
+    ) -> Iterator[tuple[STTChunkData, SttResult]]:
+        if (config.refrence_transcript or "").strip() != "":
+            return self.transcribe_chunks_with_ref(chunks, config)
+        return self.transcribe_chunks_batched(chunks, config)
+
+    def transcribe_chunks_batched(
+        self, chunks: Iterable[STTChunkData], config: STTConfig
+    ) -> Iterator[tuple[STTChunkData, SttResult]]:
+        """
+        没有参考文稿时各个 chunk 之间没有依赖，按 stt_batch_size 分批交给模型一起识别
+        """
+        batch_size = self.model.get_batch_size()
+        with tqdm(
+            total=len(chunks) if isinstance(chunks, list) else None,
+            desc="Transcribing audio chunks",
+            disable=global_config.runtime_env_vars.off_tqdm,
+        ) as progress:
+            iterator = iter(chunks)
+            while True:
+                batch = list(itertools.islice(iterator, batch_size))
+                if not batch:
+                    break
+                results = self.model.transcribe_batch_to_result(
+                    [chunk.audio for chunk in batch], config
+                )
+                yield from zip(batch, results)
+                progress.update(len(batch))
+
+    def transcribe_chunks_with_ref(
+        self, chunks: Iterable[STTChunkData], config: STTConfig
+    ) -> Iterator[tuple[STTChunkData, SttResult]]:
+        """
+        有参考文稿时，每个 chunk 都要接着上一个 chunk 没有匹配完的文稿，只能逐个识别
+        """
+        ref_script = RefrenceTranscript(config.refrence_transcript)
         for chunk in tqdm(
             chunks,
             desc="Transcribing audio chunks",
@@ -184,7 +341,7 @@ class STTChunker:
         ):
             config.refrence_transcript = ref_script.buffer
             result = self.model.transcribe_to_result(chunk.audio, config)
-            results.append(result)
+            yield chunk, result
 
             result_content = ""
             for seg in result.segments:
@@ -195,9 +352,6 @@ class STTChunker:
                     result_content += seg.text
             ref_script.dequeue_content(result_content)
 
-        result = self.merge_results(chunks, results)
-        return result
-
     def convert_result_with_format(self, config: STTConfig, result: SttResult) -> str:
         writer_options = {
             "highlight_words": config.highlight_words,
@@ -223,3 +377,23 @@ class STTChunker:
         sr, data = audio
         result.duration = len(data) / sr
         return self.convert_result_with_format(config, result)
+
+    def transcribe_frames(
+        self,
+        frames: Iterable[np.ndarray],
+        config: STTConfig,
+        cache_key: Optional[Hashable] = None,
+    ) -> TranscribeResult:
+        received = 0
+
+        def count(frames: Iterable[np.ndarray]):
+            nonlocal received
+            for frame in frames:
+                received += len(frame)
+                yield frame
+
+        result = self.transcribe_frames_to_result(
+            count(frames), config, cache_key=cache_key
+        )
+        result.duration = received / self.STREAM_SAMPLE_RATE
+        return self.convert_result_with_format(config, result)
@@ -23,6 +23,11 @@ class STTModel(BaseZooModel):
     def __init__(self, model_id: str) -> None:
         super().__init__(model_id=model_id)
 
+    @staticmethod
+    def get_batch_size() -> int:
+        size = global_config.runtime_env_vars.stt_batch_size
+        return 8 if size is None else max(1, int(size))
+
     def convert_result_with_format(self, config: STTConfig, result: SttResult) -> str:
         writer_options = {
             "highlight_words": config.highlight_words,
@@ -50,3 +55,13 @@ class STTModel(BaseZooModel):
 
     def transcribe_to_result(self, audio: NP_AUDIO, config: STTConfig) -> SttResult:
         raise NotImplementedError()
+
+    def transcribe_batch_to_result(
+        self, audios: list[NP_AUDIO], config: STTConfig
+    ) -> list[SttResult]:
+        """
+        一次识别多段音频，默认逐段调用 transcribe_to_result ，支持批量推理的模型可以覆盖
+        """
+        return [
+            self.transcribe_to_result(audio=audio, config=config) for audio in audios
+        ]
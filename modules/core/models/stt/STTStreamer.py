@@ -0,0 +1,223 @@
+from dataclasses import dataclass, field
+from typing import Literal, Optional
+
+import numpy as np
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+from modules.core.handler.datacls.stt_model import STTConfig
+from modules.core.models.stt.STTModel import STTModel
+from modules.core.models.stt.whisper.whisper_dcls import SttResult, SttSegment, SttWord
+from modules.utils.resampler import StreamResampler, get_resampler
+
+
+@dataclass(repr=False, eq=False)
+class STTStreamEvent:
+    # partial: 正在说的这句话的临时结果，之后会被新的 partial 或 final 覆盖
+    # final: 已经确定的结果，之后不会再改变
+    type: Literal["partial", "final"]
+    segments: list[SttSegment] = field(default_factory=list)
+
+
+class STTStreamer:
+    """
+    流式识别，不断输入音频帧，增量做 vad ，输出 partial 和 final 结果
+
+    - buffer 中只保留还没有 final 的音频，final 之后的音频直接丢掉
+    - 每输入 vad_step_s 秒音频做一次 vad ，正在说话时只对新输入的音频和前面 lookback 长度的音频做 vad ，
+      这段音频不再是一整段没说完的语音时，才对 buffer 重新做一次完整的 vad
+    - 后面已经跟着足够长静音的语音段落会被识别为 final
+    - 还没说完的语音段落，每隔 partial_interval_s 秒识别一次最后 partial_window_s 秒作为 partial
+    - 语音段落超过 max_segment_s 秒时强制 final ，所以 buffer 的长度是有上限的
+
+    NOTE: 每次 feed 最多做一次 vad 和一次 partial ，识别跟不上输入时，
+    调用方应该把积压的帧合并成一次 feed ，见 STTHandler.enqueue_stream
+    """
+
+    SAMPLE_RATE = 16000
+
+    def __init__(
+        self,
+        model: STTModel,
+        config: STTConfig,
+        sample_rate: int = SAMPLE_RATE,
+        vad_step_s: float = 0.2,
+        partial_interval_s: float = 0.5,
+        min_silence_ms: int = 500,
+        speech_pad_ms: int = 200,
+        max_segment_s: float = 30.0,
+        partial_window_s: float = 8.0,
+    ) -> None:
+        self.model = model
+        self.config = config
+
+        self.resampler: Optional[StreamResampler] = None
+        if sample_rate != self.SAMPLE_RATE:
+            self.resampler = StreamResampler(
+                get_resampler(sample_rate, self.SAMPLE_RATE)
+            )
+
+        self.vad_options = VadOptions(
+            min_silence_duration_ms=min_silence_ms,
+            speech_pad_ms=speech_pad_ms,
+            max_speech_duration_s=max_segment_s,
+        )
+        self.vad_step = int(vad_step_s * self.SAMPLE_RATE)
+        self.partial_interval = int(partial_interval_s * self.SAMPLE_RATE)
+        self.max_segment = int(max_segment_s * self.SAMPLE_RATE)
+        self.partial_window = int(partial_window_s * self.SAMPLE_RATE)
+        self.speech_pad = int(speech_pad_ms / 1000 * self.SAMPLE_RATE)
+        # 没有语音时保留的音频长度，保证下一次 vad 能看到语音的开头
+        self.lookback = int((min_silence_ms + speech_pad_ms) / 1000 * self.SAMPLE_RATE)
+
+        self.buffer = np.empty(0, dtype=np.float32)
+        # buffer[0] 在整个音频流中的位置
+        self.offset = 0
+        # 上次 vad / partial 时的音频流长度
+        self.vad_at = 0
+        self.partial_at = 0
+        # buffer 开头是否是一段还没说完的语音，以及上次 vad 之后 buffer 的长度
+        self.ongoing = False
+        self.scanned = 0
+
+    @property
+    def received(self) -> int:
+        return self.offset + len(self.buffer)
+
+    def get_speech_timestamps(self, audio: np.ndarray) -> list[dict]:
+        return get_speech_timestamps(audio, vad_options=self.vad_options)
+
+    def transcribe(self, start: int, end: int) -> SttResult:
+        audio = (self.SAMPLE_RATE, self.buffer[start:end])
+        return self.model.transcribe_to_result(audio=audio, config=self.config)
+
+    def to_stream_segments(self, result: SttResult, start: int) -> list[SttSegment]:
+        """
+        把 buffer 中 start 开始的识别结果的时间戳转为整个音频流中的时间戳
+        """
+        offset_s = (self.offset + start) / self.SAMPLE_RATE
+        return [
+            SttSegment(
+                text=segment.text,
+                start=segment.start + offset_s,
+                end=segment.end + offset_s,
+                words=(
+                    [
+                        SttWord(
+                            word=w.word,
+                            start=w.start + offset_s,
+                            end=w.end + offset_s,
+                        )
+                        for w in segment.words
+                    ]
+                    if segment.words
+                    else None
+                ),
+            )
+            for segment in result.segments
+        ]
+
+    def finalize(self, start: int, end: int) -> STTStreamEvent:
+        result = self.transcribe(start, end)
+        return STTStreamEvent(
+            type="final", segments=self.to_stream_segments(result, start)
+        )
+
+    def partial(self, start: int) -> STTStreamEvent:
+        # 只识别最后 partial_window 长度的音频，partial 的耗时不随句子变长而增长
+        start = max(start, len(self.buffer) - self.partial_window)
+        result = self.transcribe(start, len(self.buffer))
+        segments = self.to_stream_segments(result, start)
+        text = "".join(segment.text for segment in segments)
+        if not text.strip():
+            return STTStreamEvent(type="partial")
+        return STTStreamEvent(
+            type="partial",
+            segments=[
+                SttSegment(
+                    text=text,
+                    start=(self.offset + start) / self.SAMPLE_RATE,
+                    end=self.received / self.SAMPLE_RATE,
+                )
+            ],
+        )
+
+    def drop(self, end: int) -> None:
+        """
+        丢掉 buffer 中 end 之前的音频
+        """
+        self.buffer = self.buffer[end:]
+        self.offset += end
+
+    def is_still_speaking(self) -> bool:
+        """
+        buffer 开头是没说完的语音时，只对上次 vad 之后新输入的音频和前面 lookback 长度的音频做 vad ，
+        这段音频仍然是一整段一直持续到末尾的语音时，说明这句话还没说完
+        """
+        start = max(0, self.scanned - self.lookback)
+        speeches = self.get_speech_timestamps(self.buffer[start:])
+        return (
+            len(speeches) == 1
+            and speeches[0]["start"] <= self.speech_pad
+            and start + speeches[0]["end"] >= len(self.buffer)
+        )
+
+    def feed(self, data: np.ndarray) -> list[STTStreamEvent]:
+        """
+        输入单声道 float32 音频帧，返回这次产生的事件
+        """
+        data = np.asarray(data, dtype=np.float32)
+        if self.resampler is not None:
+            data = self.resampler.push(data)
+        self.buffer = np.concatenate([self.buffer, data])
+
+        if self.received - self.vad_at < self.vad_step:
+            return []
+        return self.process(final=False)
+
+    def flush(self) -> list[STTStreamEvent]:
+        """
+        输入结束，剩下的语音全部 final
+        """
+        if self.resampler is not None:
+            self.buffer = np.concatenate([self.buffer, self.resampler.flush()])
+        return self.process(final=True)
+
+    def process(self, final: bool) -> list[STTStreamEvent]:
+        self.vad_at = self.received
+        events: list[STTStreamEvent] = []
+        if len(self.buffer) == 0:
+            return events
+
+        if self.ongoing and not final and self.is_still_speaking():
+            speeches = [dict(start=0, end=len(self.buffer))]
+        else:
+            speeches = self.get_speech_timestamps(self.buffer)
+        # NOTE: vad 在音频末尾还没有检测到足够长的静音时，最后一个段落的 end 会到音频末尾
+        ongoing = None
+        if speeches and speeches[-1]["end"] >= len(self.buffer) and not final:
+            ongoing = speeches.pop()
+
+        finalized = 0
+        for speech in speeches:
+            events.append(self.finalize(speech["start"], speech["end"]))
+            finalized = speech["end"]
+
+        if ongoing is not None:
+            start = ongoing["start"]
+            if len(self.buffer) - start >= self.max_segment:
+                events.append(self.finalize(start, len(self.buffer)))
+                self.drop(len(self.buffer))
+            else:
+                self.drop(start)
+                if self.received - self.partial_at >= self.partial_interval:
+                    self.partial_at = self.received
+                    events.append(self.partial(0))
+        elif final:
+            self.drop(len(self.buffer))
+        else:
+            self.drop(max(finalized, len(self.buffer) - self.lookback))
+
+        # drop 之后 buffer[0] 就是没说完的语音的开头
+        self.ongoing = ongoing is not None and len(self.buffer) > 0
+        self.scanned = len(self.buffer)
+        return [event for event in events if event.segments]
@@ -1,7 +1,7 @@
 import logging
 import time
 from pathlib import Path
-from typing import List
+from typing import List, Tuple
 
 import numpy as np
 import numpy.typing as npt
@@ -9,13 +9,11 @@ import numpy.typing as npt
 # from funasr.models.sense_voice.model import SenseVoiceSmall
 from funasr import AutoModel
 from funasr.utils.postprocess_utils import rich_transcription_postprocess
-from resampy.core import resample
-from tqdm import tqdm
 
 from modules.core.models.stt.STTModel import STTModel
 from modules.core.models.stt.whisper.whisper_dcls import SttResult, SttSegment
 from modules.devices import devices
-from modules.utils import audio_utils
+from modules.utils import audio_utils, resampler
 
 logger = logging.getLogger(__name__)
 
@@ -81,12 +79,24 @@ class SenseVoiceModel(STTModel):
             self.asr_model = None
             logger.info(f"Unloaded SenseVoice model")
 
+    def vad_segments(self, speech: npt.NDArray) -> list[list[int]]:
+        """
+        返回 16k 音频的语音段落 [[start_ms, end_ms], ...]
+        """
+        start_time = time.time()
+        vad_results = self.vad_model.generate(input=speech, disable_pbar=True)
+        logger.info("VAD took %.2f seconds", time.time() - start_time)
+
+        if not vad_results or not vad_results[0]["value"]:
+            return []
+        return vad_results[0]["value"]
+
     def asr_transcribe(
         self,
         sr: int,
         speech: npt.NDArray,
         language: str = "auto",
-    ) -> List[SttSegment]:
+    ) -> Tuple[List[SttSegment], str]:
         """
         Transcribe audio file to text with timestamps.
 
@@ -99,86 +109,96 @@ class SenseVoiceModel(STTModel):
         参考：
         https://github.com/hon9kon9ize/yuesub-api/blob/main/transcriber/Transcriber.py
         """
+        return self.asr_transcribe_batch([(sr, speech)], language=language)[0]
+
+    def asr_transcribe_batch(
+        self,
+        audios: List[Tuple[int, npt.NDArray]],
+        language: str = "auto",
+    ) -> List[Tuple[List[SttSegment], str]]:
+        """
+        分别对每段音频做 vad ，然后把所有音频的所有语音段落放在一起批量识别
+        """
 
         # if self.use_denoiser:
         #     logger.info("Denoising speech...")
         #     speech, _ = denoiser(speech, sr)
 
-        if sr != 16_000:
-            speech = resample(speech, sr, 16_000, filter="kaiser_best", parallel=True)
-
         # Get VAD segments
         logger.info("Segmenting speech...")
 
-        start_time = time.time()
-        vad_results = self.vad_model.generate(input=speech, disable_pbar=True)
-        logger.info("VAD took %.2f seconds", time.time() - start_time)
-
-        if not vad_results or not vad_results[0]["value"]:
-            return []
-
-        vad_segments = vad_results[0]["value"]
-
-        # Process each segment
-        results: list[SttSegment] = []
+        # (音频下标, vad 段落, 段落音频)
+        items: list[tuple[int, list[int], npt.NDArray]] = []
+        for index, (sr, speech) in enumerate(audios):
+            if sr != 16_000:
+                speech = resampler.resample(
+                    speech, src_sr=sr, dst_sr=16_000, quality="high"
+                )
+            for segment in self.vad_segments(speech):
+                start_sample = int(segment[0] * 16)  # Convert ms to samples
+                end_sample = int(segment[1] * 16)
+                items.append((index, segment, speech[start_sample:end_sample]))
+
+        results: list[list[SttSegment]] = [[] for _ in audios]
+        languages: list[list[str]] = [[] for _ in audios]
 
         start_time = time.time()
-        seg_idx = 0
-        languages: list[str] = []
-        for segment in tqdm(vad_segments, desc="Transcribing"):
-            start_sample = int(segment[0] * 16)  # Convert ms to samples
-            end_sample = int(segment[1] * 16)
-            segment_audio = speech[start_sample:end_sample]
-
-            # Get ASR results for segment
-            asr_result = self.asr_model.generate(
-                input=segment_audio,
+        asr_results = []
+        if len(items) > 0:
+            # Get ASR results for all segments
+            asr_results = self.asr_model.generate(
+                input=[segment_audio for _, _, segment_audio in items],
                 language=language,
                 use_itn=self.with_punct,
+                batch_size=self.get_batch_size(),
                 disable_pbar=True,
             )
 
-            if not asr_result:
-                continue
-
-            start_time = max(0, segment[0] / 1000.0 + self.offset_in_seconds)
-            end_time = segment[1] / 1000.0 + self.offset_in_seconds
+        for (index, segment, _), asr_result in zip(items, asr_results):
+            start_time_s = max(0, segment[0] / 1000.0 + self.offset_in_seconds)
+            end_time_s = segment[1] / 1000.0 + self.offset_in_seconds
 
-            text = asr_result[0]["text"]
-            lang = get_lang(text)
-            languages.append(lang)
+            text = asr_result["text"]
+            languages[index].append(get_lang(text))
 
             # Convert ASR result to TranscribeResult format
-            segment_result = SttSegment(
-                text=rich_transcription_postprocess(text),
-                start=start_time,  # Convert ms to seconds
-                end=end_time,
+            results[index].append(
+                SttSegment(
+                    text=rich_transcription_postprocess(text),
+                    start=start_time_s,  # Convert ms to seconds
+                    end=end_time_s,
+                )
             )
-            results.append(segment_result)
-            seg_idx += 1
 
         logger.info("ASR took %.2f seconds", time.time() - start_time)
 
         # 返回命中最多的 lang
-        hit_lang = max(set(languages), key=languages.count)
-        return results, hit_lang
+        hit_langs = [
+            max(set(langs), key=langs.count) if langs else "" for langs in languages
+        ]
+        return list(zip(results, hit_langs))
 
     # TODO: config 没有用上
     def transcribe_to_result(self, audio, config):
+        return self.transcribe_batch_to_result([audio], config)[0]
+
+    def transcribe_batch_to_result(self, audios, config):
         self.load()
 
-        sr, data = audio
         # 这个模型只有 language 能用上，其他参数用不上
         language = config.language
 
         ref_text = config.refrence_transcript
-        if ref_text.strip():
+        if ref_text and ref_text.strip():
             # 这个模型不支持
             logger.warning("SenseVoiceModel doesn't support refrence_transcript")
             ref_text = ""
 
-        segments, language = self.asr_transcribe(sr, data, language=language)
-        return SttResult(segments=segments, language=language, duration=len(data) / sr)
+        transcribed = self.asr_transcribe_batch(audios, language=language)
+        return [
+            SttResult(segments=segments, language=lang, duration=len(data) / sr)
+            for (sr, data), (segments, lang) in zip(audios, transcribed)
+        ]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,214 @@
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import Any, Hashable, Iterable, Iterator, Optional, Union
+
+import numpy as np
+from cachetools import LRUCache
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+from modules import config as global_config
+from modules.core.pipeline.processor import NP_AUDIO
+from modules.utils import resampler
+
+
+@dataclass(frozen=True)
+class SpeechRegion:
+    # 单位为秒
+    start: float
+    end: float
+
+
+class StreamVad:
+    """
+    增量 vad ，push 输入 16k 单声道 float32 音频帧，返回已经确定、不会再变化的语音段落，
+    flush 返回剩下的段落
+
+    NOTE: 每输入 30s 对 buffer 重新做一次 vad ，只输出后面已经跟着足够长静音的段落，
+    buffer 中最多是一个未确定的段落和新输入，所以 max_speech_duration_s 需要是有限值
+    """
+
+    SAMPLE_RATE = 16000
+    STEP_S = 30
+
+    def __init__(self, vad_options: VadOptions) -> None:
+        assert np.isfinite(
+            vad_options.max_speech_duration_s
+        ), "max_speech_duration_s must be finite"
+        self.vad_options = vad_options
+        self.step = self.STEP_S * self.SAMPLE_RATE
+        # 音频末尾这么长之内结束的段落，在输入更多音频之后还可能延长
+        lookback_ms = vad_options.min_silence_duration_ms + vad_options.speech_pad_ms
+        self.lookback = int(lookback_ms / 1000 * self.SAMPLE_RATE)
+
+        self.buffer = np.empty(0, dtype=np.float32)
+        # buffer[0] 在整个音频中的位置，之后输出的段落都不会早于这个位置
+        self.offset = 0
+        # 上次 vad 之后 buffer 中留下的长度
+        self.kept = 0
+
+    def process(self, final: bool) -> list[SpeechRegion]:
+        sr = self.SAMPLE_RATE
+        stable = len(self.buffer) if final else len(self.buffer) - self.lookback
+        regions: list[SpeechRegion] = []
+        keep = stable
+        for speech in get_speech_timestamps(self.buffer, vad_options=self.vad_options):
+            if speech["end"] > stable:
+                keep = min(keep, speech["start"])
+                break
+            regions.append(
+                SpeechRegion(
+                    start=(self.offset + speech["start"]) / sr,
+                    end=(self.offset + speech["end"]) / sr,
+                )
+            )
+        self.buffer = self.buffer[keep:]
+        self.offset += keep
+        self.kept = len(self.buffer)
+        return regions
+
+    def push(self, frame: np.ndarray) -> list[SpeechRegion]:
+        self.buffer = np.concatenate([self.buffer, np.asarray(frame, dtype=np.float32)])
+        if len(self.buffer) - self.kept >= self.step + self.lookback:
+            return self.process(final=False)
+        return []
+
+    def flush(self) -> list[SpeechRegion]:
+        if len(self.buffer) == 0:
+            return []
+        return self.process(final=True)
+
+
+class VadCache:
+    """
+    vad 结果缓存
+
+    silero vad 只支持 16k ，这里先把音频转为 16k 单声道 float32 的副本再做 vad ，
+    得到的语音段落换算为秒，按 (音频内容的摘要, vad 参数) 在所有请求之间缓存
+
+    同一段录音换输出格式、换模型反复识别时，vad 只需要做一次
+    缓存条数由 stt_vad_cache_size 控制，为 0 时不缓存
+
+    上传的文件按文件内容的摘要缓存，解码和 vad 都是增量进行的，见 StreamVad
+    """
+
+    SAMPLE_RATE = 16000
+
+    cache: Union[LRUCache, None] = None
+    lock = threading.Lock()
+    hits = 0
+    misses = 0
+
+    @classmethod
+    def get_cache(cls) -> Union[LRUCache, None]:
+        size = global_config.runtime_env_vars.stt_vad_cache_size
+        size = 256 if size is None else int(size)
+        if size <= 0:
+            return None
+        if cls.cache is None or cls.cache.maxsize != size:
+            cls.cache = LRUCache(maxsize=size)
+        return cls.cache
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls.lock:
+            if cls.cache is not None:
+                cls.cache.clear()
+            cls.hits = 0
+            cls.misses = 0
+
+    @classmethod
+    def stats(cls) -> dict:
+        with cls.lock:
+            total = cls.hits + cls.misses
+            return dict(
+                size=len(cls.cache) if cls.cache is not None else 0,
+                hits=cls.hits,
+                misses=cls.misses,
+                hit_rate=cls.hits / total if total else 0.0,
+            )
+
+    @staticmethod
+    def get_digest(audio: NP_AUDIO) -> str:
+        """
+        原始音频 (采样率、格式、形状和内容) 的摘要，命中缓存时不需要再重采样
+        """
+        sr, data = audio
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{sr}:{data.dtype.str}:{data.shape}".encode())
+        digest.update(np.ascontiguousarray(data).data)
+        return digest.hexdigest()
+
+    @classmethod
+    def to_vad_audio(cls, audio: NP_AUDIO) -> np.ndarray:
+        """
+        转为 16k 单声道 float32
+        """
+        sr, data = audio
+        if np.issubdtype(data.dtype, np.integer):
+            data = data.astype(np.float32) / np.iinfo(data.dtype).max
+        else:
+            data = data.astype(np.float32, copy=False)
+        if data.ndim == 2:
+            data = data.mean(axis=1)
+        if sr != cls.SAMPLE_RATE:
+            data = resampler.resample(data, src_sr=sr, dst_sr=cls.SAMPLE_RATE)
+        return np.asarray(data, dtype=np.float32)
+
+    @classmethod
+    def detect(cls, audio: NP_AUDIO, vad_options: VadOptions) -> list[SpeechRegion]:
+        data = cls.to_vad_audio(audio)
+        return [
+            SpeechRegion(
+                start=speech["start"] / cls.SAMPLE_RATE,
+                end=speech["end"] / cls.SAMPLE_RATE,
+            )
+            for speech in get_speech_timestamps(data, vad_options=vad_options)
+        ]
+
+    @classmethod
+    def get(cls, key: Hashable) -> Any:
+        cache = cls.get_cache()
+        if cache is None:
+            return None
+        with cls.lock:
+            value = cache.get(key)
+            if value is not None:
+                cls.hits += 1
+            else:
+                cls.misses += 1
+            return value
+
+    @classmethod
+    def put(cls, key: Hashable, value: Any) -> None:
+        cache = cls.get_cache()
+        if cache is None:
+            return
+        with cls.lock:
+            cache[key] = value
+
+    @classmethod
+    def get_speech_regions(
+        cls, audio: NP_AUDIO, vad_options: Optional[VadOptions] = None
+    ) -> list[SpeechRegion]:
+        vad_options = vad_options or VadOptions()
+        key = ("audio", cls.get_digest(audio), repr(vad_options))
+        regions = cls.get(key)
+        if regions is not None:
+            return list(regions)
+
+        regions = cls.detect(audio, vad_options)
+        cls.put(key, tuple(regions))
+        return regions
+
+    @classmethod
+    def iter_speech_regions(
+        cls, frames: Iterable[np.ndarray], vad_options: VadOptions
+    ) -> Iterator[SpeechRegion]:
+        """
+        frames 为 16k 单声道 float32 音频帧，边输入边做 vad ，不需要完整的音频，见 StreamVad
+        """
+        vad = StreamVad(vad_options)
+        for frame in frames:
+            yield from vad.push(frame)
+        yield from vad.flush()
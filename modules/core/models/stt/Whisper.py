@@ -1,10 +1,10 @@
 import logging
+import os
 import threading
 from pathlib import Path
 from typing import Optional
 
 import jieba
-import librosa
 import numpy as np
 import stable_whisper
 import torch
@@ -16,10 +16,13 @@ from whisper.tokenizer import get_tokenizer
 from modules import config as global_config
 from modules.core.handler.datacls.stt_model import STTConfig
 from modules.core.models.stt.STTModel import STTModel, TranscribeResult
+from modules.core.models.stt.whisper.batch_decoder import WhisperBatchDecoder
+from modules.core.models.stt.whisper.model_pool import WhisperModelPool
 from modules.core.models.stt.whisper.whisper_dcls import SttResult, SttSegment, SttWord
 from modules.core.models.stt.whisper.writer import get_writer
 from modules.core.pipeline.processor import NP_AUDIO
 from modules.devices import devices
+from modules.utils import resampler
 from modules.utils.detect_lang import guess_lang
 from modules.utils.monkey_tqdm import disable_tqdm
 
@@ -98,7 +101,8 @@ class WhisperModel(STTModel):
 
     logger = logging.getLogger(__name__)
 
-    model: Optional[FasterWhisperModel] = None
+    # 按模型目录缓存，不同大小的模型互不覆盖
+    pools: dict[str, WhisperModelPool[FasterWhisperModel]] = {}
 
     def __init__(self, model_id: str):
         super().__init__(model_id)
@@ -118,51 +122,69 @@ class WhisperModel(STTModel):
         self.device = devices.get_device_for("whisper")
         self.dtype = devices.dtype
 
-    def is_loaded(self) -> bool:
-        return WhisperModel.model is not None
+    def get_num_workers(self) -> int:
+        workers = global_config.runtime_env_vars.whisper_workers
+        if workers is None:
+            # 每个副本都要占用一份中间结果的显存，gpu 上默认只用一个
+            if self.device.type == "cuda":
+                return 1
+            return max(1, min(4, (os.cpu_count() or 1) // 4))
+        return max(1, int(workers))
+
+    def get_cpu_threads(self, workers: int) -> int:
+        if self.device.type != "cpu":
+            # 0 即 CTranslate2 的默认值
+            return 0
+        # 所有副本一起分摊 cpu 核心，避免线程数超过核心数
+        return max(1, (os.cpu_count() or 1) // workers)
 
-    def load(self):
-        if WhisperModel.model is None:
-            with self.lock:
-                self.logger.info(f"Loading Whisper model [{self.model_size}]...")
+    def is_loaded(self) -> bool:
+        return str(self.model_dir) in WhisperModel.pools
 
-                WhisperModel.model = FasterWhisperModel(
-                    model_size_or_path=str(self.model_dir),
-                    download_root=str(self.model_dir),
-                    device=self.device.type,
-                    compute_type=(
-                        "float16" if self.dtype == torch.float16 else "float32"
-                    ),
-                    local_files_only=True,
+    def get_pool(self) -> WhisperModelPool[FasterWhisperModel]:
+        key = str(self.model_dir)
+        pool = WhisperModel.pools.get(key)
+        if pool is not None:
+            return pool
+        with self.lock:
+            if key not in WhisperModel.pools:
+                workers = self.get_num_workers()
+                self.logger.info(
+                    f"Loading Whisper model [{self.model_size}] "
+                    f"with {workers} replicas..."
                 )
-                WhisperModel.model = stable_whisper.load_faster_whisper(
+                # NOTE: load_faster_whisper 内部创建 faster_whisper 的模型并注入 align 等方法，
+                # 权重只读取一次，num_workers 个 CTranslate2 副本共享这份权重
+                model = stable_whisper.load_faster_whisper(
                     model_size_or_path=str(self.model_dir),
                     local_files_only=True,
                     device=self.device.type,
+                    device_index=self.device.index or 0,
                     compute_type=(
                         "float16" if self.dtype == torch.float16 else "float32"
                     ),
+                    cpu_threads=self.get_cpu_threads(workers),
+                    num_workers=workers,
                 )
+                WhisperModel.pools[key] = WhisperModelPool(model, size=workers)
                 self.logger.info("Whisper model loaded.")
-        return WhisperModel.model
+            return WhisperModel.pools[key]
+
+    def load(self) -> FasterWhisperModel:
+        return self.get_pool().model
 
     @devices.after_gc()
     def unload(self):
-        if WhisperModel.model is None:
-            return
+        # 正在识别的请求还持有模型的引用，识别结束后才会释放
         with self.lock:
-            self.model = None
-            WhisperModel.unload()
-            del WhisperModel.model
-            WhisperModel.model = None
-            del self.model
+            WhisperModel.pools.pop(str(self.model_dir), None)
 
     def resample_audio(self, audio: NP_AUDIO):
         sr, data = audio
 
         if sr == self.SAMPLE_RATE:
             return sr, data
-        data = librosa.resample(data, orig_sr=sr, target_sr=self.SAMPLE_RATE)
+        data = resampler.resample(data, src_sr=sr, dst_sr=self.SAMPLE_RATE)
         return self.SAMPLE_RATE, data
 
     def ensure_float32(self, audio: NP_AUDIO):
@@ -212,10 +234,8 @@ class WhisperModel(STTModel):
         if tempperature is None or tempperature <= 0:
             tempperature = DEFAULT_TEMPERATURE
 
-        model = self.load()
-
         # 这里必须 disable tqdm ，因为 stable_whisper 似乎会抛出 gradio 不支持的 progress...
-        with disable_tqdm(
+        with self.get_pool().acquire() as model, disable_tqdm(
             enabled=global_config.runtime_env_vars.is_webui
             or global_config.runtime_env_vars.off_tqdm
         ):
@@ -246,13 +266,62 @@ class WhisperModel(STTModel):
             raise ValueError(f"Unknown result type: {type(result)}")
 
     def transcribe_to_result(self, audio: NP_AUDIO, config: STTConfig) -> SttResult:
-        has_ref = config.refrence_transcript.strip() != ""
+        has_ref = (config.refrence_transcript or "").strip() != ""
         if has_ref:
             result = self.force_align(audio=audio, config=config)
         else:
             result = self.generate_transcribe(audio=audio, config=config)
         return result
 
+    def transcribe_batch_to_result(
+        self, audios: list[NP_AUDIO], config: STTConfig
+    ) -> list[SttResult]:
+        """
+        把不超过 30s 的音频放在一个 batch 里一起识别
+
+        超过 30s 的音频、以及批量解码结果不可靠 (需要温度回退等) 的音频，回退到逐段识别
+        """
+        if (config.refrence_transcript or "").strip() != "":
+            return super().transcribe_batch_to_result(audios=audios, config=config)
+
+        pool = self.get_pool()
+        decoder = WhisperBatchDecoder(pool.model)
+        datas = [self.normalize_audio(audio=audio)[1] for audio in audios]
+        indices = [i for i, data in enumerate(datas) if len(data) <= decoder.n_samples]
+
+        temperature = config.temperature
+        if temperature is None or temperature <= 0:
+            temperature = DEFAULT_TEMPERATURE[0]
+
+        decoded = [None] * len(audios)
+        if len(indices) > 0:
+            with pool.acquire():
+                items = decoder.decode(
+                    [datas[i] for i in indices],
+                    language=config.language,
+                    prompt=config.prompt,
+                    prefix=config.prefix,
+                    temperature=temperature,
+                    best_of=config.best_of or 1,
+                    beam_size=config.beam_size or 5,
+                    patience=config.patience or 1,
+                    length_penalty=config.length_penalty or 1,
+                    suppress_tokens=[-1] + number_tokens,
+                )
+            for i, item in zip(indices, items):
+                decoded[i] = item
+
+        results: list[SttResult] = []
+        for audio, item in zip(audios, decoded):
+            if item is None:
+                results.append(self.generate_transcribe(audio=audio, config=config))
+                continue
+            # NOTE: 和 stable_whisper 的 transcribe 一样，对结果做一次默认的 regroup
+            result = stable_whisper.WhisperResult(item)
+            result.regroup(True)
+            results.append(st_result2result(result, get_audio_duration(audio)))
+        return results
+
     def force_align_after_refine(
         self, result: stable_whisper.WhisperResult, refrence_transcript: str
     ) -> stable_whisper.WhisperResult:
@@ -315,7 +384,6 @@ class WhisperModel(STTModel):
         """
         文稿匹配
         """
-        model = self.load()
         prompt = config.prompt
         prefix = config.prefix
 
@@ -332,7 +400,7 @@ class WhisperModel(STTModel):
 
         _, audio_data = self.normalize_audio(audio=audio)
         # 这里必须 disable tqdm ，因为 stable_whisper 似乎会抛出 gradio 不支持的 progress...
-        with disable_tqdm(
+        with self.get_pool().acquire() as model, disable_tqdm(
             enabled=global_config.runtime_env_vars.is_webui
             or global_config.runtime_env_vars.off_tqdm
         ):
@@ -0,0 +1,334 @@
+import itertools
+from collections import Counter
+from typing import Optional, Union
+
+import numpy as np
+from faster_whisper import WhisperModel as FasterWhisperModel
+from faster_whisper.audio import pad_or_trim
+from faster_whisper.tokenizer import Tokenizer
+from faster_whisper.transcribe import (
+    get_compression_ratio,
+    get_ctranslate2_storage,
+    get_suppressed_tokens,
+)
+
+# NOTE: 以下参数和 faster_whisper.transcribe 的默认值保持一致
+PREPEND_PUNCTUATIONS = "\"'“¿([{-"
+APPEND_PUNCTUATIONS = "\"'.。,，!！?？:：”)]}、"
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOG_PROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+MAX_INITIAL_TIMESTAMP = 1.0
+
+
+class PrecomputedAlignment:
+    """
+    faster_whisper 的 add_word_timestamps 内部通过 self.find_alignment 逐条对齐，
+    这里把批量对齐好的结果交给它，复用它对词时间戳的修正逻辑
+    """
+
+    def __init__(self, model: FasterWhisperModel, alignment: list[dict]):
+        self.feature_extractor = model.feature_extractor
+        self.alignment = alignment
+
+    def find_alignment(self, tokenizer, text_tokens, encoder_output, num_frames):
+        return self.alignment
+
+
+class WhisperBatchDecoder:
+    """
+    把多段不超过 30s 的音频 pad 到 30s 窗口，一次 encode / generate / align 整个 batch
+
+    每段的结果为 stable_whisper.WhisperResult 可以接受的 dict:
+    {"language": str, "segments": [{"start", "end", "text", "words": [...]}]}
+
+    和 faster_whisper.transcribe 逐段识别相比，这里每段只解码一个窗口、只用第一个温度，
+    以下情况返回 None ，由调用方回退到逐段识别:
+    - 解码结果触发了温度回退 (压缩率过高 / 平均 logprob 过低)
+    - 解码在窗口结束前停止 (窗口后面还有没识别的内容)
+    - 检测到的语言和 batch 中多数的语言不同
+    """
+
+    def __init__(self, model: FasterWhisperModel):
+        self.model = model
+
+    @property
+    def n_samples(self) -> int:
+        extractor = self.model.feature_extractor
+        return extractor.nb_max_frames * extractor.hop_length
+
+    def get_features(self, audios: list[np.ndarray]) -> tuple[np.ndarray, list[int]]:
+        extractor = self.model.feature_extractor
+        features = []
+        num_frames = []
+        for audio in audios:
+            frames = min(extractor.nb_max_frames, len(audio) // extractor.hop_length)
+            feature = extractor(audio)[:, :frames]
+            features.append(pad_or_trim(feature, extractor.nb_max_frames))
+            num_frames.append(frames)
+        return np.stack(features).astype(np.float32), num_frames
+
+    def encode(self, features: np.ndarray):
+        # 和 FasterWhisperModel.encode 一致，只是输入已经带了 batch 维度
+        model = self.model.model
+        to_cpu = model.device == "cuda" and len(model.device_index) > 1
+        return model.encode(get_ctranslate2_storage(features), to_cpu=to_cpu)
+
+    def detect_languages(self, encoder_output, language: Optional[str]) -> list[str]:
+        if language:
+            return [language] * encoder_output.shape[0]
+        if not self.model.model.is_multilingual:
+            return ["en"] * encoder_output.shape[0]
+        return [
+            results[0][0][2:-2]
+            for results in self.model.model.detect_language(encoder_output)
+        ]
+
+    def split_segments(
+        self, tokens: list[int], tokenizer: Tokenizer, num_frames: int
+    ) -> Union[list[dict], None]:
+        """
+        按时间戳 token 切分 segment ，和 generate_segments 中 seek=0 的窗口处理一致
+
+        如果解码没有覆盖到窗口结尾，返回 None
+        """
+        model = self.model
+        timestamp_begin = tokenizer.timestamp_begin
+
+        single_timestamp_ending = (
+            len(tokens) >= 2 and tokens[-2] < timestamp_begin <= tokens[-1]
+        )
+        consecutive_timestamps = [
+            i
+            for i in range(1, len(tokens))
+            if tokens[i] >= timestamp_begin and tokens[i - 1] >= timestamp_begin
+        ]
+
+        if len(consecutive_timestamps) == 0:
+            duration = num_frames * model.feature_extractor.time_per_frame
+            timestamps = [token for token in tokens if token >= timestamp_begin]
+            if len(timestamps) > 0 and timestamps[-1] != timestamp_begin:
+                duration = (timestamps[-1] - timestamp_begin) * model.time_precision
+            return [dict(seek=0, start=0.0, end=duration, tokens=tokens)]
+
+        slices = list(consecutive_timestamps)
+        if single_timestamp_ending:
+            slices.append(len(tokens))
+
+        segments = []
+        last_slice = 0
+        for current_slice in slices:
+            sliced_tokens = tokens[last_slice:current_slice]
+            segments.append(
+                dict(
+                    seek=0,
+                    start=(sliced_tokens[0] - timestamp_begin) * model.time_precision,
+                    end=(sliced_tokens[-1] - timestamp_begin) * model.time_precision,
+                    tokens=sliced_tokens,
+                )
+            )
+            last_slice = current_slice
+
+        if not single_timestamp_ending:
+            # 没有以单个时间戳结尾，说明最后一段没说完，剩下的超过 1s 就交给逐段识别
+            last_position = tokens[last_slice - 1] - timestamp_begin
+            remaining = num_frames - last_position * model.input_stride
+            if remaining > model.frames_per_second:
+                return None
+        return segments
+
+    def to_words(
+        self, tokenizer: Tokenizer, text_tokens: list[int], alignment
+    ) -> list[dict]:
+        """
+        和 FasterWhisperModel.find_alignment 中 model.align 之后的处理一致
+        """
+        if len(text_tokens) == 0:
+            return []
+        text_indices = np.array([pair[0] for pair in alignment.alignments])
+        time_indices = np.array([pair[1] for pair in alignment.alignments])
+
+        words, word_tokens = tokenizer.split_to_word_tokens(
+            text_tokens + [tokenizer.eot]
+        )
+        if len(word_tokens) <= 1:
+            return []
+        word_boundaries = np.pad(np.cumsum([len(t) for t in word_tokens[:-1]]), (1, 0))
+        if len(word_boundaries) <= 1:
+            return []
+
+        jumps = np.pad(np.diff(text_indices), (1, 0), constant_values=1).astype(bool)
+        jump_times = time_indices[jumps] / self.model.tokens_per_second
+        start_times = jump_times[word_boundaries[:-1]]
+        end_times = jump_times[word_boundaries[1:]]
+        word_probabilities = [
+            np.mean(alignment.text_token_probs[i:j])
+            for i, j in zip(word_boundaries[:-1], word_boundaries[1:])
+        ]
+        return [
+            dict(
+                word=word, tokens=tokens, start=start, end=end, probability=probability
+            )
+            for word, tokens, start, end, probability in zip(
+                words, word_tokens, start_times, end_times, word_probabilities
+            )
+        ]
+
+    def decode(
+        self,
+        audios: list[np.ndarray],
+        language: Optional[str] = None,
+        prompt: Union[str, list[int], None] = None,
+        prefix: Optional[str] = None,
+        temperature: float = 0.0,
+        best_of: int = 1,
+        beam_size: int = 5,
+        patience: float = 1,
+        length_penalty: float = 1,
+        suppress_tokens: list[int] = [-1],
+    ) -> list[Union[dict, None]]:
+        """
+        audios 为 16k 单声道 float32 ，长度不超过 30s
+        """
+        model = self.model
+        features, num_frames = self.get_features(audios)
+        encoder_output = self.encode(features)
+
+        languages = self.detect_languages(encoder_output, language)
+        batch_language = Counter(languages).most_common(1)[0][0]
+        tokenizer = Tokenizer(
+            model.hf_tokenizer,
+            model.model.is_multilingual,
+            task="transcribe",
+            language=batch_language,
+        )
+
+        previous_tokens = []
+        if isinstance(prompt, str):
+            previous_tokens = tokenizer.encode(" " + prompt.strip())
+        elif prompt:
+            previous_tokens = list(prompt)
+        prompt_tokens = model.get_prompt(
+            tokenizer, previous_tokens, without_timestamps=False, prefix=prefix
+        )
+
+        if temperature > 0:
+            kwargs = dict(
+                beam_size=1,
+                num_hypotheses=best_of,
+                sampling_topk=0,
+                sampling_temperature=temperature,
+            )
+        else:
+            kwargs = dict(beam_size=beam_size, patience=patience)
+        generated = model.model.generate(
+            encoder_output,
+            [prompt_tokens] * len(audios),
+            length_penalty=length_penalty,
+            max_length=model.max_length,
+            return_scores=True,
+            return_no_speech_prob=True,
+            suppress_blank=True,
+            suppress_tokens=get_suppressed_tokens(tokenizer, suppress_tokens),
+            max_initial_timestamp_index=int(
+                round(MAX_INITIAL_TIMESTAMP / model.time_precision)
+            ),
+            **kwargs,
+        )
+
+        items: list[Union[list[dict], None]] = []
+        for lang, result, frames in zip(languages, generated, num_frames):
+            tokens = result.sequences_ids[0]
+            seq_len = len(tokens)
+            avg_logprob = (
+                result.scores[0] * (seq_len**length_penalty) / (seq_len + 1)
+            )
+            compression_ratio = get_compression_ratio(tokenizer.decode(tokens).strip())
+
+            if (
+                result.no_speech_prob > NO_SPEECH_THRESHOLD
+                and avg_logprob <= LOG_PROB_THRESHOLD
+            ):
+                # 静音
+                items.append([])
+            elif (
+                lang != batch_language
+                or compression_ratio > COMPRESSION_RATIO_THRESHOLD
+                or avg_logprob < LOG_PROB_THRESHOLD
+            ):
+                items.append(None)
+            else:
+                items.append(self.split_segments(tokens, tokenizer, frames))
+
+        # 整个 batch 一起对齐词时间戳
+        text_tokens = [
+            list(
+                itertools.chain.from_iterable(
+                    [t for t in seg["tokens"] if t < tokenizer.eot] for seg in segments
+                )
+            )
+            if segments
+            else []
+            for segments in items
+        ]
+        alignments = model.model.align(
+            encoder_output,
+            tokenizer.sot_sequence,
+            # NOTE: batch 中的每一项都要有输入，没有文本的用 eot 占位，结果不会被使用
+            [tokens or [tokenizer.eot] for tokens in text_tokens],
+            num_frames,
+            median_filter_width=7,
+        )
+
+        results: list[Union[dict, None]] = []
+        for segments, tokens, alignment, frames in zip(
+            items, text_tokens, alignments, num_frames
+        ):
+            if segments is None:
+                results.append(None)
+                continue
+            if tokens:
+                words = self.to_words(tokenizer, tokens, alignment)
+                FasterWhisperModel.add_word_timestamps(
+                    PrecomputedAlignment(model, words),
+                    segments,
+                    tokenizer,
+                    None,
+                    frames,
+                    PREPEND_PUNCTUATIONS,
+                    APPEND_PUNCTUATIONS,
+                    last_speech_timestamp=0.0,
+                )
+            results.append(
+                dict(
+                    language=batch_language,
+                    segments=self.to_result_segments(segments, tokenizer),
+                )
+            )
+        return results
+
+    def to_result_segments(
+        self, segments: list[dict], tokenizer: Tokenizer
+    ) -> list[dict]:
+        result_segments = []
+        for segment in segments:
+            text = tokenizer.decode(segment["tokens"])
+            if segment["start"] == segment["end"] or not text.strip():
+                continue
+            result_segments.append(
+                dict(
+                    start=segment["start"],
+                    end=segment["end"],
+                    text=text,
+                    words=[
+                        dict(
+                            word=w["word"],
+                            start=w["start"],
+                            end=w["end"],
+                            probability=w["probability"],
+                        )
+                        for w in segment.get("words", [])
+                    ],
+                )
+            )
+        return result_segments
@@ -0,0 +1,35 @@
+import threading
+from contextlib import contextmanager
+from typing import Generic, Iterator, TypeVar
+
+T = TypeVar("T")
+
+
+class WhisperModelPool(Generic[T]):
+    """
+    一份权重、多个推理副本的模型池，每个请求从池中拿到一个副本
+
+    NOTE: CTranslate2 的 num_workers 会在设备上创建多个副本，同一个设备上的副本共享权重，
+    每次 encode / generate / align 调用由空闲的副本执行。
+    这里再按请求限制并发数不超过副本数，一个请求的整个识别过程都独占一个副本，
+    超出的请求排队等待，而不是和正在识别的请求交错执行、互相拖慢
+    """
+
+    def __init__(self, model: T, size: int) -> None:
+        assert size > 0, "size must be positive"
+        self.model = model
+        self.size = size
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.in_use = 0
+
+    @contextmanager
+    def acquire(self) -> Iterator[T]:
+        with self.slots:
+            with self.lock:
+                self.in_use += 1
+            try:
+                yield self.model
+            finally:
+                with self.lock:
+                    self.in_use -= 1
@@ -5,6 +5,7 @@ from typing import Any, Generator, Union
 import numpy as np
 
 from modules.core.models.AudioReshaper import AudioReshaper
+from modules.core.models.RefWavCache import RefWavCache
 from modules.core.models.tts.ChatTTS.ChatTTS import (
     ChatTTS,
     load_chat_tts,
@@ -43,6 +44,9 @@ class ChatTTSModel(TTSModel):
     def is_downloaded(self) -> bool:
         return Path("./models/ChatTTS").exists()
 
+    def get_model_paths(self) -> list[Path]:
+        return [Path("./models/ChatTTS")]
+
     def get_sample_rate(self) -> int:
         return 24000
 
@@ -50,7 +54,10 @@ class ChatTTSModel(TTSModel):
         return self.chat is not None
 
     def load(self) -> "ChatTTS.Chat":
-        self.chat = load_chat_tts()
+        chat = load_chat_tts()
+        if chat is not self.chat:
+            self.update_hash()
+        self.chat = chat
         return self.chat
 
     def unload(self, context: TTSPipelineContext = None) -> None:
@@ -83,6 +90,22 @@ class ChatTTSModel(TTSModel):
     def get_infer(self, context: TTSPipelineContext):
         return ChatTTSInfer(self.load())
 
+    def get_spk_condition(
+        self, spk: TTSSpeaker, emotion: str = "", infer: ChatTTSInfer = None
+    ):
+        infer = infer or self.get_infer(context=None)
+        return self.cached_spk_condition(
+            spk=spk,
+            emotion=emotion,
+            kind="dvae_encode",
+            compute=lambda ref: infer._sample_audio_speaker(
+                RefWavCache.get_ref_wav(
+                    spk=spk, ref=ref, target_sr=self.get_sample_rate()
+                )
+            ),
+            device=infer.device,
+        )
+
     def interrupt(self, context: TTSPipelineContext = None) -> None:
         if self.current_infer is not None:
             self.current_infer.interrupt()
@@ -107,8 +130,10 @@ class ChatTTSModel(TTSModel):
 
         seg0 = segments[0]
         spk_emb = self.get_spk_emb(segment=seg0, context=context) if seg0.spk else None
-        spk_wav, txt_smp = self.get_ref_wav(seg0)
-        spk_smp = infer._sample_audio_speaker(spk_wav) if spk_wav is not None else None
+        txt_smp = self.get_ref_text(seg0)
+        spk_smp = self.get_spk_condition(
+            spk=seg0.spk, emotion=seg0.emotion, infer=infer
+        )
         top_P = seg0.top_p
         top_K = seg0.top_k
         temperature = seg0.temperature
@@ -161,7 +186,8 @@ class ChatTTSModel(TTSModel):
         else:
 
             def _gen() -> Generator[list[NP_AUDIO], None, None]:
-                audio_arr_buff = None
+                # NOTE: 每个 segment 一个 chunk 列表，结束时拼接一次用于写入 cache
+                chunks_buff: list[list[np.ndarray]] = [[] for _ in texts]
                 with SeedContext(seed, cudnn_deterministic=False):
                     for results in infer.generate_audio_stream(
                         text=texts,
@@ -179,7 +205,7 @@ class ChatTTSModel(TTSModel):
                     ):
                         results = [
                             (
-                                np.empty(0)
+                                np.empty(0, dtype=np.float32)
                                 # None 应该是生成失败, size === 0 是生成结束
                                 if data is None or data.size == 0
                                 # NOTE: data[0] 的意思是 立体声 => mono audio
@@ -190,14 +216,20 @@ class ChatTTSModel(TTSModel):
                         audio_arr: list[NP_AUDIO] = [(sr, data) for data in results]
                         yield audio_arr
 
-                        if audio_arr_buff is None:
-                            audio_arr_buff = audio_arr
-                        else:
-                            for i, data in enumerate(results):
-                                sr1, before = audio_arr_buff[i]
-                                buff = np.concatenate([before, data], axis=0)
-                                audio_arr_buff[i] = (sr1, buff)
+                        for i, data in enumerate(results):
+                            chunks_buff[i].append(data)
                 if not context.stop:
+                    audio_arr_buff: list[NP_AUDIO] = [
+                        (
+                            sr,
+                            (
+                                np.concatenate(chunks, axis=0)
+                                if chunks
+                                else np.empty(0, dtype=np.float32)
+                            ),
+                        )
+                        for chunks in chunks_buff
+                    ]
                     self.set_cache(
                         segments=segments, context=context, value=audio_arr_buff
                     )
@@ -124,11 +124,11 @@ class CosyVoiceFrontEnd:
         }
         return model_input
 
-    def frontend_zero_shot(
-        self, tts_text, prompt_text, prompt_speech_16k, resample_rate
-    ):
-        tts_text_token, tts_text_token_len = self._extract_text_token(tts_text)
-        prompt_text_token, prompt_text_token_len = self._extract_text_token(prompt_text)
+    @torch.no_grad()
+    def frontend_prompt_speech(self, prompt_speech_16k, resample_rate) -> dict:
+        """
+        从 prompt speech 提取的特征，只和参考音频有关，可以缓存之后复用
+        """
         prompt_speech_resample = torchaudio.transforms.Resample(
             orig_freq=16000, new_freq=resample_rate
         )(prompt_speech_16k)
@@ -143,6 +143,31 @@ class CosyVoiceFrontEnd:
             )
             speech_token, speech_token_len[:] = speech_token[:, :token_len], token_len
         embedding = self._extract_spk_embedding(prompt_speech_16k)
+        return {
+            "speech_feat": speech_feat,
+            "speech_feat_len": speech_feat_len,
+            "speech_token": speech_token,
+            "speech_token_len": speech_token_len,
+            "embedding": embedding,
+        }
+
+    def frontend_zero_shot(
+        self,
+        tts_text,
+        prompt_text,
+        prompt_speech_16k,
+        resample_rate,
+        prompt_condition: dict = None,
+    ):
+        tts_text_token, tts_text_token_len = self._extract_text_token(tts_text)
+        prompt_text_token, prompt_text_token_len = self._extract_text_token(prompt_text)
+        if prompt_condition is None:
+            prompt_condition = self.frontend_prompt_speech(
+                prompt_speech_16k, resample_rate
+            )
+        speech_token = prompt_condition["speech_token"]
+        speech_token_len = prompt_condition["speech_token_len"]
+        embedding = prompt_condition["embedding"]
         model_input = {
             "text": tts_text_token,
             "text_len": tts_text_token_len,
@@ -152,8 +177,8 @@ class CosyVoiceFrontEnd:
             "llm_prompt_speech_token_len": speech_token_len,
             "flow_prompt_speech_token": speech_token,
             "flow_prompt_speech_token_len": speech_token_len,
-            "prompt_speech_feat": speech_feat,
-            "prompt_speech_feat_len": speech_feat_len,
+            "prompt_speech_feat": prompt_condition["speech_feat"],
+            "prompt_speech_feat_len": prompt_condition["speech_feat_len"],
             "llm_embedding": embedding,
             "flow_embedding": embedding,
         }
@@ -182,35 +207,31 @@ class CosyVoiceFrontEnd:
         return model_input
 
     def frontend_instruct2(
-        self, tts_text, instruct_text, prompt_speech_16k, resample_rate
+        self,
+        tts_text,
+        instruct_text,
+        prompt_speech_16k,
+        resample_rate,
+        prompt_condition: dict = None,
     ):
         tts_text_token, tts_text_token_len = self._extract_text_token(tts_text)
         prompt_text_token, prompt_text_token_len = self._extract_text_token(
             instruct_text + "<|endofprompt|>"
         )
-        prompt_speech_resample = torchaudio.transforms.Resample(
-            orig_freq=16000, new_freq=resample_rate
-        )(prompt_speech_16k)
-        speech_feat, speech_feat_len = self._extract_speech_feat(prompt_speech_resample)
-        speech_token, speech_token_len = self._extract_speech_token(prompt_speech_16k)
-        if resample_rate == 24000:
-            # cosyvoice2, force speech_feat % speech_token = 2
-            token_len = min(int(speech_feat.shape[1] / 2), speech_token.shape[1])
-            speech_feat, speech_feat_len[:] = (
-                speech_feat[:, : 2 * token_len],
-                2 * token_len,
+        if prompt_condition is None:
+            prompt_condition = self.frontend_prompt_speech(
+                prompt_speech_16k, resample_rate
             )
-            speech_token, speech_token_len[:] = speech_token[:, :token_len], token_len
-        embedding = self._extract_spk_embedding(prompt_speech_16k)
+        embedding = prompt_condition["embedding"]
         model_input = {
             "text": tts_text_token,
             "text_len": tts_text_token_len,
             "prompt_text": prompt_text_token,
             "prompt_text_len": prompt_text_token_len,
-            "flow_prompt_speech_token": speech_token,
-            "flow_prompt_speech_token_len": speech_token_len,
-            "prompt_speech_feat": speech_feat,
-            "prompt_speech_feat_len": speech_feat_len,
+            "flow_prompt_speech_token": prompt_condition["speech_token"],
+            "flow_prompt_speech_token_len": prompt_condition["speech_token_len"],
+            "prompt_speech_feat": prompt_condition["speech_feat"],
+            "prompt_speech_feat_len": prompt_condition["speech_feat_len"],
             "llm_embedding": embedding,
             "flow_embedding": embedding,
         }
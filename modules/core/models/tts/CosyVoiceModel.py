@@ -14,7 +14,7 @@ import numpy as np
 import torch
 from hyperpyyaml import load_hyperpyyaml
 
-from modules.core.models.AudioReshaper import AudioReshaper
+from modules.core.models.RefWavCache import RefWavCache
 from modules.core.models.tts.CosyVoiceFE import CosyVoiceFrontEnd
 from modules.core.models.TTSModel import TTSModel
 from modules.core.pipeline.dcls import TTSPipelineContext, TTSSegment
@@ -22,7 +22,6 @@ from modules.core.pipeline.processor import NP_AUDIO
 from modules.core.spk import TTSSpeaker
 from modules.devices import devices
 from modules.repos_static.cosyvoice.cosyvoice.cli.model import CosyVoice2Model
-from modules.utils import audio_utils
 from modules.utils.SeedContext import SeedContext
 
 max_val = 0.8
@@ -81,6 +80,9 @@ class CosyVoiceTTSModel(TTSModel):
     def is_downloaded(self) -> bool:
         return self.model_dir.exists()
 
+    def get_model_paths(self) -> list[Path]:
+        return [self.model_dir]
+
     def is_loaded(self) -> bool:
         return CosyVoiceTTSModel.model is not None
 
@@ -137,6 +139,7 @@ class CosyVoiceTTSModel(TTSModel):
             model.hift.to(device=device, dtype=dtype)
 
             self.model = model
+            self.update_hash()
 
             devices.torch_gc()
             self.logger.info("CosyVoice model loaded.")
@@ -186,12 +189,20 @@ class CosyVoiceTTSModel(TTSModel):
         return {"tts_speech": torch.concat(tts_speeches, dim=1)}
 
     def inference_zero_shot(
-        self, tts_texts: list[str], prompt_text: str, prompt_speech_16k: torch.Tensor
+        self,
+        tts_texts: list[str],
+        prompt_text: str,
+        prompt_speech_16k: torch.Tensor,
+        prompt_condition: Optional[dict] = None,
     ):
         tts_speeches = []
         for text in tts_texts:
             model_input = self.frontend.frontend_zero_shot(
-                text, prompt_text, prompt_speech_16k, resample_rate=self.sample_rate
+                text,
+                prompt_text,
+                prompt_speech_16k,
+                resample_rate=self.sample_rate,
+                prompt_condition=prompt_condition,
             )
             for model_output in self.model.tts(**model_input):
                 tts_speeches.append(model_output["tts_speech"])
@@ -214,7 +225,11 @@ class CosyVoiceTTSModel(TTSModel):
         return {"tts_speech": torch.concat(tts_speeches, dim=1)}
 
     def inference_instruct(
-        self, tts_texts: list[str], prompt_speech_16k: torch.Tensor, instruct_text: str
+        self,
+        tts_texts: list[str],
+        prompt_speech_16k: torch.Tensor,
+        instruct_text: str,
+        prompt_condition: Optional[dict] = None,
     ):
         if self.frontend.instruct is False:
             raise ValueError(
@@ -227,6 +242,7 @@ class CosyVoiceTTSModel(TTSModel):
                 instruct_text=instruct_text,
                 prompt_speech_16k=prompt_speech_16k,
                 resample_rate=self.sample_rate,
+                prompt_condition=prompt_condition,
             )
             for model_output in self.model.tts(**model_input):
                 tts_speeches.append(model_output["tts_speech"])
@@ -245,16 +261,24 @@ class CosyVoiceTTSModel(TTSModel):
         return None
 
     def spk_to_ref_wav(self, spk: TTSSpeaker, emotion: str = ""):
-        ref_data = spk.get_ref(lambda x: x.emotion == emotion)
-        if ref_data is None:
-            return None, None
-        wav = audio_utils.bytes_to_librosa_array(
-            audio_bytes=ref_data.wav, sample_rate=ref_data.wav_sr
+        return RefWavCache.get_spk_ref_wav(
+            spk=spk, get_func=lambda x: x.emotion == emotion, target_sr=target_sr
         )
-        _, wav = AudioReshaper.normalize_audio(
-            audio=(ref_data.wav_sr, wav), target_sr=target_sr
+
+    def get_spk_condition(self, spk: TTSSpeaker, emotion: str = ""):
+        self.load()
+        return self.cached_spk_condition(
+            spk=spk,
+            emotion=emotion,
+            kind=f"prompt_speech_{self.sample_rate}",
+            compute=lambda ref: self.frontend.frontend_prompt_speech(
+                torch.from_numpy(
+                    RefWavCache.get_ref_wav(spk=spk, ref=ref, target_sr=target_sr)
+                ).unsqueeze(0),
+                resample_rate=self.sample_rate,
+            ),
+            device=self.device,
         )
-        return wav, ref_data.text
 
     def get_sample_rate(self) -> int:
         return self.sample_rate
@@ -299,6 +323,7 @@ class CosyVoiceTTSModel(TTSModel):
         ref_wav, ref_text = (
             self.spk_to_ref_wav(spk, emotion=emotion) if spk else (None, None)
         )
+        prompt_condition = self.get_spk_condition(spk=spk, emotion=emotion)
 
         infer_func: callable = None
         if instruct_text is not None:
@@ -306,12 +331,14 @@ class CosyVoiceTTSModel(TTSModel):
                 self.inference_instruct,
                 instruct_text=instruct_text,
                 prompt_speech_16k=torch.from_numpy(ref_wav).unsqueeze(0),
+                prompt_condition=prompt_condition,
             )
         elif ref_wav is not None and ref_text:
             infer_func = partial(
                 self.inference_zero_shot,
                 prompt_text=ref_text,
                 prompt_speech_16k=torch.from_numpy(ref_wav).unsqueeze(0),
+                prompt_condition=prompt_condition,
             )
         else:
             raise ValueError("ref_wav or ref_text is None")
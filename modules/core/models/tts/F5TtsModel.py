@@ -45,6 +45,9 @@ class F5TtsModel(TTSModel):
     def is_downloaded(self):
         return self.model_path.exists() and self.vocos_path.exists()
 
+    def get_model_paths(self) -> list[Path]:
+        return [self.model_path, self.vocos_path]
+
     def is_loaded(self):
         return self.model is not None
 
@@ -71,6 +74,7 @@ class F5TtsModel(TTSModel):
                     ode_method="euler",
                     use_ema=True,
                 )
+                self.update_hash()
         return self.model
 
     @devices.after_gc()
@@ -3,7 +3,7 @@ import json
 import os
 import time
 from dataclasses import dataclass
-from typing import Tuple
+from typing import Optional, Tuple
 
 import numpy as np
 import torch
@@ -127,6 +127,19 @@ class FireRedTTSInfer:
         ).unsqueeze(0)
         return spk_embeddings
 
+    @torch.no_grad()
+    def extract_spk_condition(self, audio: np.ndarray, audio_sr: int) -> dict:
+        """
+        synthesize 需要的参考音频特征 (speaker embedding 和 prompt mel)，可以缓存之后复用
+        """
+        spk_embeddings = self.extract_spk_embeddings(audio=audio, audio_sr=audio_sr)
+        prompt_mel = (
+            self.mel_extractor.from_array(wav_data=audio, wav_sr=audio_sr)
+            .unsqueeze(0)
+            .to(self.device)
+        )
+        return dict(spk_embeddings=spk_embeddings, prompt_mel=prompt_mel)
+
     def do_gpt_inference(
         self,
         spk_gpt: torch.Tensor,
@@ -176,6 +189,7 @@ class FireRedTTSInfer:
         text: str,
         lang: str = "auto",
         params: FireRedTTSParams = FireRedTTSParams(),
+        spk_condition: Optional[dict] = None,
     ) -> torch.Tensor:
         """Synthesize speech from text and speaker audio.
 
@@ -184,6 +198,7 @@ class FireRedTTSInfer:
             audio_sr (int): Sampling rate of the input audio.
             text (str): Input text.
             lang (str, optional): Language of the text ('zh', 'en', or 'auto'). Defaults to "auto".
+            spk_condition (dict, optional): Precomputed result of extract_spk_condition.
 
         Returns:
             torch.Tensor: Synthesized audio waveform.
@@ -202,9 +217,9 @@ class FireRedTTSInfer:
         assert text_tokens.shape[-1] < 400
 
         # Extract speaker embedding
-        spk_embeddings = self.extract_spk_embeddings(
-            audio=audio, audio_sr=audio_sr
-        ).unsqueeze(0)
+        if spk_condition is None:
+            spk_condition = self.extract_spk_condition(audio=audio, audio_sr=audio_sr)
+        spk_embeddings = spk_condition["spk_embeddings"].unsqueeze(0)
         with torch.no_grad():
             spk_gpt = self.gpt.reference_embedding(spk_embeddings)
 
@@ -216,11 +231,7 @@ class FireRedTTSInfer:
         gpt_end_time = time.time()
 
         # Extract mel-spectrogram from input audio
-        prompt_mel = (
-            self.mel_extractor.from_array(wav_data=audio, wav_sr=audio_sr)
-            .unsqueeze(0)
-            .to(self.device)
-        )
+        prompt_mel = spk_condition["prompt_mel"]
 
         # Convert tokens to waveform
         voc_start_time = time.time()
@@ -4,6 +4,7 @@ from typing import Tuple
 
 import numpy as np
 
+from modules.core.models.RefWavCache import RefWavCache
 from modules.core.models.tts.FireRed.FireRedInfer import (
     FireRedTTSInfer,
     FireRedTTSParams,
@@ -12,6 +13,7 @@ from modules.core.models.TTSModel import TTSModel
 from modules.core.pipeline.dcls import TTSPipelineContext
 from modules.core.pipeline.pipeline import TTSSegment
 from modules.core.pipeline.processor import NP_AUDIO
+from modules.core.spk.TTSSpeaker import TTSSpeaker
 from modules.devices import devices
 from modules.utils.SeedContext import SeedContext
 
@@ -30,6 +32,9 @@ class FireRedTTSModel(TTSModel):
     def is_downloaded(self) -> bool:
         return Path("models/FireRedTTS").exists()
 
+    def get_model_paths(self) -> list[Path]:
+        return [Path("./models/FireRedTTS")]
+
     def load(self):
         if self.fire_red:
             return self.fire_red
@@ -39,6 +44,7 @@ class FireRedTTSModel(TTSModel):
             pretrained_path="./models/FireRedTTS",
             device=self.device,
         )
+        self.update_hash()
         logger.info("FireRedTTS model loaded.")
         return self.fire_red
 
@@ -53,6 +59,20 @@ class FireRedTTSModel(TTSModel):
     def get_sample_rate(self):
         return 24000
 
+    def get_spk_condition(self, spk: TTSSpeaker, emotion: str = ""):
+        model = self.load()
+        sr = self.get_sample_rate()
+        return self.cached_spk_condition(
+            spk=spk,
+            emotion=emotion,
+            kind="spk_condition",
+            compute=lambda ref: model.extract_spk_condition(
+                audio=RefWavCache.get_ref_wav(spk=spk, ref=ref, target_sr=sr),
+                audio_sr=sr,
+            ),
+            device=self.device,
+        )
+
     def generate(
         self, segment: TTSSegment, context: TTSPipelineContext
     ) -> Tuple[NP_AUDIO]:
@@ -61,11 +81,7 @@ class FireRedTTSModel(TTSModel):
         seg0 = segment
         spk_emb = self.get_spk_emb(segment=seg0, context=context) if seg0.spk else None
         spk_wav, txt_smp = self.get_ref_wav(seg0)
-        spk_smp = (
-            model.extract_spk_embeddings(spk_wav, audio_sr=self.get_sample_rate())
-            if spk_wav is not None
-            else None
-        )
+        spk_condition = self.get_spk_condition(spk=seg0.spk, emotion=seg0.emotion)
         top_P = seg0.top_p
         top_K = seg0.top_k
         temperature = seg0.temperature
@@ -90,6 +106,7 @@ class FireRedTTSModel(TTSModel):
                     top_k=top_K,
                     temperature=temperature,
                 ),
+                spk_condition=spk_condition,
             )
 
         wav: np.ndarray = syn_audio.float().cpu().squeeze().numpy()
@@ -57,6 +57,9 @@ class FishSpeechModel(TTSModel):
     def is_downloaded(self) -> bool:
         return self.MODEL_PATH.exists()
 
+    def get_model_paths(self) -> list[Path]:
+        return [self.MODEL_PATH]
+
     def is_loaded(self) -> bool:
         return FishSpeechModel.model is not None
 
@@ -87,6 +90,7 @@ class FishSpeechModel(TTSModel):
             )
 
             logger.info("Loaded FishSpeech model")
+            self.update_hash()
 
             self.model = model
             self.token_decoder = token_decoder
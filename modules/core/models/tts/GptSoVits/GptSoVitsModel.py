@@ -37,6 +37,9 @@ class GptSoVitsModel(TTSModel):
         # 来自 modules/repos_static/GPT_SoVITS/GPT_SoVITS/TTS_infer_pack/TTS.py
         return 32000
 
+    def get_model_paths(self) -> list[Path]:
+        return [Path(f"./models/gpt_sovits_{self.version}")]
+
     def load(self):
         if self.model is None:
             configs = GptSoVitsTTSConfig(
@@ -51,6 +54,7 @@ class GptSoVitsModel(TTSModel):
             # print("gpt-sovits configs:")
             # print(configs)
             self.model = GptSoVitsTTS(configs=configs)
+            self.update_hash()
         return self.model
 
     @devices.after_gc()
@@ -65,7 +69,7 @@ class GptSoVitsModel(TTSModel):
     def generate(self, segment, context):
         cached = self.get_cache(segments=[segment], context=context)
         if cached is not None:
-            return cached
+            return cached[0]
 
         model = self.load()
 
@@ -122,7 +126,7 @@ class GptSoVitsModel(TTSModel):
 
                 if not context.stop:
                     self.set_cache(
-                        segments=[segment], context=context, value=(sr, data)
+                        segments=[segment], context=context, value=[(sr, data)]
                     )
 
                 return sr, data
@@ -1,5 +1,6 @@
 import io
 import os
+from pathlib import Path
 from typing import Generator
 
 import numpy as np
@@ -31,6 +32,9 @@ class IndexTTSModel(TTSModel):
     def is_downloaded(self):
         return os.path.exists(self.model_dir)
 
+    def get_model_paths(self) -> list[Path]:
+        return [Path(self.model_dir)]
+
     def is_loaded(self):
         return self.tts is not None
 
@@ -68,6 +72,7 @@ class IndexTTSModel(TTSModel):
             use_cuda_kernel=False,
             device=self.device,
         )
+        self.update_hash()
 
     @devices.after_gc()
     def unload(self):
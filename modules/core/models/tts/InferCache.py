@@ -1,9 +1,16 @@
-from typing import Dict
+import hashlib
+import json
+import sys
+import threading
+from typing import Dict, Union
 
+import numpy as np
 import torch
 from cachetools import LRUCache
 from cachetools import keys as cache_keys
 
+from modules import config
+from modules.core.models.tts.InferDiskCache import InferDiskCache
 from modules.core.spk.TTSSpeaker import TTSSpeaker
 
 
@@ -16,19 +23,173 @@ def hash_tensor(tensor: torch.Tensor):
     return hash(tuple(tensor.reshape(-1).tolist()))
 
 
+def digest_tensor(tensor: torch.Tensor) -> str:
+    """
+    跨进程稳定的 tensor 摘要，用于磁盘缓存的 key
+    """
+    data = tensor.detach().cpu().contiguous().numpy()
+    h = hashlib.sha256()
+    h.update(f"{data.dtype}{data.shape}".encode("utf-8"))
+    h.update(data.tobytes())
+    return h.hexdigest()
+
+
+def sizeof_value(value) -> int:
+    """
+    缓存值实际占用的字节数，音频按 ndarray.nbytes 计算
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, torch.Tensor):
+        return value.element_size() * value.nelement()
+    if isinstance(value, (list, tuple)):
+        return sum([sizeof_value(v) for v in value])
+    return sys.getsizeof(value)
+
+
+class ByteLRUCache(LRUCache):
+    """
+    按字节计算容量的 LRUCache ，并记录命中/淘汰统计
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        super().__init__(maxsize=max_bytes, getsizeof=sizeof_value)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejected = 0
+        # 大条目的准入计数: key => 被生成的次数
+        self.doorkeeper = LRUCache(maxsize=4096)
+
+    def popitem(self):
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return dict(
+            entries=len(self),
+            bytes=self.currsize,
+            max_bytes=self.maxsize,
+            hits=self.hits,
+            misses=self.misses,
+            hit_rate=self.hits / total if total else 0.0,
+            evictions=self.evictions,
+            rejected=self.rejected,
+        )
+
+
 class InferCache:
-    caches: Dict[str, LRUCache] = {}
+    """
+    推理结果缓存
+
+    内存层按模型划分，每个模型有自己的字节预算，所有模型共享一个总预算
+    超过总预算时从占用最大的模型中淘汰
+
+    准入策略:
+    - 大于单模型预算的条目不缓存
+    - 大于 admit_bytes 的条目（一般是一次性的长音频）需要被请求过至少两次才会缓存，
+      避免把经常被请求的短句挤出去
+    """
+
+    caches: Dict[str, ByteLRUCache] = {}
+    lock = threading.RLock()
+
+    disk_cache: Union[InferDiskCache, None] = None
+    disk_cache_inited = False
+
+    @staticmethod
+    def mb_to_bytes(mb: Union[float, None], default: float) -> int:
+        return int((default if mb is None else mb) * 1024 * 1024)
+
+    @classmethod
+    def model_max_bytes(cls) -> int:
+        return cls.mb_to_bytes(config.runtime_env_vars.infer_cache_mb, 256)
+
+    @classmethod
+    def total_max_bytes(cls) -> int:
+        return cls.mb_to_bytes(config.runtime_env_vars.infer_cache_total_mb, 1024)
+
+    @classmethod
+    def admit_bytes(cls) -> int:
+        return cls.mb_to_bytes(config.runtime_env_vars.infer_cache_admit_mb, 4)
 
     @classmethod
-    def get_cache(cls, model_id: str) -> LRUCache:
-        if model_id in InferCache.caches:
-            return InferCache.caches.get(model_id)
-        cache = LRUCache(maxsize=128)
-        InferCache.caches[model_id] = cache
-        return cache
+    def get_cache(cls, model_id: str) -> ByteLRUCache:
+        with InferCache.lock:
+            if model_id in InferCache.caches:
+                return InferCache.caches.get(model_id)
+            cache = ByteLRUCache(max_bytes=cls.model_max_bytes())
+            InferCache.caches[model_id] = cache
+            return cache
+
+    @classmethod
+    def total_bytes(cls) -> int:
+        return sum([cache.currsize for cache in InferCache.caches.values()])
+
+    @classmethod
+    def enforce_total_budget(cls) -> None:
+        max_bytes = cls.total_max_bytes()
+        while cls.total_bytes() > max_bytes:
+            largest = max(InferCache.caches.values(), key=lambda c: c.currsize)
+            if largest.currsize == 0:
+                break
+            largest.popitem()
+
+    @classmethod
+    def should_admit(cls, cache: ByteLRUCache, key, nbytes: int) -> bool:
+        if nbytes > cache.maxsize:
+            return False
+        if nbytes <= cls.admit_bytes():
+            return True
+        # 大条目第一次生成时不缓存，再次被生成（说明不是一次性请求）时才缓存
+        return cache.doorkeeper.get(key, 0) >= 2
+
+    @classmethod
+    def stats(cls) -> dict:
+        with InferCache.lock:
+            models = {
+                model_id: cache.stats() for model_id, cache in InferCache.caches.items()
+            }
+            total_bytes = cls.total_bytes()
+        disk_cache = cls.get_disk_cache()
+        return dict(
+            bytes=total_bytes,
+            max_bytes=cls.total_max_bytes(),
+            models=models,
+            disk=disk_cache.stats() if disk_cache is not None else None,
+        )
+
+    @classmethod
+    def clear(cls) -> None:
+        with InferCache.lock:
+            InferCache.caches.clear()
+
+    @classmethod
+    def get_disk_cache(cls) -> Union[InferDiskCache, None]:
+        """
+        磁盘层，只有配置了 infer_cache_dir 才会启用
+        """
+        if InferCache.disk_cache_inited:
+            return InferCache.disk_cache
+        InferCache.disk_cache_inited = True
+
+        cache_dir = config.runtime_env_vars.infer_cache_dir
+        if not cache_dir:
+            return None
+        disk_mb = config.runtime_env_vars.infer_cache_disk_mb or 1024
+        InferCache.disk_cache = InferDiskCache(
+            root=cache_dir,
+            max_bytes=int(disk_mb * 1024 * 1024),
+            dtype=config.runtime_env_vars.infer_cache_disk_dtype or "float32",
+            policy=config.runtime_env_vars.infer_cache_disk_policy or "lru",
+        )
+        return InferCache.disk_cache
 
     @classmethod
     def get_hash_key(cls, *args, **kwargs):
+        args = list(args)
         for i, arg in enumerate(args):
             if isinstance(arg, TTSSpeaker):
                 args[i] = str(arg.id)
@@ -44,22 +205,76 @@ class InferCache:
         cachekey = cache_keys.hashkey(*args, **kwargs)
         return cachekey
 
+    @classmethod
+    def get_digest(cls, *args, **kwargs) -> str:
+        """
+        稳定的 cache key （不依赖 python hash()），用于磁盘缓存
+        """
+
+        def stable(value):
+            if isinstance(value, TTSSpeaker):
+                return str(value.id)
+            if isinstance(value, torch.Tensor):
+                return digest_tensor(value)
+            if isinstance(value, (list, tuple)):
+                return [stable(v) for v in value]
+            if isinstance(value, dict):
+                return {str(k): stable(v) for k, v in value.items()}
+            if value is None or isinstance(value, (str, int, float, bool)):
+                return value
+            return str(value)
+
+        payload = json.dumps(
+            {"args": stable(args), "kwargs": stable(kwargs)},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
     @classmethod
     def get_cache_val(cls, model_id: str, *args, **kwargs):
         key = cls.get_hash_key(*args, **kwargs)
         cache = InferCache.get_cache(model_id)
 
-        if key in cache:
-            return cache[key]
+        with InferCache.lock:
+            if key in cache:
+                cache.hits += 1
+                return cache[key]
+            cache.misses += 1
+
+        disk_cache = cls.get_disk_cache()
+        if disk_cache is not None:
+            value = disk_cache.get(model_id, cls.get_digest(*args, **kwargs))
+            if value is not None:
+                # 提升到内存层
+                cls.set_memory_val(cache=cache, key=key, value=value)
+                return value
 
         return None
 
+    @classmethod
+    def set_memory_val(cls, cache: ByteLRUCache, key, value) -> None:
+        nbytes = sizeof_value(value)
+        with InferCache.lock:
+            cache.doorkeeper[key] = cache.doorkeeper.get(key, 0) + 1
+            if not cls.should_admit(cache=cache, key=key, nbytes=nbytes):
+                cache.rejected += 1
+                return
+            cache[key] = value
+            cache.doorkeeper.pop(key, None)
+            cls.enforce_total_budget()
+
     @classmethod
     def set_cache_val(cls, model_id: str, value, *args, **kwargs):
         key = cls.get_hash_key(*args, **kwargs)
         cache = InferCache.get_cache(model_id)
 
-        cache[key] = value
+        cls.set_memory_val(cache=cache, key=key, value=value)
+
+        # NOTE: 磁盘层有自己的容量限制，不受内存层准入策略影响
+        disk_cache = cls.get_disk_cache()
+        if disk_cache is not None:
+            disk_cache.set(model_id, cls.get_digest(*args, **kwargs), value)
 
     @classmethod
     def cached(cls, model_id: str, should_cache: callable = None):
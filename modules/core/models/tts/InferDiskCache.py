@@ -0,0 +1,261 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Literal, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCacheEntry:
+    def __init__(self, nbytes: int, last_access: float, hits: int = 0) -> None:
+        self.nbytes = nbytes
+        self.last_access = last_access
+        self.hits = hits
+
+
+class InferDiskCache:
+    """
+    InferCache 的磁盘层
+
+    - 以稳定的内容摘要 (sha256) 作为文件名，所以重启之后、多个 worker 之间都可以共享
+    - 音频存为 .npy ，读取时使用 mmap ，命中时不需要把整个文件读进内存
+    - 元信息 (采样率、每段长度) 存在同名 .json 中，.json 写入完成才算一条有效的缓存
+    - 超过 max_bytes 时按 lru / lfu 淘汰
+
+    目录结构: {root}/{model_id}/{digest}.npy + {digest}.json
+    """
+
+    VERSION = 1
+
+    def __init__(
+        self,
+        root: Union[str, Path],
+        max_bytes: int,
+        dtype: Literal["float32", "int16"] = "float32",
+        policy: Literal["lru", "lfu"] = "lru",
+    ) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.dtype = dtype
+        self.policy = policy
+
+        self.lock = threading.Lock()
+        self.entries: Dict[str, DiskCacheEntry] = {}
+        self.total_bytes = 0
+        self.index_loaded = False
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def entry_paths(self, model_id: str, digest: str) -> tuple[Path, Path]:
+        folder = self.root / model_id
+        return folder / f"{digest}.npy", folder / f"{digest}.json"
+
+    def load_index(self) -> None:
+        """
+        扫描磁盘上的缓存文件，重建索引（包括其他 worker 写入的）
+
+        NOTE: 保留本进程统计的 hits
+        """
+        entries: Dict[str, DiskCacheEntry] = {}
+        total = 0
+        if self.root.exists():
+            for meta_path in self.root.glob("*/*.json"):
+                npy_path = meta_path.with_suffix(".npy")
+                try:
+                    stat = npy_path.stat()
+                except OSError:
+                    continue
+                key = f"{meta_path.parent.name}/{meta_path.stem}"
+                old = self.entries.get(key)
+                entries[key] = DiskCacheEntry(
+                    nbytes=stat.st_size,
+                    last_access=max(stat.st_mtime, old.last_access if old else 0),
+                    hits=old.hits if old else 0,
+                )
+                total += stat.st_size
+        self.entries = entries
+        self.total_bytes = total
+        self.index_loaded = True
+
+    def ensure_index(self) -> None:
+        if not self.index_loaded:
+            self.load_index()
+
+    def get(self, model_id: str, digest: str):
+        npy_path, meta_path = self.entry_paths(model_id, digest)
+        key = f"{model_id}/{digest}"
+
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            data = np.load(npy_path, mmap_mode="r")
+        except (OSError, ValueError):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        if meta.get("version") != InferDiskCache.VERSION:
+            with self.lock:
+                self.misses += 1
+            return None
+
+        now = time.time()
+        try:
+            # NOTE: 用 mtime 记录访问时间，其他 worker 重建索引时也能看到
+            os.utime(npy_path, (now, now))
+        except OSError:
+            pass
+
+        with self.lock:
+            self.hits += 1
+            self.ensure_index()
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = DiskCacheEntry(nbytes=data.nbytes, last_access=now)
+                self.entries[key] = entry
+                self.total_bytes += entry.nbytes
+            entry.last_access = now
+            entry.hits += 1
+
+        return self.decode(data=data, meta=meta)
+
+    def set(self, model_id: str, digest: str, value) -> None:
+        encoded = self.encode(value)
+        if encoded is None:
+            return
+        data, meta = encoded
+        if data.nbytes > self.max_bytes:
+            return
+
+        npy_path, meta_path = self.entry_paths(model_id, digest)
+        npy_path.parent.mkdir(parents=True, exist_ok=True)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            tmp_npy = npy_path.with_name(npy_path.name + suffix)
+            with open(tmp_npy, "wb") as f:
+                np.save(f, data)
+            os.replace(tmp_npy, npy_path)
+
+            tmp_meta = meta_path.with_name(meta_path.name + suffix)
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp_meta, meta_path)
+        except OSError as e:
+            logger.warning(f"Failed to write infer disk cache: {e}")
+            return
+
+        key = f"{model_id}/{digest}"
+        with self.lock:
+            self.ensure_index()
+            old = self.entries.get(key)
+            if old is not None:
+                self.total_bytes -= old.nbytes
+            self.entries[key] = DiskCacheEntry(
+                nbytes=data.nbytes, last_access=time.time()
+            )
+            self.total_bytes += data.nbytes
+            self.writes += 1
+
+            if self.total_bytes > self.max_bytes:
+                # NOTE: 其他 worker 也可能写入，淘汰前重新扫描一次
+                self.load_index()
+                self.evict()
+
+    def eviction_order(self) -> list[str]:
+        if self.policy == "lfu":
+            sort_key = lambda k: (self.entries[k].hits, self.entries[k].last_access)
+        else:
+            sort_key = lambda k: self.entries[k].last_access
+        return sorted(self.entries.keys(), key=sort_key)
+
+    def evict(self) -> None:
+        for key in self.eviction_order():
+            if self.total_bytes <= self.max_bytes:
+                break
+            model_id, digest = key.split("/", 1)
+            npy_path, meta_path = self.entry_paths(model_id, digest)
+            try:
+                # 先删 meta ，这样其他 worker 不会读到半个缓存
+                meta_path.unlink(missing_ok=True)
+                npy_path.unlink(missing_ok=True)
+            except OSError as e:
+                # NOTE: windows 上被 mmap 的文件无法删除，跳过
+                logger.debug(f"Failed to evict infer disk cache {key}: {e}")
+                continue
+            entry = self.entries.pop(key)
+            self.total_bytes -= entry.nbytes
+            self.evictions += 1
+
+    def encode(self, value):
+        """
+        value 为 NP_AUDIO 或者 list[NP_AUDIO]
+        所有音频拼接成一个一维数组保存，meta 中记录每段的采样率和长度
+        """
+        is_list = isinstance(value, list)
+        items = value if is_list else [value]
+
+        srs: list[int] = []
+        lengths: list[int] = []
+        arrays: list[np.ndarray] = []
+        for item in items:
+            if not isinstance(item, tuple) or len(item) != 2:
+                return None
+            sr, data = item
+            data = np.asarray(data, dtype=np.float32).reshape(-1)
+            srs.append(int(sr))
+            lengths.append(int(data.size))
+            arrays.append(data)
+
+        data = (
+            np.concatenate(arrays) if arrays else np.empty(0, dtype=np.float32)
+        )
+        if self.dtype == "int16":
+            data = (np.clip(data, -1, 1) * np.iinfo(np.int16).max).astype(np.int16)
+
+        meta = dict(
+            version=InferDiskCache.VERSION,
+            is_list=is_list,
+            srs=srs,
+            lengths=lengths,
+        )
+        return data, meta
+
+    def decode(self, data: np.ndarray, meta: dict):
+        if data.dtype == np.int16:
+            data = data.astype(np.float32) / np.iinfo(np.int16).max
+
+        items = []
+        offset = 0
+        for sr, length in zip(meta["srs"], meta["lengths"]):
+            items.append((sr, data[offset : offset + length]))
+            offset += length
+
+        if meta["is_list"]:
+            return items
+        return items[0]
+
+    def stats(self) -> dict:
+        with self.lock:
+            self.ensure_index()
+            total = self.hits + self.misses
+            return dict(
+                root=str(self.root),
+                entries=len(self.entries),
+                bytes=self.total_bytes,
+                max_bytes=self.max_bytes,
+                policy=self.policy,
+                dtype=self.dtype,
+                hits=self.hits,
+                misses=self.misses,
+                hit_rate=self.hits / total if total else 0.0,
+                writes=self.writes,
+                evictions=self.evictions,
+            )
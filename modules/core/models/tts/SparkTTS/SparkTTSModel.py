@@ -40,10 +40,14 @@ class SparkTTSModel(TTSModel):
     def is_downloaded(self) -> bool:
         return self.model_path.exists()
 
+    def get_model_paths(self) -> list[Path]:
+        return [self.model_path]
+
     def load(self):
         if self.model is None:
             # TODO: 配置 dtype
             self.model = SparkTTS(model_dir=str(self.model_path), device=self.device)
+            self.update_hash()
         return self.model
 
     @devices.after_gc()
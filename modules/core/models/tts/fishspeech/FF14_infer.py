@@ -24,6 +24,11 @@ class FF14_infer:
         self.llama.unload()
         self.vqgan.unload()
 
+    @torch.no_grad()
+    @torch.inference_mode()
+    def encode_ref(self, ref_wav: np.ndarray) -> torch.Tensor:
+        return self.vqgan.encode(ref_wav)
+
     @torch.no_grad()
     @torch.inference_mode()
     def generate(
@@ -31,16 +36,20 @@ class FF14_infer:
         text: str,
         ref_text: Optional[str] = None,
         ref_wav: Optional[np.ndarray] = None,
+        # NOTE: 预先计算好的 ref_wav 编码结果 (encode_ref) ，提供时不再编码 ref_wav
+        prompt_tokens: Optional[torch.Tensor] = None,
         max_new_tokens: int = 0,
         top_p: int = 0.7,
         repetition_penalty: float = 1.5,
         temperature: float = 0.7,
         chunk_length: int = 150,
     ):
-        if ref_text and ref_wav is None:
+        if ref_text and ref_wav is None and prompt_tokens is None:
             raise ValueError("ref_wav must be provided if ref_text is provided")
 
-        indices = self.vqgan.encode(ref_wav) if ref_wav is not None else None
+        indices = prompt_tokens
+        if indices is None and ref_wav is not None:
+            indices = self.encode_ref(ref_wav)
         codes = self.llama.generate(
             text=text,
             prompt_text=ref_text,
@@ -15,6 +15,7 @@ from hydra import compose, initialize
 from hydra.utils import instantiate
 
 from modules import config
+from modules.core.models.RefWavCache import RefWavCache
 from modules.core.models.tts.fishspeech.FF14_infer import FF14_infer
 from modules.core.models.tts.fishspeech.FF14_llama import FF14_llama
 from modules.core.models.tts.fishspeech.FF14_vqgan import FF14_vqgan
@@ -22,6 +23,7 @@ from modules.core.models.tts.FishSpeechInfer import FishSpeechInfer
 from modules.core.models.TTSModel import TTSModel
 from modules.core.pipeline.dcls import TTSPipelineContext, TTSSegment
 from modules.core.pipeline.processor import NP_AUDIO
+from modules.core.spk.TTSSpeaker import TTSSpeaker
 from modules.devices import devices
 from modules.repos_static.fish_speech.fish_speech.models.text2semantic.llama import (
     DualARTransformer,
@@ -53,12 +55,16 @@ class FishSpeech14Model(TTSModel):
     def is_downloaded(self):
         return FF14_llama.MODEL_PATH.exists() and FF14_vqgan.MODEL_PATH.exists()
 
+    def get_model_paths(self) -> list[Path]:
+        return [FF14_llama.MODEL_PATH, FF14_vqgan.MODEL_PATH]
+
     def load(self) -> None:
         with self.lock:
             if self.model is not None:
                 logger.info("Model is already loaded")
                 return
             self.model = FF14_infer()
+            self.update_hash()
             logger.info("Model is loaded")
 
     def unload(self) -> None:
@@ -76,6 +82,21 @@ class FishSpeech14Model(TTSModel):
         # 来自 modules/repos_static/fish_speech/fish_speech/configs/firefly_gan_vq.yaml
         return 44100
 
+    def get_spk_condition(self, spk: TTSSpeaker, emotion: str = ""):
+        self.load()
+        model = self.model
+        sr = self.get_sample_rate()
+        return self.cached_spk_condition(
+            spk=spk,
+            emotion=emotion,
+            kind="vqgan_encode",
+            compute=lambda ref: model.encode_ref(
+                RefWavCache.get_ref_wav(spk=spk, ref=ref, target_sr=sr)
+            ),
+            # 从磁盘层加载的 token 需要和 vqgan 在同一个设备上
+            device=model.vqgan.device,
+        )
+
     def generate_batch(
         self, segments: list[TTSSegment], context: TTSPipelineContext
     ) -> list[NP_AUDIO]:
@@ -100,7 +121,8 @@ class FishSpeech14Model(TTSModel):
         temperature = seg0.temperature
         # repetition_penalty = seg0.repetition_penalty
 
-        ref_wav, ref_txt = self.get_ref_wav(seg0)
+        ref_txt = self.get_ref_text(seg0)
+        prompt_tokens = self.get_spk_condition(spk=seg0.spk, emotion=seg0.emotion)
 
         sr = self.get_sample_rate()
         ret = []
@@ -111,8 +133,8 @@ class FishSpeech14Model(TTSModel):
             with SeedContext(seed=infer_seed):
                 generated = model.generate(
                     text=segment.text,
-                    ref_wav=ref_wav,
                     ref_text=ref_txt,
+                    prompt_tokens=prompt_tokens,
                     top_p=top_p,
                     temperature=temperature,
                     # repetition_penalty=repetition_penalty,
@@ -12,6 +12,7 @@ import torch
 
 from modules.core.handler.datacls.vc_model import VCConfig
 from modules.core.models.AudioReshaper import AudioReshaper
+from modules.core.models.RefWavCache import RefWavCache
 from modules.core.models.vc.VCModel import VCModel
 from modules.core.pipeline.processor import NP_AUDIO
 from modules.core.spk.TTSSpeaker import TTSSpeaker
@@ -34,6 +35,9 @@ class OpenVoiceModel(VCModel):
         # NOTE: dtype 好像没用到
         self.dtype = devices.dtype
 
+    def get_model_paths(self) -> list[Path]:
+        return [self.model_dir]
+
     @devices.after_gc()
     def load(self) -> None:
         with self.lock:
@@ -45,6 +49,7 @@ class OpenVoiceModel(VCModel):
                 )
                 model.load_ckpt(ckpt_path=self.model_dir / "checkpoint.pth")
                 OpenVoiceModel.model = model
+                self.update_hash()
         return OpenVoiceModel.model
 
     @devices.after_gc()
@@ -121,7 +126,11 @@ class OpenVoiceModel(VCModel):
             return audio
 
     def convert_audio(
-        self, src_audio: NP_AUDIO, ref_audio: NP_AUDIO, tau=0.3
+        self,
+        src_audio: NP_AUDIO,
+        ref_audio: Optional[NP_AUDIO] = None,
+        tau=0.3,
+        ref_se: Optional[torch.Tensor] = None,
     ) -> NP_AUDIO:
         self.load()
 
@@ -129,7 +138,8 @@ class OpenVoiceModel(VCModel):
 
         src_se = self.audio_to_se(src_audio)
         # TODO 支持多ref mean
-        ref_se = self.audio_to_se(ref_audio)
+        if ref_se is None:
+            ref_se = self.audio_to_se(ref_audio)
 
         sr, audio = AudioReshaper.normalize_audio(
             audio=src_audio, target_sr=self.sampling_rate
@@ -147,13 +157,28 @@ class OpenVoiceModel(VCModel):
         if not isinstance(spk, TTSSpeaker):
             raise ValueError("spk must be a TTSSpeaker")
 
-        sr, wav, text = spk.get_ref_wav(
+        ref = spk.get_ref(
             lambda spk_ref: True if emotion is None else spk_ref.emotion == emotion
         )
-        if wav is None:
+        if ref is None:
             raise ValueError("this speaker has no reference audio")
 
-        return sr, wav
+        wav = RefWavCache.get_ref_wav(spk=spk, ref=ref)
+        return ref.wav_sr, wav
+
+    def get_spk_condition(self, spk: TTSSpeaker, emotion: str = ""):
+        if not isinstance(spk, TTSSpeaker):
+            raise ValueError("spk must be a TTSSpeaker")
+        self.load()
+        return self.cached_spk_condition(
+            spk=spk,
+            emotion=emotion,
+            kind="ref_se",
+            compute=lambda ref: self.audio_to_se(
+                (ref.wav_sr, RefWavCache.get_ref_wav(spk=spk, ref=ref))
+            ),
+            device=self.device,
+        )
 
     def convert(
         self, src_audio: NP_AUDIO, ref_spk: TTSSpeaker, config: VCConfig
@@ -161,9 +186,11 @@ class OpenVoiceModel(VCModel):
         if config.enabled is False:
             return src_audio
 
-        ref_audio = self.get_ref_audio(ref_spk, config)
+        ref_se = self.get_spk_condition(spk=ref_spk, emotion=config.emotion)
+        if ref_se is None:
+            raise ValueError("this speaker has no reference audio")
 
-        return self.convert_audio(src_audio, ref_audio, tau=config.tau)
+        return self.convert_audio(src_audio, tau=config.tau, ref_se=ref_se)
 
 
 if __name__ == "__main__":
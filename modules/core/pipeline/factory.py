@@ -34,6 +34,8 @@ logger = logging.getLogger(__name__)
 
 class TNProcess(SegmentProcessor):
 
+    text_only = True
+
     def __init__(self, tn_pipeline: TNPipeline) -> None:
         super().__init__()
         self.tn = tn_pipeline
@@ -1,11 +1,14 @@
 import logging
+import queue
 import threading
+from typing import Callable, Union
 
-import numpy as np
-
+from modules import config
 from modules.core.models.TTSModel import TTSModel
 from modules.core.pipeline.dcls import TTSPipelineContext
-from modules.core.pipeline.generate.dcls import TTSBatch, TTSBucket
+from modules.core.pipeline.generate.dcls import SynthAudio, TTSBatch, TTSBucket
+from modules.core.pipeline.generate.InferScheduler import InferScheduler, InferTicket
+from modules.core.pipeline.generate.PreProcessPool import PreProcessPool
 from modules.core.pipeline.processor import SegmentProcessor
 from modules.utils import audio_utils
 
@@ -24,41 +27,148 @@ class BatchGenerate:
         self.model = model
         self.context = context
         self.batches = self.build_batches()
+        self.pre_process = PreProcessPool(context=context)
 
         self.done = threading.Event()
 
+        # NOTE: 在生成线程中调用，用于通知消费方有新数据/生成结束，具体见 BatchSynth
+        self.on_update: Union[Callable[[], None], None] = None
+        self.on_done: Union[Callable[[Union[Exception, None]], None], None] = None
+
+    def notify_update(self):
+        if self.on_update is not None:
+            self.on_update()
+
     def is_done(self):
         return all([seg.done for batch in self.batches for seg in batch.segments])
 
-    def build_batches(self) -> list[TTSBatch]:
+    def iter_bucket_batches(self):
         batch_size = self.context.infer_config.batch_size
-
-        batches = []
         for bucket in self.buckets:
             for i in range(0, len(bucket.segments), batch_size):
                 batch = bucket.segments[i : i + batch_size]
-                batches.append(TTSBatch(segments=batch))
-        return batches
+                yield bucket, TTSBatch(segments=batch)
+
+    def build_batches(self) -> list[TTSBatch]:
+        return [batch for _, batch in self.iter_bucket_batches()]
+
+    def use_scheduler(self) -> bool:
+        if self.context.infer_config.stream:
+            return False
+        return not config.runtime_env_vars.no_infer_scheduler
 
     def generate(self):
+        error = None
+        try:
+            # NOTE: 按生成顺序提交 TN ，之后每个 batch 推理前只等待自己的 segment
+            for batch in self.batches:
+                self.pre_process.submit(batch.segments)
+            if self.use_scheduler():
+                self.generate_scheduled()
+            else:
+                self.generate_batches()
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.done.set()
+            if self.on_done is not None:
+                self.on_done(error)
+
+    def generate_batches(self):
         self.model.reset()
         stream = self.context.infer_config.stream
 
+        for batch in self.batches:
+            is_break = batch.segments[0].seg._type == "break"
+            if is_break:
+                self.generate_break(batch)
+                continue
+
+            self.pre_process.wait(batch.segments)
+            if stream:
+                self.generate_batch_stream(batch)
+            else:
+                self.generate_batch(batch)
+
+    def generate_scheduled(self):
+        """
+        把 segment 交给模型的 InferScheduler ，和其他请求的兼容 segment 合并推理
+        """
+        scheduler = InferScheduler.get_scheduler(self.model)
+        ticket = InferTicket(context=self.context)
+
         try:
-            for batch in self.batches:
-                is_break = batch.segments[0].seg._type == "break"
-                if is_break:
+            count = 0
+            for bucket, batch in self.iter_bucket_batches():
+                if bucket.key == "<break>":
                     self.generate_break(batch)
                     continue
-
-                if stream:
-                    self.generate_batch_stream(batch)
-                else:
-                    self.generate_batch(batch)
-        # except Exception as e:
-        #     logger.error(f"error: {e}")
+                # NOTE: 按 batch 提交，前面的 segment TN 完成就可以开始推理，不需要等整个 bucket
+                self.pre_process.wait(batch.segments)
+                missing = self.receive_cached(batch.segments)
+                if len(missing) == 0:
+                    continue
+                scheduler.submit(ticket=ticket, audios=missing, bucket_key=bucket.key)
+                count += len(missing)
+
+            received = 0
+            while received < count:
+                items = [ticket.results.get()]
+                # NOTE: 已经到达的结果一起后处理，比如多个 segment 的变速合并成一次调用
+                while received + len(items) < count:
+                    try:
+                        items.append(ticket.results.get_nowait())
+                    except queue.Empty:
+                        break
+                received += len(items)
+                self.receive_scheduled(items)
         finally:
-            self.done.set()
+            scheduler.discard(ticket)
+
+    def receive_cached(self, audios: list[SynthAudio]) -> list[SynthAudio]:
+        """
+        命中 cache 的 segment 直接完成，返回未命中的 segment
+        """
+        segments = [audio.seg for audio in audios]
+        cached = self.model.get_segment_caches(segments=segments, context=self.context)
+
+        missing: list[SynthAudio] = []
+        hits = []
+        for audio, result in zip(audios, cached):
+            if result is None:
+                missing.append(audio)
+                continue
+            hits.append((audio, result))
+        if len(hits) > 0:
+            self.receive_scheduled(hits)
+        return missing
+
+    def receive_scheduled(self, items: list[tuple[SynthAudio, object]]):
+        finished: list[SynthAudio] = []
+        for audio, result in items:
+            if isinstance(result, Exception):
+                raise result
+            if result is None:
+                # 请求被中断，segment 被调度器丢弃
+                audio.done = True
+                continue
+            sr, data = result
+            audio.data = data
+            audio.sr = sr
+            finished.append(audio)
+
+        self.after_process_batch(results=finished)
+        for audio in finished:
+            audio.done = True
+        self.notify_update()
+
+    def interrupt(self):
+        self.pre_process.cancel()
+        if self.use_scheduler():
+            InferScheduler.get_scheduler(self.model).interrupt(self.context)
+        else:
+            self.model.interrupt()
 
     def generate_break(self, batch: TTSBatch):
         for seg in batch.segments:
@@ -69,18 +179,21 @@ class BatchGenerate:
             seg.data = data
             seg.sr = sr
             seg.done = True
+        self.notify_update()
 
     def generate_batch(self, batch: TTSBatch):
         model = self.model
         segments = [audio.seg for audio in batch.segments]
-        results = model.generate_batch(segments=segments, context=self.context)
+        results = model.generate_batch_cached(segments=segments, context=self.context)
         for audio, result in zip(batch.segments, results):
             sr, data = result
             audio.data = data
             audio.sr = sr
-            audio.done = True
 
-            self.after_process(result=audio)
+        self.after_process_batch(results=batch.segments)
+        for audio in batch.segments:
+            audio.done = True
+        self.notify_update()
 
     def generate_batch_stream(self, batch: TTSBatch):
         model = self.model
@@ -103,16 +216,20 @@ class BatchGenerate:
                 if data.size == 0:
                     audio.done = True
                     continue
-                audio.data = np.concatenate([audio.data, data], axis=0)
                 audio.sr = sr
+                audio.append(data)
+            self.notify_update()
 
         # NOTE: 这里在最后设置 done 是因为流式生成的时候，目前不知道单个segment是否结束
         for seg in batch.segments:
             seg.done = True
+        self.notify_update()
 
-    def after_process(self, result: TTSBatch):
+    def after_process_batch(self, results: list[SynthAudio]):
         # NOTE: 按道理说这个应该给 pipeline 来控制，但是不太好决定 segement 的处理时机，所以放在这里
         # TODO: 最好还是不要把 module 传到 generator 中用
+        if len(results) == 0:
+            return
         for module in self.context.modules:
             if isinstance(module, SegmentProcessor):
-                module.after_process(result=result, context=self.context)
+                module.after_process_batch(results=results, context=self.context)
@@ -1,8 +1,9 @@
 import asyncio
 import threading
-from time import time
 from typing import Union
 
+import numpy as np
+
 from modules.core.models.TTSModel import TTSModel
 from modules.core.pipeline.dcls import TTSPipelineContext, TTSSegment
 from modules.core.pipeline.generate.BatchGenerate import BatchGenerate
@@ -12,6 +13,16 @@ from modules.core.pipeline.generate.SynthSteamer import SynthStreamer
 
 
 class BatchSynth:
+    """
+    NOTE: 生成线程和 asyncio loop 之间通过事件交接：
+        生成线程每次有新数据时，通过 loop.call_soon_threadsafe 把新 chunk 推到 queue 中（仅 stream 模式）
+        生成结束时 resolve done_future ，并推入 DONE 信号
+        所以等待时间只取决于模型生成速度，而不是轮询间隔
+    """
+
+    DONE = "<done>"
+    STOP = "<stop>"
+
     def __init__(
         self,
         input_segments: list[TTSSegment],
@@ -32,20 +43,104 @@ class BatchSynth:
 
         self.thread1 = None
 
+        self.loop: Union[asyncio.AbstractEventLoop, None] = None
+        self.queue: Union[asyncio.Queue, None] = None
+        self.done_future: Union[asyncio.Future, None] = None
+        self.stream_chunks = False
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop, stream: bool = False):
+        """
+        需要在 start_generate 之前调用
+
+        :param stream: 为 True 时生成线程会把新 chunk 推入 queue ，此时不应该再调用 read
+        """
+        self.loop = loop
+        self.queue = asyncio.Queue()
+        self.done_future = loop.create_future()
+        self.stream_chunks = stream
+
+        self.generator.on_update = self.on_update
+        self.generator.on_done = self.on_done
+
+    def call_in_loop(self, fn, *args):
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(fn, *args)
+        except RuntimeError:
+            # loop 已经关闭
+            pass
+
+    def on_update(self):
+        # NOTE: 在生成线程中调用
+        if not self.stream_chunks:
+            return
+        data = self.streamer.read()
+        if data.size > 0:
+            self.call_in_loop(self.queue.put_nowait, data)
+
+    def on_done(self, error: Union[Exception, None]):
+        # NOTE: 在生成线程中调用
+        self.on_update()
+        self.call_in_loop(self.resolve_done, error)
+
+    def resolve_done(self, error: Union[Exception, None]):
+        # NOTE: 用 result 传递 error 而不是 set_exception ，避免没人 await 时的 never retrieved 警告
+        if not self.done_future.done():
+            self.done_future.set_result(error)
+        self.queue.put_nowait(BatchSynth.DONE)
+
+    def notify_stop(self):
+        if self.queue is None:
+            return
+        self.call_in_loop(self.queue.put_nowait, BatchSynth.STOP)
+
+    async def next_chunk(self, timeout: float) -> Union[np.ndarray, None]:
+        """
+        等待下一个 chunk ，返回 None 表示生成结束
+
+        超时抛出 asyncio.TimeoutError ，被中断抛出 ConnectionAbortedError
+        """
+        if self.context.stop:
+            raise ConnectionAbortedError()
+        item = await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        if isinstance(item, str) and item == BatchSynth.STOP:
+            raise ConnectionAbortedError()
+        if isinstance(item, str) and item == BatchSynth.DONE:
+            error = self.done_future.result()
+            if error is not None:
+                raise error
+            return None
+        return item
+
     async def wait_done(
         self, timeout: int, query_stop_fn: Union[None, callable] = None
     ):
-        start_time = time()
-        while not self.generator.done.is_set():
-            if query_stop_fn is not None and query_stop_fn():
-                raise ConnectionAbortedError()
-            if time() - start_time > timeout:
+        if query_stop_fn is not None and query_stop_fn():
+            raise ConnectionAbortedError()
+        if self.done_future is None:
+            # NOTE: 没有提前 bind 的情况，如果已经生成结束就不会再有事件了
+            self.bind_loop(asyncio.get_running_loop())
+            if self.generator.done.is_set():
+                return
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
                 raise asyncio.TimeoutError()
-            await asyncio.sleep(0.5)
+            chunk = await self.next_chunk(timeout=remaining)
+            if chunk is None:
+                return
 
     def is_done(self):
         return self.generator.is_done()
 
+    def interrupt(self):
+        self.generator.interrupt()
+        self.notify_stop()
+
     def sr(self):
         return self.segments[0].sr
 
@@ -42,11 +42,11 @@ class Bucketizer:
             buckets[key].append(segment)
 
         break_segments = buckets.pop("<break>")
-        audio_segments = list(buckets.values())
+        audio_buckets = list(buckets.items())
         # 根据 bucket 第一个 seg 的 index 排序，越小的越靠前
-        audio_segments.sort(key=lambda x: self.segments.index(x[0]))
+        audio_buckets.sort(key=lambda x: self.segments.index(x[1][0]))
 
         return [
-            TTSBucket(break_segments),
-            *[TTSBucket(segments) for segments in audio_segments],
+            TTSBucket(break_segments, key="<break>"),
+            *[TTSBucket(segments, key=key) for key, segments in audio_buckets],
         ]
@@ -1,5 +1,5 @@
 import re
-from typing import List
+from typing import Iterable, Iterator, List, Union
 
 from modules.core.pipeline.dcls import TTSPipelineContext, TTSSegment
 from modules.core.pipeline.generate.SimpleTokenizer import RegexpTokenizer
@@ -69,14 +69,23 @@ class TTSChunker:
         )
 
     def text_segments(self):
+        return list(self.iter_text_segments())
+
+    def iter_text_segments(
+        self, text: Union[str, Iterable[str], None] = None
+    ) -> Iterator[TTSSegment]:
+        """
+        逐个生成 segment ，不需要等整篇文本切分完
+
+        text 可以是文本块的迭代器 (比如按行读取的整本书)，默认为 context.text
+        """
         spliter_threshold = self.context.infer_config.spliter_threshold
-        text = self.context.text
+        if text is None:
+            text = self.context.text
 
         spliter = SentenceSplitter(threshold=spliter_threshold, tokenizer=self.tokenize)
-        sentences = spliter.parse(text)
-
-        text_segments = [self.make_segment(s) for s in sentences]
-        return text_segments
+        for sentence in spliter.iter_parse(text):
+            yield self.make_segment(sentence)
 
     def create_ssml_ctx(self):
         ctx = SSMLContext()
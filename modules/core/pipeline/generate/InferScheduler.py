@@ -0,0 +1,203 @@
+import logging
+import queue
+import threading
+from typing import Dict, Hashable, Union
+
+from modules.core.models.TTSModel import TTSModel
+from modules.core.pipeline.dcls import TTSPipelineContext
+from modules.core.pipeline.generate.dcls import SynthAudio
+
+logger = logging.getLogger(__name__)
+
+
+class InferTicket:
+    """
+    一次 BatchGenerate 提交给调度器的任务
+
+    生成结果通过 results 队列回传给提交者线程，after_process 由提交者线程自己执行，
+    避免后处理阻塞调度线程（也就阻塞了其他请求的推理）
+    """
+
+    def __init__(self, context: TTSPipelineContext) -> None:
+        self.context = context
+        # item: (SynthAudio, NP_AUDIO | Exception | None)
+        # None 表示这个 segment 因为请求被中断而被丢弃
+        self.results: queue.Queue = queue.Queue()
+        self.discarded = False
+
+    def is_stopped(self) -> bool:
+        return self.discarded or self.context.stop
+
+    def batch_size(self) -> int:
+        return max(1, self.context.infer_config.batch_size)
+
+
+class BatchContext:
+    """
+    合并了多个请求的 batch 的推理上下文
+
+    模型通过 context.stop 提前结束生成、跳过写入 cache ，
+    合并的 batch 只有当其中所有请求都已停止时才算停止，不会因为一个请求中断而截断其他请求的结果
+    其余属性都使用最早提交的请求的 context
+    """
+
+    def __init__(self, tickets: list[InferTicket]) -> None:
+        self.tickets = tickets
+        self.context = tickets[0].context
+
+    @property
+    def stop(self) -> bool:
+        return all([ticket.is_stopped() for ticket in self.tickets])
+
+    def __getattr__(self, name: str):
+        return getattr(self.context, name)
+
+
+class PendingAudio:
+    def __init__(self, ticket: InferTicket, audio: SynthAudio, key: Hashable) -> None:
+        self.ticket = ticket
+        self.audio = audio
+        self.key = key
+
+
+class InferScheduler:
+    """
+    跨请求的连续批处理调度器
+
+    每个模型一个调度器（一个推理线程），所有请求把待生成的 segment 提交到这里，
+    兼容的 segment （相同 bucket key 且影响推理的 infer_config 相同）会被合并到同一个 batch 中
+    调用 model.generate_batch ，然后把结果路由回各自的 SynthAudio
+
+    NOTE: 只调度非流式生成，流式生成的 chunk 是按 batch 产出的，合并之后会让首包延迟互相影响
+    """
+
+    schedulers: Dict[str, "InferScheduler"] = {}
+    schedulers_lock = threading.Lock()
+
+    @classmethod
+    def get_scheduler(cls, model: TTSModel) -> "InferScheduler":
+        with cls.schedulers_lock:
+            scheduler = cls.schedulers.get(model.model_id)
+            if scheduler is None:
+                scheduler = InferScheduler(model=model)
+                cls.schedulers[model.model_id] = scheduler
+            return scheduler
+
+    @staticmethod
+    def make_key(bucket_key: Hashable, context: TTSPipelineContext) -> Hashable:
+        infer_config = context.infer_config
+        # NOTE: 这几个字段会被模型读取（cache 判断、chunk 大小），不同的话不能合并
+        return (
+            bucket_key,
+            infer_config.no_cache,
+            infer_config.seed,
+            infer_config.stream_chunk_size,
+        )
+
+    def __init__(self, model: TTSModel) -> None:
+        self.model = model
+        self.pending: list[PendingAudio] = []
+        self.running: list[PendingAudio] = []
+        self.cond = threading.Condition()
+        self.thread: Union[threading.Thread, None] = None
+
+    def submit(
+        self, ticket: InferTicket, audios: list[SynthAudio], bucket_key: Hashable
+    ) -> None:
+        key = self.make_key(bucket_key=bucket_key, context=ticket.context)
+        with self.cond:
+            for audio in audios:
+                self.pending.append(PendingAudio(ticket=ticket, audio=audio, key=key))
+            self.ensure_thread()
+            self.cond.notify()
+
+    def discard(self, ticket: InferTicket) -> None:
+        """
+        丢弃 ticket 所有还没开始推理的 segment
+        """
+        with self.cond:
+            ticket.discarded = True
+            self.drop_stopped()
+
+    def interrupt(self, context: TTSPipelineContext) -> None:
+        """
+        中断某个请求
+
+        NOTE: 正在推理的 batch 可能包含其他请求的 segment ，所以只有当 batch 中所有请求都已停止时才中断模型
+        """
+        with self.cond:
+            self.drop_stopped()
+            running = self.running
+            if running and all([p.ticket.is_stopped() for p in running]):
+                self.model.interrupt()
+
+    def ensure_thread(self) -> None:
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def drop_stopped(self) -> None:
+        kept: list[PendingAudio] = []
+        for pending in self.pending:
+            if pending.ticket.is_stopped():
+                pending.ticket.results.put((pending.audio, None))
+            else:
+                kept.append(pending)
+        self.pending = kept
+
+    def take_batch(self) -> list[PendingAudio]:
+        with self.cond:
+            while True:
+                self.drop_stopped()
+                if self.pending:
+                    break
+                self.cond.wait()
+
+            # NOTE: 以最早提交的 segment 为准，保证先到先服务
+            head = self.pending[0]
+            limit = head.ticket.batch_size()
+            batch: list[PendingAudio] = []
+            rest: list[PendingAudio] = []
+            for pending in self.pending:
+                if len(batch) < limit and pending.key == head.key:
+                    batch.append(pending)
+                    limit = min(limit, pending.ticket.batch_size())
+                else:
+                    rest.append(pending)
+            self.pending = rest
+            self.running = batch
+            return batch
+
+    def loop(self) -> None:
+        while True:
+            batch = self.take_batch()
+            try:
+                self.run_batch(batch)
+            finally:
+                with self.cond:
+                    self.running = []
+
+    def run_batch(self, batch: list[PendingAudio]) -> None:
+        model = self.model
+        segments = [pending.audio.seg for pending in batch]
+        tickets = list({id(p.ticket): p.ticket for p in batch}.values())
+        context = tickets[0].context if len(tickets) == 1 else BatchContext(tickets)
+
+        logger.debug(
+            f"scheduled batch: model={model.model_id} size={len(batch)} requests={len(tickets)}"
+        )
+
+        try:
+            # NOTE: 每个 batch 可能来自不同的请求，所以每次都需要重置推理上下文
+            model.reset()
+            # NOTE: 排队期间其他请求可能已经生成了相同的 segment
+            results = model.generate_batch_cached(segments=segments, context=context)
+        except Exception as e:
+            logger.exception("scheduled batch failed")
+            for pending in batch:
+                pending.ticket.results.put((pending.audio, e))
+            return
+
+        for pending, result in zip(batch, results):
+            pending.ticket.results.put((pending.audio, result))
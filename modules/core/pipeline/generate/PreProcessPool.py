@@ -0,0 +1,94 @@
+import os
+import threading
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from typing import Union
+
+from modules import config
+from modules.core.pipeline.dcls import TTSPipelineContext
+from modules.core.pipeline.generate.dcls import SynthAudio
+from modules.core.pipeline.processor import SegmentProcessor
+
+
+class PreProcessPool:
+    """
+    在线程池中执行 segment 的文本预处理 (TN) ，和推理流水线并行
+
+    - 按 batch 的生成顺序提交，第一个 batch 的 segment 最先处理完，不需要等整篇文本都 TN 完才开始推理
+    - 推理第 N 个 batch 时，线程池继续处理后面的 segment
+    - 所有请求共用一个线程池，线程数为 tn_workers ，为 0 时在提交时同步执行 (和之前一样)
+
+    NOTE: 用线程而不是进程，TN pipeline 持有 jieba / WeTextProcessing 等不方便序列化的状态，
+    推理时 torch 会释放 GIL ，TN 和推理可以重叠执行
+    """
+
+    executor: Union[ThreadPoolExecutor, None] = None
+    lock = threading.Lock()
+
+    @classmethod
+    def get_workers(cls) -> int:
+        workers = config.runtime_env_vars.tn_workers
+        if workers is None:
+            return min(4, os.cpu_count() or 1)
+        return max(0, int(workers))
+
+    @classmethod
+    def get_executor(cls) -> Union[ThreadPoolExecutor, None]:
+        workers = cls.get_workers()
+        if workers == 0:
+            return None
+        with cls.lock:
+            if cls.executor is None:
+                cls.executor = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix="tn_worker"
+                )
+            return cls.executor
+
+    def __init__(self, context: TTSPipelineContext) -> None:
+        self.context = context
+        self.processors = [
+            module
+            for module in context.modules
+            if isinstance(module, SegmentProcessor) and module.text_only
+        ]
+        self.futures: list[Future] = []
+
+    def run(self, audio: SynthAudio) -> None:
+        seg = audio.seg
+        for module in self.processors:
+            seg = module.pre_process(segment=seg, context=self.context)
+        audio.seg = seg
+
+    def submit(self, audios: list[SynthAudio]) -> None:
+        """
+        按顺序提交，break segment 不需要处理
+        """
+        audios = [audio for audio in audios if audio.seg._type != "break"]
+        if len(self.processors) == 0 or len(audios) == 0:
+            return
+        executor = self.get_executor()
+        for audio in audios:
+            if executor is None:
+                self.run(audio)
+                continue
+            audio.pre_future = executor.submit(self.run, audio)
+            self.futures.append(audio.pre_future)
+
+    def wait(self, audios: list[SynthAudio]) -> None:
+        """
+        等待这些 segment 预处理完成，预处理的异常在这里抛出
+        """
+        for audio in audios:
+            future = audio.pre_future
+            if future is None:
+                continue
+            try:
+                future.result()
+            except CancelledError:
+                # 请求被中断，还没开始的预处理已经被取消
+                raise ConnectionAbortedError()
+            audio.pre_future = None
+
+    def cancel(self) -> None:
+        for future in self.futures:
+            future.cancel()
+        self.futures = []
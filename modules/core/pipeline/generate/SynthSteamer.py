@@ -6,6 +6,12 @@ from modules.core.pipeline.generate.dcls import SynthAudio
 
 
 class SynthStreamer:
+    """
+    按顺序读取 segments 中新生成的音频
+
+    NOTE: 基于游标 (segment 下标, chunk 下标) 读取，每次只拼接还没交付的 chunk ，
+    不会重复拷贝已经读过的数据，所以读取开销只和新增的样本数有关
+    """
 
     def __init__(
         self, segments: list[SynthAudio], context: TTSPipelineContext, model: TTSModel
@@ -13,26 +19,36 @@ class SynthStreamer:
         self.segments = segments
         self.context = context
         self.model = model
-        self.output_wav = np.empty(0)
-
-    def flush(self):
-        output_wav = np.empty(0)
 
-        for seg in self.segments:
-            data = seg.data
-            if data.size == 0 and not seg.done:
-                break
-            output_wav = np.concatenate((output_wav, data), axis=0)
-            if not seg.done:
+        self.seg_cursor = 0
+        self.chunk_cursor = 0
+
+    def pull_chunks(self) -> list[np.ndarray]:
+        chunks: list[np.ndarray] = []
+
+        while self.seg_cursor < len(self.segments):
+            seg = self.segments[self.seg_cursor]
+            # NOTE: 先读 done 再读 chunks ，保证 done 之后不会漏掉最后追加的 chunk
+            done = seg.done
+            seg_chunks = seg.chunks
+            count = len(seg_chunks)
+            if count > self.chunk_cursor:
+                chunks.extend(seg_chunks[self.chunk_cursor : count])
+                self.chunk_cursor = count
+            if not done:
                 break
+            self.seg_cursor += 1
+            self.chunk_cursor = 0
 
-        self.output_wav = output_wav
-        return output_wav
+        return chunks
 
     def write(self):
         raise NotImplementedError
 
     def read(self) -> np.ndarray:
-        cursor = self.output_wav.size
-        self.flush()
-        return self.output_wav[cursor:]
+        chunks = self.pull_chunks()
+        if len(chunks) == 0:
+            return np.empty(0, dtype=np.float32)
+        if len(chunks) == 1:
+            return chunks[0]
+        return np.concatenate(chunks, axis=0)
@@ -1,3 +1,6 @@
+from concurrent.futures import Future
+from typing import Hashable, Union
+
 import numpy as np
 import numpy.typing as npt
 
@@ -12,14 +15,48 @@ class SynthAudio:
 
     def __init__(self, segment: TTSSegment) -> None:
         self.seg = segment
-        self.data: npt.NDArray[np.float32] = np.empty(0, dtype=np.float32)
+        # NOTE: 只追加的 chunk 列表，流式生成时每次只 append 新的数据，读取方通过游标拿增量
+        self.chunks: list[npt.NDArray[np.float32]] = []
+        # data 的缓存: (拼接时的 chunk 数, 拼接结果)，追加 chunk 之后失效
+        self._data: Union[tuple[int, npt.NDArray[np.float32]], None] = None
         self.sr = 24000
         self.done = False
+        # 文本预处理 (TN) 在线程池中执行时的 future ，推理前需要等待，见 PreProcessPool
+        self.pre_future: Union[Future, None] = None
+
+    @property
+    def data(self) -> npt.NDArray[np.float32]:
+        chunks = self.chunks
+        count = len(chunks)
+        cached = self._data
+        if cached is not None and cached[0] == count:
+            return cached[1]
+        if count == 0:
+            data = np.empty(0, dtype=np.float32)
+        elif count == 1:
+            data = chunks[0]
+        else:
+            # NOTE: 只拼接一次，之后 chunk 数不变就直接返回缓存
+            data = np.concatenate(chunks[:count], axis=0)
+        self._data = (count, data)
+        return data
+
+    @data.setter
+    def data(self, value: npt.NDArray) -> None:
+        self.chunks = [np.asarray(value, dtype=np.float32)]
+        self._data = None
+
+    def append(self, data: npt.NDArray) -> None:
+        if data.size == 0:
+            return
+        self.chunks.append(np.asarray(data, dtype=np.float32))
 
 
 class TTSBucket:
-    def __init__(self, segments: list[SynthAudio]) -> None:
+    def __init__(self, segments: list[SynthAudio], key: Hashable = None) -> None:
         self.segments = segments
+        # 同一个 bucket 的 segment 除了文本以外配置相同，可以放在同一个 batch 中推理
+        self.key = key
 
 
 class TTSBatch:
@@ -1,16 +1,15 @@
 import asyncio
 import logging
 import threading
-from time import sleep, time
 from typing import AsyncGenerator, Generator, Literal, Union
 
 from pydub import AudioSegment
 
-from modules.core.models.AudioReshaper import AudioReshaper
 from modules.core.models.TTSModel import TTSModel
 from modules.core.pipeline.dcls import TTSSegment
 from modules.core.pipeline.generate.BatchSynth import BatchSynth
 from modules.core.pipeline.generate.Chunker import TTSChunker
+from modules.core.pipeline.plan import PostProcessPlan
 from modules.core.pipeline.processor import (
     AUDIO,
     NP_AUDIO,
@@ -29,6 +28,8 @@ class AudioPipeline:
         self.context = context
 
         self.audio_sr = 44100
+        # NOTE: 第一次后处理时编译，之后流式的每个 chunk 复用
+        self.plan: PostProcessPlan = None
 
     def add_module(self, module: Union[AudioProcessor, SegmentProcessor]):
         if module not in self.context.modules:
@@ -37,11 +38,19 @@ class AudioPipeline:
     def generate(self) -> NP_AUDIO:
         pass
 
+    def get_plan(self) -> PostProcessPlan:
+        if self.plan is None:
+            self.plan = PostProcessPlan.compile(
+                context=self.context, target_sr=self.audio_sr
+            )
+        return self.plan
+
     def process_np_audio(self, audio: NP_AUDIO) -> NP_AUDIO:
-        audio = self.process_audio(audio)
-        audio = self.ensure_audio_type(audio, "ndarray")
-        audio = AudioReshaper.normalize_audio(audio=audio, target_sr=self.audio_sr)
-        return audio
+        return self.get_plan().run(audio)
+
+    def log_plan(self, logger: logging.Logger) -> None:
+        if self.plan is not None:
+            logger.debug(f"post process {self.plan.describe()}")
 
     def ensure_audio_type(
         self, audio: AUDIO, output_type: Literal["ndarray", "segment"]
@@ -68,8 +77,11 @@ class AudioPipeline:
         return audio
 
     def process_pre(self, seg: TTSSegment):
+        """
+        NOTE: text_only 的 processor (TN) 不在这里执行，由 BatchGenerate 提交到 PreProcessPool
+        """
         for module in self.context.modules:
-            if isinstance(module, SegmentProcessor):
+            if isinstance(module, SegmentProcessor) and not module.text_only:
                 seg = module.pre_process(segment=seg, context=self.context)
         return seg
 
@@ -87,6 +99,7 @@ class TTSPipeline(AudioPipeline):
     def __init__(self, context: TTSPipelineContext):
         super().__init__(context=context)
         self.model: TTSModel = None
+        self.synth: BatchSynth = None
 
     def set_model(self, model):
         self.model = model
@@ -100,8 +113,16 @@ class TTSPipeline(AudioPipeline):
         synth = BatchSynth(
             input_segments=segments, context=self.context, model=self.model
         )
+        self.synth = synth
         return synth
 
+    def interrupt(self):
+        self.context.stop = True
+        if self.synth is not None:
+            self.synth.interrupt()
+        else:
+            self.model.interrupt()
+
     def get_timeout(self):
         # 从配置读取，默认 5 分钟
         timeout = self.context.infer_config.timeout
@@ -111,35 +132,44 @@ class TTSPipeline(AudioPipeline):
 
     async def generate(self, timeout: Union[float, None] = None) -> NP_AUDIO:
         synth = self.create_synth()
+        synth.bind_loop(asyncio.get_running_loop())
         synth.start_generate()
         await synth.wait_done(
             timeout=timeout or self.get_timeout(),
             query_stop_fn=lambda: self.context.stop,
         )
         audio = synth.sr(), synth.read()
-        return self.process_np_audio(audio)
+        audio = self.process_np_audio(audio)
+        self.log_plan(self.logger)
+        return audio
 
     async def generate_stream(
         self, timeout: Union[float, None] = None
     ) -> AsyncGenerator[NP_AUDIO, None]:
         synth = self.create_synth()
+        loop = asyncio.get_running_loop()
+        synth.bind_loop(loop, stream=True)
+        if self.context.stop:
+            # 如果先stop后generate，有可能走到这里
+            raise ConnectionAbortedError()
         synth.start_generate()
-        start_time = time()
         timeout = timeout or self.get_timeout()
-        while not synth.is_done():
-            if self.context.stop:
-                # 如果先stop后generate，有可能走到这里
-                self.model.interrupt()
-                raise ConnectionAbortedError()
-            if time() - start_time > timeout:
+        deadline = loop.time() + timeout
+        while True:
+            try:
+                data = await synth.next_chunk(timeout=max(0, deadline - loop.time()))
+            except asyncio.TimeoutError:
                 self.logger.error("Stream generation timed out")
                 break
-            data = synth.read()
-            if data.size > 0:
-                audio = synth.sr(), data
-                yield self.process_np_audio(audio)
-            await asyncio.sleep(0.1)
-        data = synth.read()
-        if data.size > 0:
-            audio = synth.sr(), data
-            yield self.process_np_audio(audio)
+            except ConnectionAbortedError:
+                synth.interrupt()
+                raise
+            if data is None:
+                break
+            audio = self.get_plan().process_chunk((synth.sr(), data))
+            if audio is not None:
+                yield audio
+        audio = self.get_plan().flush()
+        if audio is not None:
+            yield audio
+        self.log_plan(self.logger)
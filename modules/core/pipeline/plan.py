@@ -0,0 +1,223 @@
+from collections import Counter
+from dataclasses import dataclass, replace
+from functools import partial
+from typing import Callable, Union
+
+import numpy as np
+from pydub import AudioSegment
+
+from modules.core.models.AudioReshaper import AudioReshaper
+from modules.core.pipeline.processor import (
+    AUDIO,
+    NP_AUDIO,
+    AudioProcessor,
+    StreamProcessor,
+    TTSPipelineContext,
+)
+from modules.core.pipeline.processors.Adjuster import AdjusterProcessor
+from modules.core.pipeline.processors.Normalizer import AudioNormalizer
+from modules.utils import audio_utils
+from modules.utils.resampler import StreamResampler
+
+
+@dataclass(frozen=True)
+class PlanStage:
+    name: str
+    run: Callable[[NP_AUDIO], NP_AUDIO]
+    create_stream: Callable[[], StreamProcessor]
+
+
+class PostProcessPlan:
+    """
+    后处理计划
+
+    每个请求根据 context 编译一次，之后每个 (流式) chunk 只执行真正需要的步骤：
+    - is_enabled 为 False 的 processor 直接去掉
+    - normalize 之后的 volume_gain_db 合并到 normalize 的那一次乘法中，
+      adjuster 只剩音量调整时整个去掉
+    - 最后的 float32 / 单声道 / 重采样只在需要时执行
+
+    流式输出使用 process_chunk / flush ，每个步骤使用各自的 StreamProcessor 保存跨 chunk 的状态，
+    每个采样只被处理一次，最后的重采样也使用保留滤波器状态的 StreamResampler
+
+    ran 记录每个步骤实际执行的次数，用于日志和排查
+    """
+
+    def __init__(self, stages: list[PlanStage], target_sr: int) -> None:
+        self.stages = stages
+        self.target_sr = target_sr
+        self.ran: Counter[str] = Counter()
+        self.streams: Union[list[StreamProcessor], None] = None
+        self.resampler: Union[StreamResampler, None] = None
+
+    @classmethod
+    def compile(cls, context: TTSPipelineContext, target_sr: int) -> "PostProcessPlan":
+        processors = [
+            module
+            for module in context.modules
+            if isinstance(module, AudioProcessor) and module.is_enabled(context)
+        ]
+        adjust_config = context.adjust_config
+
+        stages: list[PlanStage] = []
+        index = 0
+        while index < len(processors):
+            module = processors[index]
+            next_module = (
+                processors[index + 1] if index + 1 < len(processors) else None
+            )
+            index += 1
+
+            if isinstance(module, AudioNormalizer) and isinstance(
+                next_module, AdjusterProcessor
+            ):
+                # NOTE: 音量增益是线性的，变速/变调不改变它的效果，所以可以提前到 normalize 中
+                gain_db = audio_utils.clamp_volume_db(adjust_config.volume_gain_db)
+                stages.append(
+                    PlanStage(
+                        name="normalize+gain" if gain_db != 0 else "normalize",
+                        run=cls.normalize_stage(
+                            module, headroom=adjust_config.headroom, gain_db=gain_db
+                        ),
+                        create_stream=partial(
+                            module.create_stream, context, gain_db=gain_db
+                        ),
+                    )
+                )
+                rest_config = adjust_config.model_copy(update={"volume_gain_db": 0})
+                index += 1
+                if next_module.is_enabled(
+                    replace(context, adjust_config=rest_config)
+                ):
+                    stages.append(
+                        PlanStage(
+                            name=next_module.__class__.__name__,
+                            run=cls.adjust_stage(next_module, rest_config),
+                            create_stream=partial(
+                                next_module.create_stream,
+                                context,
+                                adjust_config=rest_config,
+                            ),
+                        )
+                    )
+                continue
+
+            stages.append(
+                PlanStage(
+                    name=module.__class__.__name__,
+                    run=cls.module_stage(module, context),
+                    create_stream=partial(module.create_stream, context),
+                )
+            )
+
+        return cls(stages=stages, target_sr=target_sr)
+
+    @staticmethod
+    def normalize_stage(module: AudioNormalizer, headroom: float, gain_db: float):
+        return lambda audio: module.normalize(
+            audio=audio, headroom=headroom, gain_db=gain_db
+        )
+
+    @staticmethod
+    def adjust_stage(module: AdjusterProcessor, adjust_config):
+        return lambda audio: module.adjust(audio=audio, adjust_config=adjust_config)
+
+    @staticmethod
+    def module_stage(module: AudioProcessor, context: TTSPipelineContext):
+        return lambda audio: module.process(audio=audio, context=context)
+
+    def to_ndarray(self, audio: AUDIO) -> NP_AUDIO:
+        if isinstance(audio, AudioSegment):
+            self.ran["to_ndarray"] += 1
+            return audio.frame_rate, audio_utils.audiosegment_to_librosawav(audio)
+        return audio
+
+    def reshape(self, audio: NP_AUDIO, stream=False) -> NP_AUDIO:
+        sr, data = audio
+        if data.dtype != np.float32 or data.ndim != 1:
+            self.ran["normalize_audio_type"] += 1
+            sr, data = AudioReshaper.normalize_audio_type(audio=(sr, data))
+        if sr != self.target_sr:
+            self.ran["resample"] += 1
+            if stream:
+                sr, data = self.target_sr, self.stream_resample(sr, data)
+            else:
+                sr, data = AudioReshaper.resample_audio(
+                    audio=(sr, data), target_sr=self.target_sr
+                )
+        return sr, data
+
+    def stream_resample(self, sr: int, data: np.ndarray) -> np.ndarray:
+        head = np.empty(0, dtype=np.float32)
+        if self.resampler is not None and self.resampler.resampler.src_sr != sr:
+            # NOTE: 输入采样率中途变化时，先输出旧的 resampler 缓存的部分
+            head = self.resampler.flush()
+            self.resampler = None
+        if self.resampler is None:
+            self.resampler = AudioReshaper.create_stream_resampler(
+                sr=sr, target_sr=self.target_sr
+            )
+        data = self.resampler.push(data)
+        return np.concatenate([head, data]) if head.size > 0 else data
+
+    def run(self, audio: AUDIO) -> NP_AUDIO:
+        audio = self.to_ndarray(audio)
+        for stage in self.stages:
+            audio = self.to_ndarray(stage.run(audio))
+            self.ran[stage.name] += 1
+        return self.reshape(audio)
+
+    def process_chunk(self, audio: AUDIO) -> Union[NP_AUDIO, None]:
+        """
+        流式处理一个 chunk ，有状态的步骤可能暂时没有输出，此时返回 None
+        """
+        if self.streams is None:
+            self.streams = [stage.create_stream() for stage in self.stages]
+        audio = self.to_ndarray(audio)
+        audio = self.run_streams(audio, start=0)
+        if audio is None:
+            return None
+        sr, data = self.reshape(audio, stream=True)
+        if data.size == 0:
+            return None
+        return sr, data
+
+    def run_streams(
+        self, audio: Union[NP_AUDIO, None], start: int
+    ) -> Union[NP_AUDIO, None]:
+        for stage, stream in zip(self.stages[start:], self.streams[start:]):
+            if audio is None or audio[1].size == 0:
+                return None
+            audio = self.to_ndarray(stream.process_chunk(audio))
+            self.ran[stage.name] += 1
+        if audio is None or audio[1].size == 0:
+            return None
+        return audio
+
+    def flush(self) -> Union[NP_AUDIO, None]:
+        """
+        流式结束时调用，依次 flush 每个步骤缓存的数据，并交给后面的步骤处理
+        """
+        if self.streams is None:
+            return None
+        outputs: list[NP_AUDIO] = []
+        for index, stream in enumerate(self.streams):
+            # NOTE: 每个步骤 flush 出来的数据还需要经过后面的步骤，后面步骤缓存的部分在它自己 flush 时输出
+            rest = stream.flush()
+            if rest is None or rest[1].size == 0:
+                continue
+            audio = self.run_streams(self.to_ndarray(rest), start=index + 1)
+            if audio is not None:
+                outputs.append(self.reshape(audio, stream=True))
+        if self.resampler is not None:
+            outputs.append((self.target_sr, self.resampler.flush()))
+            self.resampler = None
+        outputs = [(sr, data) for sr, data in outputs if data.size > 0]
+        if len(outputs) == 0:
+            return None
+        return outputs[0][0], np.concatenate([data for _, data in outputs])
+
+    def describe(self) -> str:
+        planned = [stage.name for stage in self.stages] or ["(none)"]
+        ran = ", ".join(f"{name} x{count}" for name, count in self.ran.items())
+        return f"planned: {' -> '.join(planned)}; ran: {ran or '(none)'}"
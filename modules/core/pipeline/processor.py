@@ -1,4 +1,4 @@
-from typing import Tuple, Union
+from typing import Callable, Tuple, Union
 
 import numpy as np
 import numpy.typing as npt
@@ -19,6 +19,10 @@ class SegmentProcessor:
     比如 vc 模块
     """
 
+    # pre_process 只修改 segment.text 时为 True (比如 TN) ，
+    # 这类处理不影响 bucket 划分，会在线程池中和推理并行执行，见 PreProcessPool
+    text_only = False
+
     def pre_process(
         self, segment: TTSSegment, context: TTSPipelineContext
     ) -> TTSSegment:
@@ -31,12 +35,61 @@ class SegmentProcessor:
         """
         return
 
+    def after_process_batch(
+        self, results: list[SynthAudio], context: TTSPipelineContext
+    ) -> None:
+        """
+        一次处理多个 result ，可以合并计算的 processor 覆盖这个方法
+        """
+        for result in results:
+            self.after_process(result=result, context=context)
+
+
+class StreamProcessor:
+    """
+    流式后处理，每个请求创建一个实例，保存跨 chunk 的状态
+
+    process_chunk 返回的数据可以比输入少（比如 look-ahead 或者攒够一段再处理），
+    剩余的数据在 flush 时返回
+    """
+
+    def process_chunk(self, audio: NP_AUDIO) -> NP_AUDIO:
+        raise NotImplementedError
+
+    def flush(self) -> Union[NP_AUDIO, None]:
+        return None
+
+
+class StatelessStream(StreamProcessor):
+    """
+    不需要状态的处理，每个 chunk 独立处理
+    """
+
+    def __init__(self, fn: Callable[[NP_AUDIO], NP_AUDIO]) -> None:
+        self.fn = fn
+
+    def process_chunk(self, audio: NP_AUDIO) -> NP_AUDIO:
+        return self.fn(audio)
+
 
 class AudioProcessor:
     """
     后处理，或者叫做音频处理，比如 响度均衡
     """
 
+    def is_enabled(self, context: TTSPipelineContext) -> bool:
+        """
+        根据 context 判断是否需要执行，返回 False 的 processor 不会进入后处理计划 (PostProcessPlan)
+        """
+        return True
+
+    def create_stream(self, context: TTSPipelineContext) -> StreamProcessor:
+        """
+        流式输出时使用的处理器，默认对每个 chunk 独立调用 process
+        需要跨 chunk 状态的 processor (响度、变速变调等) 需要覆盖这个方法
+        """
+        return StatelessStream(lambda audio: self.process(audio=audio, context=context))
+
     def process(self, audio: AUDIO, context: TTSPipelineContext) -> AUDIO:
         if isinstance(audio, tuple):
             return self._process_array(audio, context)
@@ -45,15 +98,16 @@ class AudioProcessor:
         else:
             raise ValueError("Unsupported audio type")
 
+    # NOTE: 子类实现其中一个即可，另一个通过类型转换调用
+    #   所有内置的 processor 都实现 _process_array ，ndarray 输入不会经过 pydub
     def _process_array(self, audio: NP_AUDIO, context: TTSPipelineContext) -> NP_AUDIO:
         sr, data = audio
         segment = audio_utils.ndarray_to_segment(ndarray=data, frame_rate=sr)
         processed_segment = self._process_segment(segment, context)
-        return audio_utils.audiosegment_to_librosawav(processed_segment)
+        return audio_utils.pydub_to_np(processed_segment)
 
     def _process_segment(
         self, audio: AudioSegment, context: TTSPipelineContext
     ) -> AudioSegment:
-        ndarray = audio_utils.audiosegment_to_librosawav(audio)
-        processed_ndarray = self._process_array(ndarray, context)
-        return audio_utils.ndarray_to_segment(processed_ndarray)
+        sr, data = self._process_array(audio_utils.pydub_to_np(audio), context)
+        return audio_utils.ndarray_to_segment(ndarray=data, frame_rate=sr)
@@ -1,6 +1,17 @@
+from modules.core.handler.datacls.audio_model import AdjustConfig
 from modules.core.pipeline.dcls import TTSPipelineContext
 from modules.core.pipeline.generate.dcls import SynthAudio
-from modules.core.pipeline.processor import NP_AUDIO, AudioProcessor, SegmentProcessor
+from modules.core.pipeline.processor import (
+    NP_AUDIO,
+    AudioProcessor,
+    SegmentProcessor,
+    StatelessStream,
+    StreamProcessor,
+)
+from modules.core.pipeline.processors.Streaming import (
+    OverlapAddStream,
+    TimeStretchStream,
+)
 from modules.utils import audio_utils
 
 
@@ -9,9 +20,36 @@ class AdjusterProcessor(AudioProcessor):
     对整个合成结果进行 adjust
     """
 
+    def is_enabled(self, context: TTSPipelineContext) -> bool:
+        adjust_config = context.adjust_config
+        return (
+            adjust_config.speed_rate != 1
+            or adjust_config.pitch != 0
+            or adjust_config.volume_gain_db != 0
+            or adjust_config.remove_silence
+        )
+
     def _process_array(self, audio: NP_AUDIO, context: TTSPipelineContext) -> NP_AUDIO:
+        return self.adjust(audio=audio, adjust_config=context.adjust_config)
+
+    def create_stream(
+        self, context: TTSPipelineContext, adjust_config: AdjustConfig = None
+    ) -> StreamProcessor:
+        adjust_config = adjust_config or context.adjust_config
+        # NOTE: remove_silence 只支持非流式
+        adjust_config = adjust_config.model_copy(update={"remove_silence": False})
+        if adjust_config.speed_rate == 1 and adjust_config.pitch == 0:
+            # 只有音量调整，逐个 chunk 处理即可
+            return StatelessStream(lambda audio: self.adjust(audio, adjust_config))
+        if adjust_config.pitch == 0 and audio_utils.get_prosody_backend() == "native":
+            return TimeStretchStream(
+                rate=adjust_config.speed_rate,
+                gain_db=audio_utils.clamp_volume_db(adjust_config.volume_gain_db),
+            )
+        return OverlapAddStream(lambda audio: self.adjust(audio, adjust_config))
+
+    def adjust(self, audio: NP_AUDIO, adjust_config: AdjustConfig) -> NP_AUDIO:
         sample_rate, audio_data = audio
-        adjust_config = context.adjust_config
         speed_rate = adjust_config.speed_rate
 
         audio_data = audio_utils.apply_prosody_to_audio_data(
@@ -39,30 +77,39 @@ class AdjustSegmentProcessor(SegmentProcessor):
     TODO: 最好整合一下逻辑，不然有点混乱说实话...
     """
 
-    def after_process(self, result: SynthAudio, context: TTSPipelineContext) -> None:
+    def get_speed_rate(self, result: SynthAudio) -> float:
         seg = result.seg
-        audio_data = result.data
-        sample_rate = result.sr
         speed_rate = seg.speed_rate
         duration_ms = seg.duration_ms
-        segment_duration = audio_data.size / sample_rate
+        segment_duration = result.data.size / result.sr
 
         # 因为目前只支持 speed 调整所以只检查 speed
         no_speed_rate = speed_rate == 1 or speed_rate is None
         no_duration_ms = duration_ms is None
         if no_speed_rate and no_duration_ms:
-            return
+            return 1
 
         if duration_ms is not None:
             duration_s = duration_ms / 1000
             speed_rate = segment_duration / duration_s
+        return speed_rate
 
-        if speed_rate == 1:
-            return
+    def after_process(self, result: SynthAudio, context: TTSPipelineContext) -> None:
+        self.after_process_batch(results=[result], context=context)
 
-        audio_data = audio_utils.apply_prosody_to_audio_data(
-            audio_data=audio_data,
-            rate=speed_rate,
-            sr=sample_rate,
-        )
-        result.data = audio_data
+    def after_process_batch(
+        self, results: list[SynthAudio], context: TTSPipelineContext
+    ) -> None:
+        # NOTE: 字幕配音这类请求有大量 duration_ms 的 segment ，合并成一次变速调用
+        results = [result for result in results if result.data.size > 0]
+        rates = [self.get_speed_rate(result) for result in results]
+        todo = [(result, rate) for result, rate in zip(results, rates) if rate != 1]
+        for sample_rate in set(result.sr for result, _ in todo):
+            group = [item for item in todo if item[0].sr == sample_rate]
+            outputs = audio_utils.apply_time_stretch_batch(
+                audios=[audio_utils.to_float32(result.data) for result, _ in group],
+                rates=[rate for _, rate in group],
+                sr=sample_rate,
+            )
+            for (result, _), audio_data in zip(group, outputs):
+                result.data = audio_data
@@ -1,9 +1,19 @@
 from modules.core.models.zoo.ModelZoo import model_zoo
 from modules.core.pipeline.dcls import TTSPipelineContext
-from modules.core.pipeline.processor import NP_AUDIO, AudioProcessor
+from modules.core.pipeline.processor import NP_AUDIO, AudioProcessor, StreamProcessor
+from modules.core.pipeline.processors.Streaming import OverlapAddStream
 
 
 class EnhancerProcessor(AudioProcessor):
+    def is_enabled(self, context: TTSPipelineContext) -> bool:
+        return context.enhancer_config.enabled
+
+    def create_stream(self, context: TTSPipelineContext) -> StreamProcessor:
+        # NOTE: 增强模型需要足够的上下文，按 1s 分块处理
+        return OverlapAddStream(
+            lambda audio: self._process_array(audio, context), block_s=1.0
+        )
+
     def _process_array(self, audio: NP_AUDIO, context: TTSPipelineContext) -> NP_AUDIO:
         enhancer_config = context.enhancer_config
 
@@ -1,15 +1,33 @@
 from modules.core.pipeline.dcls import TTSPipelineContext
-from modules.core.pipeline.processor import NP_AUDIO, AudioProcessor
+from modules.core.pipeline.processor import NP_AUDIO, AudioProcessor, StreamProcessor
+from modules.core.pipeline.processors.Streaming import StreamNormalizer
 from modules.utils import audio_utils
 
 
 class AudioNormalizer(AudioProcessor):
+    def is_enabled(self, context: TTSPipelineContext) -> bool:
+        return context.adjust_config.normalize
+
     def _process_array(self, audio: NP_AUDIO, context: TTSPipelineContext) -> NP_AUDIO:
         adjust_config = context.adjust_config
         if not adjust_config.normalize:
             return audio
+        return self.normalize(audio=audio, headroom=adjust_config.headroom)
+
+    def normalize(
+        self, audio: NP_AUDIO, headroom: float, gain_db: float = 0
+    ) -> NP_AUDIO:
+        """
+        :param gain_db: 合并进来的音量增益，见 PostProcessPlan
+        """
         sample_rate, audio_data = audio
         sample_rate, audio_data = audio_utils.apply_normalize(
-            audio_data=audio_data, headroom=adjust_config.headroom, sr=sample_rate
+            audio_data=audio_data, headroom=headroom, sr=sample_rate, gain_db=gain_db
         )
         return sample_rate, audio_data
+
+    def create_stream(
+        self, context: TTSPipelineContext, gain_db: float = 0
+    ) -> StreamProcessor:
+        headroom = context.adjust_config.headroom
+        return StreamNormalizer(headroom=headroom, gain_db=gain_db)
@@ -0,0 +1,231 @@
+from typing import Callable, Union
+
+import numpy as np
+from scipy.ndimage import minimum_filter1d, uniform_filter1d
+
+from modules.core.pipeline.processor import NP_AUDIO, StreamProcessor
+from modules.utils import audio_utils
+from modules.utils.time_stretch import WsolaStream
+
+
+def empty_audio(sr: int) -> NP_AUDIO:
+    return sr, np.empty(0, dtype=np.float32)
+
+
+class LookaheadLimiter(StreamProcessor):
+    """
+    look-ahead 限幅器，保证输出峰值不超过 threshold
+
+    每个采样需要的增益 r = min(1, threshold / |x|)，先在 ±H 范围取最小值，再做宽度 H 的平滑，
+    平滑窗口内的每个最小值都覆盖了当前采样，所以平滑后的增益仍然不大于 r ，不会过冲，
+    并且增益在峰值前后 H 个采样内渐变，不会产生咔哒声
+
+    流式时需要看到未来 delay 个采样才能输出，最后的部分在 flush 时输出
+    """
+
+    def __init__(
+        self, threshold: float, sample_rate: int, lookahead_s: float = 0.005
+    ) -> None:
+        self.threshold = threshold
+        self.sr = sample_rate
+        self.half = max(1, int(sample_rate * lookahead_s))
+        self.delay = self.half + self.half // 2 + 1
+        # 已经输出的最后 delay 个采样，作为下一次计算的上下文
+        self.history = np.empty(0, dtype=np.float32)
+        self.pending = np.empty(0, dtype=np.float32)
+
+    def get_gain(self, data: np.ndarray) -> np.ndarray:
+        peak = np.maximum(np.abs(data), 1e-12)
+        required = np.minimum(np.float32(1), self.threshold / peak).astype(np.float32)
+        # NOTE: 两端以外视为不需要限幅，中间的 chunk 只输出两侧上下文都完整的部分
+        held = minimum_filter1d(
+            required, size=2 * self.half + 1, mode="constant", cval=1.0
+        )
+        return uniform_filter1d(held, size=self.half, mode="nearest")
+
+    def run(self, final: bool) -> np.ndarray:
+        context = len(self.history)
+        buf = np.concatenate([self.history, self.pending])
+        end = len(buf) if final else len(buf) - self.delay
+        if end <= context:
+            return np.empty(0, dtype=np.float32)
+        gain = self.get_gain(buf)
+        out = buf[context:end] * gain[context:end]
+        self.history = buf[max(0, end - self.delay) : end]
+        self.pending = buf[end:]
+        return out
+
+    def process_chunk(self, audio: NP_AUDIO) -> NP_AUDIO:
+        sr, data = audio
+        self.pending = np.concatenate([self.pending, audio_utils.to_float32(data)])
+        return sr, self.run(final=False)
+
+    def flush(self) -> NP_AUDIO:
+        return self.sr, self.run(final=True)
+
+
+class StreamNormalizer(StreamProcessor):
+    """
+    流式响度均衡
+
+    非流式时按整段音频的峰值归一化，流式时只能看到已经生成的部分：
+    - 增益按目前为止的最大峰值计算，峰值只增不减，所以增益只会下降，不会忽大忽小 (gain pumping)
+    - 增益变化时在 chunk 内线性过渡
+    - 峰值还没稳定时可能过冲，由 LookaheadLimiter 限制在目标峰值以内
+
+    :param min_peak: 开头的 chunk 可能很安静，限制最大增益，避免把底噪放大
+    """
+
+    def __init__(self, headroom: float, gain_db: float = 0, min_peak=0.05) -> None:
+        self.target = 10 ** (-headroom / 20) * 10 ** (gain_db / 20)
+        self.min_peak = min_peak
+        self.peak = 0.0
+        self.gain: Union[float, None] = None
+        self.limiter: Union[LookaheadLimiter, None] = None
+
+    def process_chunk(self, audio: NP_AUDIO) -> NP_AUDIO:
+        sr, data = audio
+        data = audio_utils.to_float32(data)
+        if self.limiter is None:
+            self.limiter = LookaheadLimiter(
+                threshold=min(self.target, 1.0), sample_rate=sr
+            )
+        if data.size == 0:
+            return self.limiter.process_chunk((sr, data))
+
+        self.peak = max(self.peak, float(np.abs(data).max()))
+        gain = self.target / max(self.peak, self.min_peak)
+        prev_gain = gain if self.gain is None else self.gain
+        if prev_gain != gain:
+            data = data * np.linspace(prev_gain, gain, data.size, dtype=np.float32)
+        else:
+            data = data * np.float32(gain)
+        self.gain = gain
+        return self.limiter.process_chunk((sr, data))
+
+    def flush(self) -> Union[NP_AUDIO, None]:
+        if self.limiter is None:
+            return None
+        return self.limiter.flush()
+
+
+class TimeStretchStream(StreamProcessor):
+    """
+    原生 WSOLA 流式变速，不需要攒块，每个 chunk 都有输出
+
+    :param gain_db: 同时叠加的音量增益
+    """
+
+    def __init__(self, rate: float, gain_db: float = 0) -> None:
+        self.rate = rate
+        self.gain_db = gain_db
+        self.sr: Union[int, None] = None
+        self.stream: Union[WsolaStream, None] = None
+
+    def apply_gain(self, data: np.ndarray) -> np.ndarray:
+        if self.gain_db == 0 or data.size == 0:
+            return data
+        return audio_utils.apply_gain_np(data, gain_db=self.gain_db, out=data)
+
+    def process_chunk(self, audio: NP_AUDIO) -> NP_AUDIO:
+        sr, data = audio
+        if self.stream is None:
+            self.sr = sr
+            self.stream = WsolaStream(rate=self.rate, sr=sr)
+        data = self.stream.push(audio_utils.to_float32(data))
+        return sr, self.apply_gain(data)
+
+    def flush(self) -> Union[NP_AUDIO, None]:
+        if self.stream is None:
+            return None
+        return self.sr, self.apply_gain(self.stream.flush())
+
+
+class OverlapAddStream(StreamProcessor):
+    """
+    分块处理 + 交叉淡化，给变速、变调、增强这类需要上下文的处理使用
+
+    输入攒够 block_s 之后一次处理，每次处理时在前面带上 context_s 的历史输入，
+    丢掉历史输入对应的输出，并且和上一块输出的结尾做 crossfade_s 的交叉淡化，
+    避免每个 ~100ms 的 chunk 单独处理导致的边界伪影，同时每个采样只处理约一次
+
+    fn 可以改变长度 (变速) 和采样率 (增强)，按输出/输入的长度比例对齐
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[NP_AUDIO], NP_AUDIO],
+        block_s: float = 0.5,
+        context_s: float = 0.1,
+        crossfade_s: float = 0.02,
+    ) -> None:
+        self.fn = fn
+        self.block_s = block_s
+        self.context_s = context_s
+        self.crossfade_s = crossfade_s
+
+        self.sr: Union[int, None] = None
+        self.out_sr: Union[int, None] = None
+        self.pending: list[np.ndarray] = []
+        self.pending_size = 0
+        self.context = np.empty(0, dtype=np.float32)
+        # 上一块输出中还没有输出的结尾，用于交叉淡化
+        self.tail = np.empty(0, dtype=np.float32)
+
+    def run(self, final: bool) -> NP_AUDIO:
+        data = (
+            np.concatenate(self.pending)
+            if self.pending
+            else np.empty(0, dtype=np.float32)
+        )
+        self.pending = []
+        self.pending_size = 0
+        if final and data.size == 0:
+            tail, self.tail = self.tail, np.empty(0, dtype=np.float32)
+            return self.out_sr or self.sr, tail
+
+        seg = np.concatenate([self.context, data])
+        if seg.size == 0:
+            return empty_audio(self.out_sr or self.sr)
+        out_sr, out = self.fn((self.sr, seg))
+        out = audio_utils.to_float32(out)
+        self.out_sr = out_sr
+
+        ratio = out.size / seg.size
+        context_out = min(int(round(self.context.size * ratio)), out.size)
+        overlap = min(self.tail.size, context_out)
+        head = self.tail[: self.tail.size - overlap]
+        if overlap > 0:
+            fade_in = np.linspace(0, 1, overlap, dtype=np.float32)
+            mixed = (
+                self.tail[self.tail.size - overlap :] * (1 - fade_in)
+                + out[context_out - overlap : context_out] * fade_in
+            )
+        else:
+            mixed = out[:0]
+        body = out[context_out:]
+
+        if final:
+            self.tail = np.empty(0, dtype=np.float32)
+        else:
+            keep = min(int(out_sr * self.crossfade_s), body.size)
+            self.tail = body[body.size - keep :]
+            body = body[: body.size - keep]
+        self.context = seg[max(0, seg.size - int(self.sr * self.context_s)) :]
+        return out_sr, np.concatenate([head, mixed, body])
+
+    def process_chunk(self, audio: NP_AUDIO) -> NP_AUDIO:
+        sr, data = audio
+        self.sr = sr
+        data = audio_utils.to_float32(data)
+        if data.size > 0:
+            self.pending.append(data)
+            self.pending_size += data.size
+        if self.pending_size < int(sr * self.block_s):
+            return empty_audio(self.out_sr or sr)
+        return self.run(final=False)
+
+    def flush(self) -> Union[NP_AUDIO, None]:
+        if self.sr is None:
+            return None
+        return self.run(final=True)
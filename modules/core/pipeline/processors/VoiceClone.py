@@ -6,6 +6,9 @@ from modules.core.pipeline.processor import NP_AUDIO, AudioProcessor, SegmentPro
 
 
 class VoiceCloneProcessor(AudioProcessor):
+    def is_enabled(self, context: TTSPipelineContext) -> bool:
+        return context.vc_config.enabled
+
     def _process_array(self, audio: NP_AUDIO, context: TTSPipelineContext) -> NP_AUDIO:
         vc_config = context.vc_config
         if not vc_config.enabled:
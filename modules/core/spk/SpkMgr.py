@@ -12,8 +12,15 @@ class SpeakerManager(FolderDatabase):
     logger = logging.getLogger(__name__)
 
     def __init__(self):
+        # refresh 的次数，依赖 speaker 数据的缓存 (如 RefWavCache) 据此失效
+        self.generation = 0
         super().__init__("./data/speakers/")
 
+    def refresh(self):
+        super().refresh()
+        # NOTE: speaker 文件可能被修改，这里不直接清空 RefWavCache ，避免 spk 和 models 循环导入
+        self.generation += 1
+
     def is_valid_file(self, file_path: str) -> bool:
         return file_path.endswith(".spkv1.json") or file_path.endswith(".spkv1.png")
 
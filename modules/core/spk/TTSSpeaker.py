@@ -1,6 +1,7 @@
 import base64
 import copy
 import dataclasses
+import hashlib
 import inspect
 import json
 import uuid
@@ -177,6 +178,53 @@ class TTSSpeaker:
         assert isinstance(data, DcSpk), "data must be a DcSpk instance"
 
         self._data = data
+        # model_id => fingerprint ，token/ref 修改时清空
+        self._fingerprints: dict[str, str] = {}
+        # ref 下标 => 参考音频内容摘要
+        self._ref_digests: dict[int, str] = {}
+
+    def ref_digest(self, ref: DcSpkReference) -> str:
+        """
+        参考音频内容 (wav、采样率、文本) 的稳定摘要，用于缓存由参考音频计算出来的特征
+        """
+        refs = self._data.refs or []
+        index = next((i for i, item in enumerate(refs) if item is ref), None)
+        if index is not None and index in self._ref_digests:
+            return self._ref_digests[index]
+
+        h = hashlib.sha256()
+        h.update(f"{ref.text}|{ref.wav_sr}|".encode("utf-8"))
+        h.update(ref.wav or b"")
+        digest = h.hexdigest()
+        if index is not None:
+            self._ref_digests[index] = digest
+        return digest
+
+    def fingerprint(self, model_id: str) -> str:
+        """
+        影响 model_id 推理结果的内容 (token 和参考音频) 的稳定摘要，用于 cache key
+        """
+        if model_id in self._fingerprints:
+            return self._fingerprints[model_id]
+
+        h = hashlib.sha256()
+        h.update(str(self.id).encode("utf-8"))
+        token = self.get_token(model_id)
+        if token is not None:
+            h.update(str(token.model_hash).encode("utf-8"))
+            for tensors in [token.tokens, token.embedding or [], token.feat or []]:
+                for t in tensors:
+                    if isinstance(t, torch.Tensor):
+                        h.update(t.detach().cpu().contiguous().numpy().tobytes())
+                    else:
+                        h.update(str(t).encode("utf-8"))
+        for ref in self._data.refs or []:
+            h.update(f"{ref.text}|{ref.emotion}|{ref.wav_sr}|".encode("utf-8"))
+            h.update(ref.wav or b"")
+
+        digest = h.hexdigest()
+        self._fingerprints[model_id] = digest
+        return digest
 
     @property
     def has_refs(self):
@@ -283,6 +331,7 @@ class TTSSpeaker:
         self.set_token_obj(token=token)
 
     def set_token_obj(self, *, token: DcSpkVoiceToken):
+        self._fingerprints.clear()
         for i, t in enumerate(self._data.token):
             if t.model_id == token.model_id:
                 self._data.token[i] = token
@@ -290,6 +339,8 @@ class TTSSpeaker:
         self._data.token.append(token)
 
     def add_ref(self, *, ref: DcSpkReference) -> None:
+        self._fingerprints.clear()
+        self._ref_digests.clear()
         if self._data.refs is None:
             self._data.refs = []
         self._data.refs.append(ref)
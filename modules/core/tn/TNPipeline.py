@@ -1,11 +1,16 @@
 import copy
+import itertools
+import threading
+import time
 from dataclasses import dataclass
-from typing import Callable, Dict, Literal, Optional
+from typing import Callable, Dict, Literal, Optional, Union
 
-from langdetect import LangDetectException, detect_langs
+from cachetools import LRUCache
 
+from modules import config as global_config
 from modules.core.handler.datacls.tn_model import TNConfig
-from modules.utils.detect_lang import guess_lang
+from modules.utils.aho_corasick import get_automaton
+from modules.utils.detect_lang import FALLBACK_CONFIDENCE, identify_langs
 
 
 @dataclass(frozen=True, repr=False)
@@ -43,14 +48,68 @@ class TNText:
 
 
 class TNPipeline:
-    """文本归一化管道类"""
+    """
+    文本归一化管道类
+
+    normalize 的结果只取决于 pipeline 、实际启用的 block 和输入文本，
+    所以按 (pipeline id, 启用的 block, freeze_tokens, text) 在所有请求之间缓存，
+    缓存条数由 tn_cache_size 控制，为 0 时不缓存
+
+    每个 block 的调用次数和耗时记录在 block_stats 中，用于排查哪些 block 最慢
+    """
 
     SEP_CHAR = "\n"
 
+    cache: Union[LRUCache, None] = None
+    lock = threading.Lock()
+    ids = itertools.count()
+
     def __init__(self):
         self.blocks: list[TNBlock] = []
         self.freeze_tokens: list[str] = []
 
+        # NOTE: clone 出来的 pipeline 使用新的 id ，不会和原 pipeline 共用缓存
+        self.id = next(TNPipeline.ids)
+        self.reset_stats()
+
+    @classmethod
+    def get_cache(cls) -> Union[LRUCache, None]:
+        size = global_config.runtime_env_vars.tn_cache_size
+        size = 10000 if size is None else int(size)
+        if size <= 0:
+            return None
+        if cls.cache is None or cls.cache.maxsize != size:
+            cls.cache = LRUCache(maxsize=size)
+        return cls.cache
+
+    @classmethod
+    def clear_cache(cls) -> None:
+        with cls.lock:
+            if cls.cache is not None:
+                cls.cache.clear()
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        # block name => [调用次数, 总耗时 (秒)]
+        self.block_stats: Dict[str, list] = {}
+
+    def stats(self) -> dict:
+        with TNPipeline.lock:
+            total = self.hits + self.misses
+            blocks = sorted(
+                self.block_stats.items(), key=lambda item: item[1][1], reverse=True
+            )
+            return dict(
+                hits=self.hits,
+                misses=self.misses,
+                hit_rate=self.hits / total if total else 0.0,
+                blocks=[
+                    dict(name=name, calls=calls, total_ms=seconds * 1000)
+                    for name, (calls, seconds) in blocks
+                ],
+            )
+
     def block(self, name: str = None, enabled: bool = True):
         block = TNBlockFn(name=name, fn=None)
         block.enabled = enabled
@@ -74,7 +133,10 @@ class TNPipeline:
         self.blocks = [b for b in self.blocks if b.name != name]
 
     def clone(self):
-        return copy.deepcopy(self)
+        pipeline = copy.deepcopy(self)
+        pipeline.id = next(TNPipeline.ids)
+        pipeline.reset_stats()
+        return pipeline
 
     def split_string_with_freeze(
         self, text: str, freeze_strs: list[str]
@@ -82,61 +144,108 @@ class TNPipeline:
         if not freeze_strs:
             return [TNText(text=text, type="normal")]
 
-        result: list[TNText] = []
-        buffer = ""
-
-        for char in text:
-            buffer += char
+        # NOTE: 用 Aho-Corasick 自动机一次扫描，和逐字符 endswith 每个 token 的结果一致：
+        #       在最早结束的位置切分，同一位置结束的多个 token 取列表中靠前的，
+        #       切分后从初始状态重新开始，token 不会跨过上一次切分的位置
+        automaton = get_automaton(tuple(freeze_strs))
 
-            for freeze_str in freeze_strs:
-                if buffer.endswith(freeze_str):
-                    result.append(
-                        TNText(text=buffer[: -len(freeze_str)], type="normal")
-                    )
-                    result.append(TNText(text=freeze_str, type="freeze"))
-                    buffer = ""
-                    break
+        result: list[TNText] = []
+        start = 0
+        state = 0
 
-        if buffer:
-            result.append(TNText(text=buffer, type="normal"))
+        for index, char in enumerate(text):
+            state = automaton.step(state, char)
+            matched = automaton.first_match(state)
+            if matched == -1:
+                continue
+            freeze_str = freeze_strs[matched]
+            end = index + 1
+            result.append(
+                TNText(text=text[start : end - len(freeze_str)], type="normal")
+            )
+            result.append(TNText(text=freeze_str, type="freeze"))
+            start = end
+            state = 0
+
+        if start < len(text):
+            result.append(TNText(text=text[start:], type="normal"))
 
         return result
 
     def normalize(self, text: str, config: Optional[TNConfig] = None) -> str:
+        blocks = self.get_blocks(config)
+        key = (
+            self.id,
+            tuple([block.name for block in blocks]),
+            tuple(self.freeze_tokens),
+            text,
+        )
+        with TNPipeline.lock:
+            cache = self.get_cache()
+            result = cache.get(key) if cache is not None else None
+            if result is not None:
+                self.hits += 1
+                return result
+            self.misses += 1
+
+        timings: Dict[str, float] = {}
         texts: list[TNText] = self.split_string_with_freeze(text, self.freeze_tokens)
 
+        # 一次性识别所有需要归一化的片段的语言
+        start = time.perf_counter()
+        guesses = iter(
+            self.guess_langs_batch(
+                [tn_text.text for tn_text in texts if tn_text.type == "normal"]
+            )
+        )
+        timings["guess_langs"] = time.perf_counter() - start
+
         result = ""
 
         for tn_text in texts:
             if tn_text.type == "normal":
-                result += self._normalize(tn_text.text, config)
+                result += self.run_blocks(
+                    tn_text.text, blocks, timings, guess=next(guesses)
+                )
             else:
                 result += tn_text.text
             result += self.SEP_CHAR
+        result = result.strip()
+
+        with TNPipeline.lock:
+            if cache is not None:
+                cache[key] = result
+            for name, seconds in timings.items():
+                stat = self.block_stats.setdefault(name, [0, 0.0])
+                stat[0] += 1
+                stat[1] += seconds
+        return result
 
-        return result.strip()
-
-    def guess_langs(self, text: str):
-        zh_or_en = guess_lang(text)
-        try:
-            detected_langs = detect_langs(text)
-            detected = {lang.lang: lang.prob for lang in detected_langs}
-        except LangDetectException:
-            detected = {
-                "zh": 1.0 if zh_or_en == "zh" else 0.0,
-                "en": 1.0 if zh_or_en == "en" else 0.0,
-            }
-        guess = GuessLang(zh_or_en=zh_or_en, detected=detected)
-        return guess
-
-    def _normalize(self, text: str, config: Optional[TNConfig] = TNConfig()):
+    def guess_langs_batch(self, texts: list[str]) -> list[GuessLang]:
+        """
+        按文字统计识别语言，置信度低于 lang_detect_threshold 时才调用 langdetect
+        """
+        threshold = global_config.runtime_env_vars.lang_detect_threshold
+        if threshold is None:
+            threshold = FALLBACK_CONFIDENCE
+        return [
+            GuessLang(zh_or_en=zh_or_en, detected=detected)
+            for zh_or_en, detected in identify_langs(texts, threshold=threshold)
+        ]
+
+    def guess_langs(self, text: str) -> GuessLang:
+        return self.guess_langs_batch([text])[0]
+
+    def get_blocks(self, config: Optional[TNConfig] = None) -> list[TNBlock]:
+        """
+        根据 config 的 enabled / disabled 返回实际启用的 block
+        """
         if config is None:
             config = TNConfig()
         enabled_block = config.enabled if config.enabled else []
         disabled_block = config.disabled if config.disabled else []
 
-        guess = self.guess_langs(text)
-
+        blocks = []
         for block in self.blocks:
             enabled = block.enabled
 
@@ -145,12 +254,32 @@ class TNPipeline:
             if block.name in disabled_block:
                 enabled = False
 
-            if not enabled:
-                continue
-            # print(text)
-            # print("---", block.name)
+            if enabled:
+                blocks.append(block)
+        return blocks
+
+    def run_blocks(
+        self,
+        text: str,
+        blocks: list[TNBlock],
+        timings: Dict[str, float],
+        guess: Optional[GuessLang] = None,
+    ) -> str:
+        if guess is None:
+            start = time.perf_counter()
+            guess = self.guess_langs(text)
+            timings["guess_langs"] = timings.get("guess_langs", 0.0) + (
+                time.perf_counter() - start
+            )
+
+        for block in blocks:
+            start = time.perf_counter()
             text = block.process(text=text, guess_lang=guess)
-            # print("---")
-            # print(text)
+            timings[block.name] = timings.get(block.name, 0.0) + (
+                time.perf_counter() - start
+            )
 
         return text
+
+    def _normalize(self, text: str, config: Optional[TNConfig] = TNConfig()):
+        return self.run_blocks(text, self.get_blocks(config), timings={})
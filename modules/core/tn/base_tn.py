@@ -2,6 +2,7 @@ import html
 import os
 import platform
 import re
+from functools import lru_cache
 
 import emojiswitch
 import ftfy
@@ -17,8 +18,10 @@ BaseTN = TNPipeline()
 # ------- UTILS ---------
 
 
-def is_markdown(text):
-    markdown_patterns = [
+# NOTE: 所有正则 / 替换表都在 import 时编译好，block 调用时直接使用
+markdown_patterns = [
+    re.compile(pattern, re.MULTILINE)
+    for pattern in [
         r"(^|\s)#[^#]",  # 标题
         r"\*\*.*?\*\*",  # 加粗
         r"\*.*?\*",  # 斜体
@@ -31,9 +34,12 @@ def is_markdown(text):
         r"(^|\s)> ",  # 引用
         r"(^|\s)---",  # 分隔线
     ]
+]
+
 
+def is_markdown(text):
     for pattern in markdown_patterns:
-        if re.search(pattern, text, re.MULTILINE):
+        if pattern.search(text):
             return True
 
     return False
@@ -80,6 +86,15 @@ multi_char_replacements = {
     "'": " ",
 }
 
+# 单字符的替换合并进 translate 表，只有多字符的 key 需要逐个 replace
+character_table = str.maketrans(
+    {
+        **character_map,
+        **{k: v for k, v in multi_char_replacements.items() if len(k) == 1},
+    }
+)
+multi_char_only = {k: v for k, v in multi_char_replacements.items() if len(k) > 1}
+
 # -----------------------
 
 
@@ -107,46 +122,59 @@ def remove_html_tags(text: str, guess_lang: GuessLang):
     return _remove_html_tags(text)
 
 
+quote_pairs = [
+    ['"', '"'],
+    ["'", "'"],
+    [""", """],
+    ["'", "'"],
+]
+
+
+def compile_quote_pattern(start_quote: str, end_quote: str) -> re.Pattern:
+    start_quote = re.escape(start_quote)
+    end_quote = re.escape(end_quote)
+    return re.compile(f"({start_quote}[^{start_quote}{end_quote}]*?{end_quote})")
+
+
+# 确保模式有两个元素（开始和结束引号）
+quote_patterns = [
+    compile_quote_pattern(p[0], p[1]) for p in quote_pairs if len(p) >= 2
+]
+
+
 # 将 "xxx" => \nxxx\n
 # 将 'xxx' => \nxxx\n
 @BaseTN.block()
 def replace_quotes(text: str, guess_lang: GuessLang):
     repl = r"\n\1\n"
-    patterns = [
-        ['"', '"'],
-        ["'", "'"],
-        [""", """],
-        ["'", "'"],
-    ]
-    for p in patterns:
-        # 确保模式有两个元素（开始和结束引号）
-        if len(p) >= 2:
-            try:
-                # 使用更安全的正则表达式
-                start_quote = re.escape(p[0])
-                end_quote = re.escape(p[1])
-                pattern = f"({start_quote}[^{start_quote}{end_quote}]*?{end_quote})"
-                text = re.sub(pattern, repl, text)
-            except (re.error, IndexError) as e:
-                # 如果正则表达式出错或索引错误，跳过这个模式
-                continue
+    for pattern in quote_patterns:
+        text = pattern.sub(repl, text)
     return text
 
 
 # ---- main normalize ----
 
+# NOTE: 这个是魔改过的 TextNormalizer 来自 PaddlePaddle ，只持有编译好的正则，可以共用
+tx_normalizer = TextNormalizer()
+
+
+@lru_cache(maxsize=1)
+def get_en_normalizer():
+    # NOTE: 加载 fst 很慢，只加载一次
+    from tn.english.normalizer import Normalizer as EnNormalizer
+
+    return EnNormalizer(overwrite_cache=False)
+
 
 @BaseTN.block(name="tx_zh", enabled=True)
 def tx_normalize(text: str, guss_lang: GuessLang):
     if guss_lang.zh_or_en != "zh":
         return text
-    # NOTE: 这个是魔改过的 TextNormalizer 来自 PaddlePaddle
-    tx = TextNormalizer()
     # NOTE: 为什么要分行？因为我们需要保留 "\n" 作为 chunker 的分割信号
     lines = [line for line in text.split("\n") if line.strip() != ""]
     texts: list[str] = []
     for line in lines:
-        ts = tx.normalize(line)
+        ts = tx_normalizer.normalize(line)
         texts.append("".join(ts))
     return "\n".join(texts)
 
@@ -160,10 +188,10 @@ def wetext_normalize(text: str, guss_lang: GuessLang):
     if guss_lang.zh_or_en == "en":
         try:
             from pywrapfst import FstOpError
-            from tn.english.normalizer import Normalizer as EnNormalizer
-
-            en_tn_model = EnNormalizer(overwrite_cache=False)
-            return en_tn_model.normalize(text)
+        except ImportError:
+            return text
+        try:
+            return get_en_normalizer().normalize(text)
         except (ImportError, FstOpError):
             # NOTE: 如果导入失败或 tn 出错，直接返回原文本
             pass
@@ -175,14 +203,9 @@ def wetext_normalize(text: str, guss_lang: GuessLang):
 
 @BaseTN.block()
 def apply_character_map(text: str, guess_lang: GuessLang):
-    # 首先处理单字符替换
-    translation_table = str.maketrans(character_map)
-    text = text.translate(translation_table)
-    
-    # 然后处理多字符替换
-    for old_char, new_char in multi_char_replacements.items():
+    text = text.translate(character_table)
+    for old_char, new_char in multi_char_only.items():
         text = text.replace(old_char, new_char)
-    
     return text
 
 
@@ -191,14 +214,15 @@ def apply_emoji_map(text: str, guess_lang: GuessLang):
     return emojiswitch.demojize(text, delimiters=("", ""), lang=guess_lang.zh_or_en)
 
 
+uppercase_boundary = re.compile(
+    r"(?<=[A-Z])(?=[A-Z])|(?<=[a-z])(?=[A-Z])|(?<=[\u4e00-\u9fa5])(?=[A-Z])|(?<=[A-Z])(?=[\u4e00-\u9fa5])"
+)
+
+
 @BaseTN.block()
 def insert_spaces_between_uppercase(text: str, guess_lang: GuessLang):
     # 使用正则表达式在每个相邻的大写字母之间插入空格
-    return re.sub(
-        r"(?<=[A-Z])(?=[A-Z])|(?<=[a-z])(?=[A-Z])|(?<=[\u4e00-\u9fa5])(?=[A-Z])|(?<=[A-Z])(?=[\u4e00-\u9fa5])",
-        " ",
-        text,
-    )
+    return uppercase_boundary.sub(" ", text)
 
 
 homo_replacer = HomophonesReplacer(
@@ -1,19 +1,30 @@
 import re
+from itertools import islice
+from typing import Iterable, Iterator, Union
 
 import zhon
 
-from modules.utils.detect_lang import guess_lang
+from modules.utils.detect_lang import guess_lang_batch
 
 
 def char_tokenizer(text: str):
     return [ord(char) for char in text]
 
 
+EN_SENTENCE_PATTERN = re.compile(r"(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?|\!)\s")
+ZHON_SENTENCE_PATTERN = re.compile(zhon.hanzi.sentence)
+
+
 # 解析文本 并根据停止符号分割成句子
 # 可以设置最大阈值，即如果分割片段小于这个阈值会与下一段合并
+#
+# NOTE: 整个过程是流式的，每个句子只 tokenize 一次，合并时累加长度，
+#       iter_parse 可以边读边输出，适合整本书这样很长的输入
 class SentenceSplitter:
     # 分隔符 用于连接句子 sentence1 + SEP_TOKEN + sentence2
     SEP_TOKEN = " "
+    # 每次批量识别语言的行数
+    LANG_BATCH_LINES = 256
 
     def __init__(self, threshold=100, tokenizer=char_tokenizer):
         assert (
@@ -30,10 +41,15 @@ class SentenceSplitter:
         return len(self.tokenizer(text))
 
     def parse(self, text: str):
-        sentences = self.split_paragraph(text)
-        sentences = self.merge_text_by_threshold(sentences)
+        return list(self.iter_parse(text))
 
-        return sentences
+    def iter_parse(self, text: Union[str, Iterable[str]]) -> Iterator[str]:
+        """
+        Same as parse, but yields merged sentences as soon as they are complete.
+
+        `text` can also be an iterable of text chunks (e.g. a file object).
+        """
+        return self.iter_merged(self.iter_sentences(text))
 
     def merge_text_by_threshold(self, setences: list[str]):
         """
@@ -41,41 +57,68 @@ class SentenceSplitter:
 
         If the length of the text is less than the threshold, merge it with the next text.
         """
-        merged_sentences: list[str] = []
-        temp_sentence = ""
-        for sentence in setences:
-            if self.len(temp_sentence) + self.len(sentence) < self.sentence_threshold:
-                temp_sentence += SentenceSplitter.SEP_TOKEN + sentence
+        return list(self.iter_merged(setences))
+
+    def iter_merged(self, sentences: Iterable[str]) -> Iterator[str]:
+        # NOTE: 合并后的长度用每个句子的长度累加得到，不再重复 tokenize 合并后的句子
+        #       char / regexp tokenizer 的 token 都不会跨过 SEP_TOKEN ，
+        #       所以结果和逐次 tokenize 一致
+        sep_len = self.len(SentenceSplitter.SEP_TOKEN)
+        temp_parts: list[str] = []
+        temp_len = 0
+        for sentence in sentences:
+            sentence_len = self.len(sentence)
+            if temp_len + sentence_len < self.sentence_threshold:
+                temp_parts += [SentenceSplitter.SEP_TOKEN, sentence]
+                temp_len += sep_len + sentence_len
             else:
-                merged_sentences.append(temp_sentence)
-                temp_sentence = sentence
+                yield "".join(temp_parts)
+                temp_parts = [sentence]
+                temp_len = sentence_len
 
+        temp_sentence = "".join(temp_parts)
         if temp_sentence:
-            merged_sentences.append(temp_sentence)
-        return merged_sentences
+            yield temp_sentence
 
     def split_paragraph(self, text: str):
         """
         Split text into sentences.
         """
-        lines = text.split("\n")
-        sentences: list[str] = []
-        for line in lines:
-            if self.is_eng_sentence(line):
-                sentences.extend(self.split_en_sentence(line))
-            else:
-                sentences.extend(self.split_zhon_sentence(line))
-        return sentences
+        return list(self.iter_sentences(text))
+
+    def iter_lines(self, text: Union[str, Iterable[str]]) -> Iterator[str]:
+        if isinstance(text, str):
+            yield from text.split("\n")
+            return
+        buffer = ""
+        for chunk in text:
+            buffer += chunk
+            if "\n" not in chunk:
+                continue
+            *lines, buffer = buffer.split("\n")
+            yield from lines
+        yield buffer
+
+    def iter_sentences(self, text: Union[str, Iterable[str]]) -> Iterator[str]:
+        lines = self.iter_lines(text)
+        while True:
+            batch = list(islice(lines, SentenceSplitter.LANG_BATCH_LINES))
+            if len(batch) == 0:
+                return
+            for line, lang in zip(batch, guess_lang_batch(batch)):
+                if lang == "en":
+                    yield from self.split_en_sentence(line)
+                else:
+                    yield from self.split_zhon_sentence(line)
 
     def is_eng_sentence(self, text: str):
-        return guess_lang(text) == "en"
+        return guess_lang_batch([text])[0] == "en"
 
     def split_en_sentence(self, text: str):
         """
         Split English text into sentences.
         """
-        pattern = re.compile(r"(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?|\!)\s")
-        sentences = pattern.split(text)
+        sentences = EN_SENTENCE_PATTERN.split(text)
 
         sentences = [sentence.strip() for sentence in sentences if sentence.strip()]
 
@@ -86,9 +129,8 @@ class SentenceSplitter:
         Split Chinese text into sentences.
         """
         sentences: list[str] = []
-        pattern = re.compile(zhon.hanzi.sentence)
         start = 0
-        for match in pattern.finditer(text):
+        for match in ZHON_SENTENCE_PATTERN.finditer(text):
             end = match.end()
             sentences.append(text[start:end])
             start = end
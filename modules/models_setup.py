@@ -56,6 +56,110 @@ def setup_model_args(parser: argparse.ArgumentParser):
         action="store_true",
         help="Preload all models at startup",
     )
+    parser.add_argument(
+        "--no_infer_scheduler",
+        action="store_true",
+        help="Disable the cross-request batching scheduler, each request will run its own batches",
+    )
+    parser.add_argument(
+        "--infer_cache_mb",
+        type=int,
+        default=256,
+        help="Memory budget (MB) of the infer cache for each model",
+    )
+    parser.add_argument(
+        "--infer_cache_total_mb",
+        type=int,
+        default=1024,
+        help="Memory budget (MB) of the infer cache shared by all models",
+    )
+    parser.add_argument(
+        "--infer_cache_admit_mb",
+        type=float,
+        default=4,
+        help="Results larger than this (MB) are only cached after being generated twice",
+    )
+    parser.add_argument(
+        "--infer_cache_dir",
+        type=str,
+        default=None,
+        help="Enable the on-disk infer cache tier in this directory, can be shared between workers",
+    )
+    parser.add_argument(
+        "--infer_cache_disk_mb",
+        type=int,
+        default=1024,
+        help="Size budget (MB) of the on-disk infer cache",
+    )
+    parser.add_argument(
+        "--infer_cache_disk_dtype",
+        type=str,
+        default="float32",
+        choices=["float32", "int16"],
+        help="Sample format of the on-disk infer cache, int16 halves the disk usage",
+    )
+    parser.add_argument(
+        "--infer_cache_disk_policy",
+        type=str,
+        default="lru",
+        choices=["lru", "lfu"],
+        help="Eviction policy of the on-disk infer cache",
+    )
+    parser.add_argument(
+        "--spk_cond_cache_dir",
+        type=str,
+        default=None,
+        help="Persist precomputed speaker conditioning (embeddings, prompt tokens) in this directory",
+    )
+    parser.add_argument(
+        "--prosody_backend",
+        type=str,
+        default="native",
+        choices=["native", "rubberband"],
+        help="Time-stretch / pitch-shift backend, rubberband requires the rubberband CLI",
+    )
+    parser.add_argument(
+        "--encoder_pool_size",
+        type=int,
+        default=1,
+        help="Number of pre-started ffmpeg encoder processes kept per output format, 0 to disable",
+    )
+    parser.add_argument(
+        "--tn_workers",
+        type=int,
+        default=None,
+        help="Number of threads running text normalization ahead of synthesis, 0 to run it inline (default: min(4, cpu_count))",
+    )
+    parser.add_argument(
+        "--tn_cache_size",
+        type=int,
+        default=10000,
+        help="Max number of text normalization results cached across requests, 0 to disable",
+    )
+    parser.add_argument(
+        "--lang_detect_threshold",
+        type=float,
+        default=0.5,
+        help="Fall back to langdetect when the script-based language confidence is below this value, 0 to never fall back",
+    )
+    parser.add_argument(
+        "--stt_batch_size",
+        type=int,
+        default=8,
+        help="Number of audio chunks transcribed together in one batch, 1 to transcribe them one by one",
+    )
+    parser.add_argument(
+        "--whisper_workers",
+        type=int,
+        default=None,
+        help="Number of Whisper model replicas sharing one copy of weights, each serving one transcription at a time (default: 1 on GPU, min(4, cpu_count // 4) on CPU)",
+    )
+    parser.add_argument(
+        "--stt_vad_cache_size",
+        type=int,
+        default=256,
+        help="Number of audios whose VAD speech regions are cached, 0 to disable",
+    )
     parser.add_argument(
         "--ftc",
         action="store_true",
@@ -75,6 +179,23 @@ def process_model_args(args: argparse.Namespace):
     debug_generate = env.get_and_update_env(args, "debug_generate", False, bool)
     preload_models = env.get_and_update_env(args, "preload_models", False, bool)
     enable_ftc = env.get_and_update_env(args, "ftc", False, bool)
+    env.get_and_update_env(args, "no_infer_scheduler", False, bool)
+    env.get_and_update_env(args, "infer_cache_mb", 256, int)
+    env.get_and_update_env(args, "infer_cache_total_mb", 1024, int)
+    env.get_and_update_env(args, "infer_cache_admit_mb", 4, float)
+    env.get_and_update_env(args, "infer_cache_dir", None, str)
+    env.get_and_update_env(args, "infer_cache_disk_mb", 1024, int)
+    env.get_and_update_env(args, "infer_cache_disk_dtype", "float32", str)
+    env.get_and_update_env(args, "infer_cache_disk_policy", "lru", str)
+    env.get_and_update_env(args, "spk_cond_cache_dir", None, str)
+    env.get_and_update_env(args, "encoder_pool_size", 1, int)
+    env.get_and_update_env(args, "prosody_backend", "native", str)
+    env.get_and_update_env(args, "tn_workers", None, int)
+    env.get_and_update_env(args, "tn_cache_size", 10000, int)
+    env.get_and_update_env(args, "lang_detect_threshold", 0.5, float)
+    env.get_and_update_env(args, "stt_batch_size", 8, int)
+    env.get_and_update_env(args, "whisper_workers", None, int)
+    env.get_and_update_env(args, "stt_vad_cache_size", 256, int)
 
     # TODO: 需要等 zoo 模块实现
     # generate_audio.setup_lru_cache()
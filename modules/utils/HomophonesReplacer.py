@@ -23,6 +23,8 @@ class HomophonesReplacer:
 
     def __init__(self, map_file_path):
         self.homophones_map = self.load_homophones_map(map_file_path)
+        # NOTE: key 都是单个字符，可以直接用 str.translate
+        self.table = str.maketrans(self.homophones_map)
 
     def load_homophones_map(self, map_file_path):
         with open(map_file_path, "r", encoding="utf-8") as f:
@@ -30,10 +32,4 @@ class HomophonesReplacer:
         return homophones_map
 
     def replace(self, text):
-        result = []
-        for char in text:
-            if char in self.homophones_map:
-                result.append(self.homophones_map[char])
-            else:
-                result.append(char)
-        return "".join(result)
+        return text.translate(self.table)
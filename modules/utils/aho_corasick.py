@@ -0,0 +1,71 @@
+from collections import deque
+from functools import lru_cache
+
+
+class AhoCorasick:
+    """
+    多模式串匹配自动机，一次扫描找出所有模式串，耗时和模式串数量无关
+
+    - step(state, char) 返回读入 char 之后的状态，0 为初始状态
+    - first_match(state) 返回在当前位置结束的模式串中，下标最小的那个 (没有则为 -1)
+    """
+
+    def __init__(self, patterns: list[str]):
+        self.patterns = list(patterns)
+
+        self.goto: list[dict[str, int]] = [{}]
+        self.fail: list[int] = [0]
+        self.match: list[int] = [-1]
+
+        for index, pattern in enumerate(self.patterns):
+            # NOTE: 空串在任何位置都能匹配，没有意义，忽略
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.match.append(-1)
+                state = next_state
+            if self.match[state] == -1:
+                self.match[state] = index
+
+        self.build_fail()
+
+    def build_fail(self) -> None:
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fail = self.fail[state]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[next_state] = self.goto[fail].get(char, 0)
+
+                # 后缀上结束的模式串也在这里结束，取下标最小的
+                inherited = self.match[self.fail[next_state]]
+                own = self.match[next_state]
+                if own == -1 or (inherited != -1 and inherited < own):
+                    self.match[next_state] = inherited
+
+    def step(self, state: int, char: str) -> int:
+        while True:
+            next_state = self.goto[state].get(char)
+            if next_state is not None:
+                return next_state
+            if state == 0:
+                return 0
+            state = self.fail[state]
+
+    def first_match(self, state: int) -> int:
+        return self.match[state]
+
+
+@lru_cache(maxsize=64)
+def get_automaton(patterns: tuple[str, ...]) -> AhoCorasick:
+    return AhoCorasick(list(patterns))
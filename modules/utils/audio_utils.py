@@ -1,14 +1,15 @@
 import io
 import sys
-from io import BytesIO
 
 import librosa
 import numpy as np
 import numpy.typing as npt
-import pyrubberband as pyrb
 import scipy.io.wavfile as wavfile
 import soundfile as sf
-from pydub import AudioSegment, effects
+from pydub import AudioSegment
+
+from modules import config
+from modules.utils import time_stretch
 import base64
 
 INT16_MAX = np.iinfo(np.int16).max
@@ -66,7 +67,11 @@ def pydub_to_np(audio: AudioSegment) -> tuple[int, np.ndarray]:
     where each value is in range [-1.0, 1.0].
     Returns tuple (audio_np_array, sample_rate).
     """
-    nd_array = np.array(audio.get_array_of_samples(), dtype=np.float32)
+    dtype = {1: np.int8, 2: np.int16, 4: np.int32}.get(audio.sample_width)
+    if dtype is not None:
+        nd_array = np.frombuffer(audio.raw_data, dtype=dtype).astype(np.float32)
+    else:
+        nd_array = np.array(audio.get_array_of_samples(), dtype=np.float32)
     if audio.channels != 1:
         nd_array = nd_array.reshape((-1, audio.channels))
     nd_array = nd_array / (1 << (8 * audio.sample_width - 1))
@@ -92,13 +97,29 @@ def audiosegment_to_librosawav(audiosegment: AudioSegment) -> np.ndarray:
     return fp_arr
 
 
+def float_to_int16(audio_data: np.ndarray) -> np.ndarray:
+    """
+    float [-1, 1] -> int16 ，和 soundfile 写 PCM_16 的量化方式一致 (x * 32767 四舍五入)，超出范围的部分截断
+    """
+    if audio_data.dtype == np.int16:
+        return audio_data
+    pcm = np.multiply(audio_data, INT16_MAX, dtype=np.float32)
+    np.rint(pcm, out=pcm)
+    np.clip(pcm, -INT16_MAX - 1, INT16_MAX, out=pcm)
+    return pcm.astype(np.int16)
+
+
 def ndarray_to_segment(
     ndarray: np.ndarray, frame_rate: int, sample_width: int = None, channels: int = None
 ) -> AudioSegment:
-    buffer = BytesIO()
-    sf.write(buffer, ndarray, frame_rate, format="wav", subtype="PCM_16")
-    buffer.seek(0)
-    sound: AudioSegment = AudioSegment.from_wav(buffer)
+    # NOTE: 直接用 pcm 构造 AudioSegment ，不经过 wav 编码/解码
+    pcm = float_to_int16(ndarray)
+    sound = AudioSegment(
+        data=np.ascontiguousarray(pcm).tobytes(),
+        sample_width=2,
+        frame_rate=frame_rate,
+        channels=1 if pcm.ndim == 1 else pcm.shape[1],
+    )
 
     if sample_width is None:
         sample_width = sound.sample_width
@@ -144,33 +165,153 @@ def apply_prosody_to_audio_data(
         audio_data = audio_data.astype(np.float32)
 
     if rate != 1:
-        audio_data = pyrb.time_stretch(audio_data, sr=sr, rate=rate)
+        audio_data = apply_time_stretch_batch([audio_data], [rate], sr=sr)[0]
 
     if volume != 0:
-        volume = max(min(volume, 6), -20)
-        gain = 10 ** (volume / 20)
-        audio_data = audio_data * gain
+        audio_data = apply_gain_np(audio_data, gain_db=clamp_volume_db(volume))
 
     if pitch != 0:
-        audio_data = pyrb.pitch_shift(audio_data, sr=sr, n_steps=pitch)
+        audio_data = apply_pitch_shift(audio_data, sr=sr, n_steps=pitch)
 
     return audio_data
 
 
+def get_prosody_backend() -> str:
+    """
+    变速变调的实现: native (进程内 WSOLA) 或 rubberband (pyrubberband ，需要 rubberband 命令行)
+    """
+    return config.runtime_env_vars.prosody_backend or "native"
+
+
+def apply_time_stretch_batch(
+    audios: list[np.ndarray], rates: list[float], sr: int
+) -> list[np.ndarray]:
+    if get_prosody_backend() == "rubberband":
+        import pyrubberband as pyrb
+
+        return [
+            audio if rate == 1 else pyrb.time_stretch(audio, sr=sr, rate=rate)
+            for audio, rate in zip(audios, rates)
+        ]
+    return time_stretch.time_stretch_batch(audios, rates, sr=sr)
+
+
+def apply_pitch_shift(audio_data: np.ndarray, sr: int, n_steps: float) -> np.ndarray:
+    if get_prosody_backend() == "rubberband":
+        import pyrubberband as pyrb
+
+        return pyrb.pitch_shift(audio_data, sr=sr, n_steps=n_steps)
+    return time_stretch.pitch_shift(audio_data, sr=sr, n_steps=n_steps)
+
+
+def to_float32(audio_data: np.ndarray) -> np.ndarray:
+    """
+    转为 float32 ，已经是 float32 时不复制
+    """
+    if audio_data.dtype == np.int16:
+        return audio_data.astype(np.float32) / 32768.0
+    return audio_data.astype(np.float32, copy=False)
+
+
+def clamp_volume_db(volume: float) -> float:
+    """
+    volume_gain_db 的有效范围
+    """
+    return max(min(volume, 6), -20)
+
+
+def apply_gain_np(
+    audio_data: np.ndarray, gain_db: float, out: np.ndarray = None
+) -> np.ndarray:
+    """
+    音量增益 (dB)
+
+    :param out: 输出数组，可以传入 audio_data 本身原地修改，默认分配新的 float32 数组
+    """
+    audio_data = to_float32(audio_data)
+    if out is None:
+        out = np.empty_like(audio_data)
+    return np.multiply(audio_data, np.float32(10 ** (gain_db / 20)), out=out)
+
+
+def normalize_np(
+    audio_data: np.ndarray,
+    headroom: float = 1,
+    gain_db: float = 0,
+    out: np.ndarray = None,
+) -> np.ndarray:
+    """
+    峰值归一化，峰值调整到 -headroom dBFS ，等价于 pydub.effects.normalize
+
+    :param gain_db: 归一化之后再叠加的增益，和归一化合并成一次乘法
+    :param out: 同 apply_gain_np
+    """
+    audio_data = to_float32(audio_data)
+    if out is None:
+        out = np.empty_like(audio_data)
+    peak = np.abs(audio_data).max() if audio_data.size else 0
+    gain = 10 ** (gain_db / 20)
+    if peak == 0:
+        np.copyto(out, audio_data)
+        return out
+    target_peak = 10 ** (-headroom / 20)
+    if target_peak > 1:
+        # NOTE: headroom 为负数时会超过满幅，和 pydub 一样先截断再叠加增益
+        np.multiply(audio_data, np.float32(target_peak / peak), out=out)
+        np.clip(out, -1, 1, out=out)
+        if gain_db != 0:
+            np.multiply(out, np.float32(gain), out=out)
+        return out
+    np.multiply(audio_data, np.float32(target_peak / peak * gain), out=out)
+    return out
+
+
+def to_mono_np(audio_data: np.ndarray) -> np.ndarray:
+    """
+    [samples, channels] -> [samples] ，各声道取平均
+    """
+    if audio_data.ndim == 1:
+        return audio_data
+    return audio_data.mean(axis=1, dtype=np.float32)
+
+
+def to_stereo_np(audio_data: np.ndarray) -> np.ndarray:
+    """
+    [samples] -> [samples, 2]
+    """
+    if audio_data.ndim == 2 and audio_data.shape[1] == 2:
+        return audio_data
+    mono = to_mono_np(audio_data)
+    return np.repeat(mono[:, None], 2, axis=1)
+
+
+def set_channels_np(audio_data: np.ndarray, channels: int) -> np.ndarray:
+    if channels == 1:
+        return to_mono_np(audio_data)
+    if channels == 2:
+        return to_stereo_np(audio_data)
+    raise ValueError(f"Unsupported channels: {channels}")
+
+
 def apply_normalize(
     audio_data: np.ndarray,
     headroom: float = 1,
     sr: int = 24000,
-):
-    segment = ndarray_to_segment(audio_data, sr)
-    segment = effects.normalize(seg=segment, headroom=headroom)
+    gain_db: float = 0,
+) -> tuple[int, np.ndarray]:
+    return sr, normalize_np(audio_data, headroom=headroom, gain_db=gain_db)
 
-    return pydub_to_np(segment)
 
-
-def silence_np(duration_s: float, sample_rate: int = 24000) -> tuple[int, np.ndarray]:
-    silence = AudioSegment.silent(duration=duration_s * 1000, frame_rate=sample_rate)
-    return pydub_to_np(silence)
+def silence_np(
+    duration_s: float, sample_rate: int = 24000, out: np.ndarray = None
+) -> tuple[int, np.ndarray]:
+    """
+    :param out: 预分配的数组，传入时直接填 0 ，长度以 out 为准
+    """
+    if out is None:
+        return sample_rate, np.zeros(int(sample_rate * duration_s), dtype=np.float32)
+    out.fill(0)
+    return sample_rate, out
 
 
 def remove_silence_edges(
@@ -1,5 +1,10 @@
+import threading
 from functools import lru_cache
-from typing import Literal
+from typing import Literal, Union
+
+import numpy as np
+from cachetools import LRUCache
+from langdetect import DetectorFactory, LangDetectException, detect_langs
 
 
 @lru_cache(maxsize=64)
@@ -25,3 +30,150 @@ def guess_lang(text) -> Literal["zh", "en"]:
     if is_eng(text):
         return "en"
     return "zh"
+
+
+# ---------------------------------------------------------------------------
+# 基于文字 (script) 统计的语言识别
+#
+# NOTE: langdetect 又慢又不确定 (同一段文本多次调用结果可能不同)，
+#       这里按 unicode 区间统计每种文字的字符数，用 numpy 对一批文本一次性统计，
+#       只有在置信度低 (多种文字混合) 时才回退到 langdetect
+# ---------------------------------------------------------------------------
+
+SCRIPTS = ["other", "han", "latin", "latin_ext", "kana", "hangul", "cyrillic"]
+SCRIPT_LANGS = {
+    "han": "zh",
+    "latin": "en",
+    "latin_ext": "en",
+    "kana": "ja",
+    "hangul": "ko",
+    "cyrillic": "ru",
+}
+SCRIPT_RANGES = [
+    # NOTE: han / latin 的区间和 is_chinese / is_eng 保持一致
+    (0x41, 0x5A, "latin"),
+    (0x61, 0x7A, "latin"),
+    (0xC0, 0x24F, "latin_ext"),
+    (0x400, 0x4FF, "cyrillic"),
+    (0x1100, 0x11FF, "hangul"),
+    (0x3040, 0x30FF, "kana"),
+    (0x4E00, 0x9FFF, "han"),
+    (0xAC00, 0xD7AF, "hangul"),
+]
+
+
+def build_script_table():
+    # 区间 [edges[i], edges[i + 1]) 内的字符属于 labels[i]
+    edges = [0]
+    labels = [0]
+    for start, end, script in sorted(SCRIPT_RANGES):
+        edges += [start, end + 1]
+        labels += [SCRIPTS.index(script), 0]
+    return np.array(edges, dtype=np.uint32), np.array(labels, dtype=np.int64)
+
+
+SCRIPT_EDGES, SCRIPT_LABELS = build_script_table()
+
+# 置信度低于这个值时回退到 langdetect
+FALLBACK_CONFIDENCE = 0.5
+
+DetectorFactory.seed = 0
+
+lang_cache = LRUCache(maxsize=4096)
+lang_cache_lock = threading.Lock()
+
+
+def count_scripts(texts: list[str]) -> np.ndarray:
+    """
+    统计每个文本中各种文字的字符数，返回 shape 为 (len(texts), len(SCRIPTS)) 的数组
+    """
+    if len(texts) == 0:
+        return np.zeros((0, len(SCRIPTS)), dtype=np.int64)
+    joined = "".join(texts).encode("utf-32-le", errors="surrogatepass")
+    code_points = np.frombuffer(joined, dtype=np.uint32)
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    owners = np.repeat(np.arange(len(texts)), lengths)
+    scripts = SCRIPT_LABELS[np.searchsorted(SCRIPT_EDGES, code_points, "right") - 1]
+    counts = np.bincount(
+        owners * len(SCRIPTS) + scripts, minlength=len(texts) * len(SCRIPTS)
+    )
+    return counts.reshape(len(texts), len(SCRIPTS))
+
+
+def zh_or_en_from_counts(counts: np.ndarray) -> Literal["zh", "en"]:
+    # 和 guess_lang 的规则一致：有中文就是 zh ，否则有英文字母就是 en ，都没有默认 zh
+    if counts[SCRIPTS.index("han")] > 0:
+        return "zh"
+    if counts[SCRIPTS.index("latin")] > 0:
+        return "en"
+    return "zh"
+
+
+def guess_lang_batch(texts: list[str]) -> list[Literal["zh", "en"]]:
+    return [zh_or_en_from_counts(counts) for counts in count_scripts(texts)]
+
+
+def langs_from_counts(counts: np.ndarray) -> tuple[dict[str, float], float]:
+    """
+    根据文字统计计算各语言的占比和置信度 (占比最高的语言的占比)
+    """
+    langs: dict[str, float] = {}
+    for script, lang in SCRIPT_LANGS.items():
+        langs[lang] = langs.get(lang, 0) + int(counts[SCRIPTS.index(script)])
+    if langs["ja"] > 0:
+        # 有假名时，汉字也算作日文
+        langs["ja"] += langs.pop("zh")
+    total = sum(langs.values())
+    if total == 0:
+        return {}, 0.0
+
+    detected = {lang: count / total for lang, count in langs.items() if count > 0}
+    confidence = max(detected.values())
+    if max(detected, key=detected.get) == "en":
+        # 带变音符号的拉丁字母可能是法语、德语等，降低置信度
+        latin = counts[SCRIPTS.index("latin")] + counts[SCRIPTS.index("latin_ext")]
+        confidence *= counts[SCRIPTS.index("latin")] / latin
+    return detected, float(confidence)
+
+
+def langdetect_langs(text: str) -> Union[dict[str, float], None]:
+    try:
+        return {lang.lang: lang.prob for lang in detect_langs(text)}
+    except LangDetectException:
+        return None
+
+
+def identify_langs(
+    texts: list[str], threshold: float = FALLBACK_CONFIDENCE
+) -> list[tuple[Literal["zh", "en"], dict[str, float]]]:
+    """
+    批量识别语言，返回每个文本的 (zh_or_en, {lang: prob})
+
+    结果按 (text, threshold) 缓存，置信度低于 threshold 时用 langdetect 的结果作为 detected
+    """
+    results = [None] * len(texts)
+    with lang_cache_lock:
+        for i, text in enumerate(texts):
+            results[i] = lang_cache.get((text, threshold))
+    missing = [i for i, result in enumerate(results) if result is None]
+    if len(missing) == 0:
+        return results
+
+    counts = count_scripts([texts[i] for i in missing])
+    for i, text_counts in zip(missing, counts):
+        zh_or_en = zh_or_en_from_counts(text_counts)
+        detected, confidence = langs_from_counts(text_counts)
+        if detected and confidence < threshold:
+            detected = langdetect_langs(texts[i]) or detected
+        if not detected:
+            # 没有任何文字 (比如只有数字和标点)
+            detected = {
+                "zh": 1.0 if zh_or_en == "zh" else 0.0,
+                "en": 1.0 if zh_or_en == "en" else 0.0,
+            }
+        results[i] = (zh_or_en, detected)
+
+    with lang_cache_lock:
+        for i in missing:
+            lang_cache[(texts[i], threshold)] = results[i]
+    return results
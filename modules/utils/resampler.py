@@ -0,0 +1,164 @@
+import math
+from functools import lru_cache
+
+import numpy as np
+from scipy.signal import firwin, resample_poly
+
+"""
+多相 (polyphase) 重采样
+
+src -> dst 约分为 up / down 之后，先插零上采样 up 倍，低通滤波，再每 down 个取一个
+滤波器只和 (src, dst, quality) 有关，按 key 缓存，避免每次调用都重新设计滤波器
+
+- PolyphaseResampler.resample: 整段重采样，结果和 scipy.signal.resample_poly 相同
+- StreamResampler: 流式重采样，保留滤波器需要的历史输入，分块输入和整段输入的结果一致，
+  chunk 边界不会有伪影
+"""
+
+# quality -> (每侧过零点数量, kaiser beta)
+QUALITY_PRESETS = {
+    "fast": (4, 5.0),
+    "default": (10, 5.0),
+    "high": (24, 8.6),
+}
+
+
+class PolyphaseResampler:
+    def __init__(self, src_sr: int, dst_sr: int, quality: str = "default") -> None:
+        if quality not in QUALITY_PRESETS:
+            raise ValueError(f"Unsupported resample quality: {quality}")
+        self.src_sr = src_sr
+        self.dst_sr = dst_sr
+        self.quality = quality
+
+        g = math.gcd(src_sr, dst_sr)
+        self.up = dst_sr // g
+        self.down = src_sr // g
+
+        if self.up == self.down:
+            # 采样率相同，不需要滤波
+            self.half_len = 0
+            self.filter = np.ones(1, dtype=np.float32)
+        else:
+            zero_crossings, beta = QUALITY_PRESETS[quality]
+            max_rate = max(self.up, self.down)
+            self.half_len = zero_crossings * max_rate
+            self.filter = firwin(
+                2 * self.half_len + 1, 1.0 / max_rate, window=("kaiser", beta)
+            ).astype(np.float32)
+
+        # phases[p, j] = h[p + j * up] * up ，第 m 个输出只用到其中一个相位的 taps 个系数
+        self.taps = math.ceil(self.filter.size / self.up)
+        padded = np.zeros(self.taps * self.up, dtype=np.float32)
+        padded[: self.filter.size] = self.filter * self.up
+        self.phases = np.ascontiguousarray(padded.reshape(self.taps, self.up).T)
+
+    def output_size(self, input_size: int) -> int:
+        return -(-input_size * self.up // self.down)
+
+    def resample(self, data: np.ndarray) -> np.ndarray:
+        """
+        沿第 0 维 (时间) 重采样
+        """
+        if self.up == self.down:
+            return data
+        return resample_poly(data, self.up, self.down, axis=0, window=self.filter)
+
+    def compute(
+        self, buf: np.ndarray, offset: int, start: int, stop: int
+    ) -> np.ndarray:
+        """
+        计算第 [start, stop) 个输出
+
+        buf[0] 对应第 offset 个输入，buf 需要包含这些输出用到的所有输入
+        """
+        pos = np.arange(start, stop, dtype=np.int64) * self.down + self.half_len
+        index = (pos // self.up)[:, None] - np.arange(self.taps) - offset
+        return np.einsum("mt,mt->m", buf[index], self.phases[pos % self.up])
+
+    def first_input(self, output_index: int) -> int:
+        """
+        第 output_index 个输出用到的最小输入下标
+        """
+        return (output_index * self.down + self.half_len) // self.up - self.taps + 1
+
+    def last_input(self, output_index: int) -> int:
+        """
+        第 output_index 个输出用到的最大输入下标
+        """
+        return (output_index * self.down + self.half_len) // self.up
+
+    def create_stream(self) -> "StreamResampler":
+        return StreamResampler(self)
+
+
+class StreamResampler:
+    """
+    流式重采样，push 返回已经可以确定的输出，flush 返回剩余部分
+
+    输入开始之前和结束之后都视为 0 ，和整段重采样的边界处理相同
+    """
+
+    # 每次最多计算的输出数量，限制 [输出, taps] 中间矩阵的内存
+    block_size = 8192
+
+    def __init__(self, resampler: PolyphaseResampler) -> None:
+        self.resampler = resampler
+        # 开头补 taps 个 0 ，作为第一个输入之前的历史
+        self.buf = np.zeros(resampler.taps, dtype=np.float32)
+        self.offset = -resampler.taps
+        self.input_size = 0
+        self.output_index = 0
+
+    def run(self, stop: int) -> np.ndarray:
+        outputs = []
+        for start in range(self.output_index, stop, self.block_size):
+            end = min(stop, start + self.block_size)
+            outputs.append(self.resampler.compute(self.buf, self.offset, start, end))
+        self.output_index = max(self.output_index, stop)
+
+        # 丢掉之后的输出不会再用到的输入
+        drop = self.resampler.first_input(self.output_index) - self.offset
+        if drop > 0:
+            self.buf = self.buf[drop:]
+            self.offset += drop
+        return np.concatenate(outputs) if outputs else np.empty(0, np.float32)
+
+    def push(self, data: np.ndarray) -> np.ndarray:
+        data = np.asarray(data, dtype=np.float32)
+        if self.resampler.up == self.resampler.down:
+            return data
+        self.buf = np.concatenate([self.buf, data])
+        self.input_size += data.size
+
+        # 最大输入下标不超过 input_size - 1 的输出都可以计算
+        up, down = self.resampler.up, self.resampler.down
+        stop = (self.input_size * up - 1 - self.resampler.half_len) // down + 1
+        return self.run(stop)
+
+    def flush(self) -> np.ndarray:
+        if self.resampler.up == self.resampler.down:
+            return np.empty(0, np.float32)
+        stop = self.resampler.output_size(self.input_size)
+        if stop <= self.output_index:
+            return np.empty(0, np.float32)
+        end = self.resampler.last_input(stop - 1) + 1
+        padding = end - (self.offset + self.buf.size)
+        if padding > 0:
+            self.buf = np.concatenate([self.buf, np.zeros(padding, np.float32)])
+        return self.run(stop)
+
+
+@lru_cache(maxsize=64)
+def get_resampler(
+    src_sr: int, dst_sr: int, quality: str = "default"
+) -> PolyphaseResampler:
+    return PolyphaseResampler(src_sr=src_sr, dst_sr=dst_sr, quality=quality)
+
+
+def resample(
+    data: np.ndarray, src_sr: int, dst_sr: int, quality: str = "default"
+) -> np.ndarray:
+    if src_sr == dst_sr:
+        return data
+    return get_resampler(src_sr, dst_sr, quality).resample(data)
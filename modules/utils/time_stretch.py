@@ -0,0 +1,230 @@
+import math
+
+import librosa
+import numpy as np
+
+"""
+WSOLA (Waveform Similarity Overlap-Add) 变速 / 变调
+
+- 变速: 按 rate 间隔从输入取帧，每一帧在 ±tol 范围内找和上一帧 "自然延续" 最相似的位置，
+  再以固定的 hop overlap-add 输出，保持音高不变
+- 变调: 先变速到 1/factor 再重采样回原长度
+
+time_stretch_batch 一次处理多个 segment ，逐帧循环，但每一帧对所有 segment 向量化计算，
+循环次数只取决于最长的 segment ，适合字幕配音这类大量短 segment 的场景
+WsolaStream 是同样算法的流式版本
+"""
+
+
+def get_frame_params(sr: int) -> tuple[int, int, int]:
+    """
+    :return: (帧长, 输出 hop, 搜索范围)，帧长 30ms
+    """
+    frame = max(32, int(sr * 0.03) // 2 * 2)
+    return frame, frame // 2, frame // 4
+
+
+def hann_window(frame: int) -> np.ndarray:
+    # NOTE: periodic hann ，hop 为帧长一半时叠加和恒为 1
+    n = np.arange(frame, dtype=np.float32)
+    return (0.5 - 0.5 * np.cos(2 * np.pi * n / frame)).astype(np.float32)
+
+
+def best_offsets(region: np.ndarray, target: np.ndarray, tol: int) -> np.ndarray:
+    """
+    region: [batch, frame + 2 * tol] ，target: [batch, frame]
+    返回 region 中和 target 互相关最大的偏移 [0, 2 * tol]
+    """
+    nfft = 1 << math.ceil(math.log2(region.shape[1] + target.shape[1]))
+    spec = np.fft.rfft(region, nfft) * np.conj(np.fft.rfft(target, nfft))
+    corr = np.fft.irfft(spec, nfft)[:, : 2 * tol + 1]
+    return np.argmax(corr, axis=1)
+
+
+def gather(data: np.ndarray, rows: np.ndarray, starts: np.ndarray, size: int):
+    return data[rows[:, None], starts[:, None] + np.arange(size)]
+
+
+def time_stretch_batch(
+    audios: list[np.ndarray], rates: list[float], sr: int, group_size: int = 64
+) -> list[np.ndarray]:
+    """
+    批量变速，rate > 1 加速，输出长度为 round(len / rate)
+    """
+    results: list[np.ndarray] = [None] * len(audios)
+    todo = []
+    for index, (audio, rate) in enumerate(zip(audios, rates)):
+        audio = np.asarray(audio, dtype=np.float32)
+        results[index] = audio
+        if rate != 1 and audio.size > 0:
+            todo.append(index)
+
+    # NOTE: 按长度分组，避免一个很长的 segment 让整组 padding 到同样长度
+    todo.sort(key=lambda index: results[index].size)
+    for i in range(0, len(todo), group_size):
+        group = todo[i : i + group_size]
+        outputs = _stretch_group(
+            audios=[results[index] for index in group],
+            rates=[rates[index] for index in group],
+            sr=sr,
+        )
+        for index, output in zip(group, outputs):
+            results[index] = output
+    return results
+
+
+def _stretch_group(
+    audios: list[np.ndarray], rates: list[float], sr: int
+) -> list[np.ndarray]:
+    frame, hop, tol = get_frame_params(sr)
+    window = hann_window(frame)
+
+    lengths = np.array([audio.size for audio in audios])
+    analysis_hops = hop * np.array(rates, dtype=np.float64)
+    out_lengths = np.round(lengths / np.array(rates)).astype(np.int64)
+    n_frames = out_lengths // hop + 2
+
+    pad_left = int(math.ceil(analysis_hops.max())) + tol
+    input_span = int(np.max(np.ceil(n_frames * analysis_hops)))
+    width = pad_left + max(lengths.max(), input_span) + frame + hop + 2 * tol + 2
+    padded = np.zeros((len(audios), width), dtype=np.float32)
+    for row, audio in enumerate(audios):
+        padded[row, pad_left : pad_left + audio.size] = audio
+
+    out = np.zeros((len(audios), (n_frames.max() + 1) * hop + frame), np.float32)
+    prev = np.zeros(len(audios), dtype=np.int64)
+    for k in range(n_frames.max()):
+        rows = np.nonzero(n_frames > k)[0]
+        # NOTE: 第 0 帧从输入开始之前一个 hop 取，输出时丢掉第一个 hop ，保证开头的窗口叠加完整
+        nominal = pad_left + np.round((k - 1) * analysis_hops[rows]).astype(np.int64)
+        if k == 0:
+            pos = nominal
+        else:
+            target = gather(padded, rows, prev[rows] + hop, frame)
+            region = gather(padded, rows, nominal - tol, frame + 2 * tol)
+            pos = nominal - tol + best_offsets(region, target, tol)
+        out[rows[:, None], k * hop + np.arange(frame)] += (
+            gather(padded, rows, pos, frame) * window
+        )
+        prev[rows] = pos
+
+    return [out[row, hop : hop + n].copy() for row, n in enumerate(out_lengths)]
+
+
+def time_stretch(audio: np.ndarray, rate: float, sr: int) -> np.ndarray:
+    return time_stretch_batch([audio], [rate], sr)[0]
+
+
+def pitch_shift_batch(
+    audios: list[np.ndarray], n_steps: list[float], sr: int
+) -> list[np.ndarray]:
+    """
+    批量变调 (半音)，输出长度和输入相同
+    """
+    factors = [2 ** (steps / 12) for steps in n_steps]
+    stretched = time_stretch_batch(audios, [1 / factor for factor in factors], sr)
+    results = []
+    for audio, output, factor in zip(audios, stretched, factors):
+        if factor == 1 or output.size == 0:
+            results.append(output)
+            continue
+        output = librosa.resample(output, orig_sr=sr * factor, target_sr=sr)
+        results.append(librosa.util.fix_length(output, size=len(audio)))
+    return results
+
+
+def pitch_shift(audio: np.ndarray, sr: int, n_steps: float) -> np.ndarray:
+    return pitch_shift_batch([audio], [n_steps], sr)[0]
+
+
+class WsolaStream:
+    """
+    流式变速，和 time_stretch 的结果一致（除浮点误差外）
+
+    push 输入任意长度的数据，返回已经确定的输出；结束时调用 flush 返回剩余部分
+    """
+
+    def __init__(self, rate: float, sr: int) -> None:
+        self.rate = rate
+        self.frame, self.hop, self.tol = get_frame_params(sr)
+        self.window = hann_window(self.frame)
+        self.analysis_hop = self.hop * rate
+        self.pad_left = int(math.ceil(self.analysis_hop)) + self.tol
+
+        # buf[0] 对应 padded 坐标中的 offset
+        self.buf = np.zeros(self.pad_left, dtype=np.float32)
+        self.offset = 0
+        self.k = 0
+        self.prev = 0
+        self.acc = np.zeros(self.frame, dtype=np.float32)
+        self.input_size = 0
+        self.output_size = 0
+        # 第 0 帧的第一个 hop 需要丢掉
+        self.skip = self.hop
+
+    def nominal(self) -> int:
+        return self.pad_left + int(round((self.k - 1) * self.analysis_hop))
+
+    def ready(self) -> bool:
+        end = self.offset + self.buf.size
+        nominal = self.nominal()
+        if nominal + self.tol + self.frame > end:
+            return False
+        return self.k == 0 or self.prev + self.hop + self.frame <= end
+
+    def get(self, start: int, size: int) -> np.ndarray:
+        return self.buf[start - self.offset : start - self.offset + size]
+
+    def step(self) -> np.ndarray:
+        nominal = self.nominal()
+        if self.k == 0:
+            pos = nominal
+        else:
+            target = self.get(self.prev + self.hop, self.frame)[None]
+            region = self.get(nominal - self.tol, self.frame + 2 * self.tol)[None]
+            pos = nominal - self.tol + int(best_offsets(region, target, self.tol)[0])
+        self.acc += self.get(pos, self.frame) * self.window
+        self.prev = pos
+        self.k += 1
+
+        out = self.acc[: self.hop].copy()
+        self.acc = np.concatenate([self.acc[self.hop :], np.zeros_like(out)])
+        return out
+
+    def run(self) -> np.ndarray:
+        outputs = []
+        while self.ready():
+            outputs.append(self.step())
+        # 丢掉已经不会再用到的输入
+        keep_from = min(self.nominal() - self.tol, self.prev + self.hop)
+        drop = max(0, keep_from - self.offset)
+        if drop > 0:
+            self.buf = self.buf[drop:]
+            self.offset += drop
+        out = np.concatenate(outputs) if outputs else np.empty(0, np.float32)
+        if self.skip > 0:
+            skip = min(self.skip, out.size)
+            out = out[skip:]
+            self.skip -= skip
+        self.output_size += out.size
+        return out
+
+    def push(self, audio: np.ndarray) -> np.ndarray:
+        audio = np.asarray(audio, dtype=np.float32)
+        self.input_size += audio.size
+        self.buf = np.concatenate([self.buf, audio])
+        return self.run()
+
+    def flush(self) -> np.ndarray:
+        total = int(round(self.input_size / self.rate))
+        padding = self.pad_left + self.frame + self.hop + self.tol
+        outputs = []
+        while self.output_size < total:
+            self.buf = np.concatenate([self.buf, np.zeros(padding, np.float32)])
+            outputs.append(self.run())
+        out = np.concatenate(outputs) if outputs else np.empty(0, np.float32)
+        excess = self.output_size - total
+        if excess > 0:
+            out = out[: out.size - excess]
+            self.output_size = total
+        return out
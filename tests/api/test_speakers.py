@@ -36,3 +36,46 @@ def test_create_speaker(client):
 
     assert os.path.exists(filepath)
     os.remove(filepath)
+
+
+@mark.speakers_api
+def test_prebake_speakers(client, monkeypatch):
+    import numpy as np
+    import torch
+
+    from modules.core.models.BaseZooModel import BaseZooModel
+    from modules.core.models.SpkConditionCache import SpkConditionCache
+    from modules.core.models.zoo.ModelZoo import model_zoo
+    from modules.core.spk.SpkMgr import spk_mgr
+    from modules.core.spk.TTSSpeaker import TTSSpeaker
+
+    class FakeCondModel(BaseZooModel):
+        def get_spk_condition(self, spk: TTSSpeaker, emotion: str = ""):
+            return self.cached_spk_condition(
+                spk=spk,
+                emotion=emotion,
+                kind="fake",
+                compute=lambda ref: torch.tensor([len(ref.wav)]),
+            )
+
+    with_refs = TTSSpeaker.from_ref_wav(
+        ref_wav=(16000, np.zeros(16000, dtype=np.int16)), text="hello"
+    )
+    without_refs = TTSSpeaker.empty()
+    spks = {str(spk.id): spk for spk in (with_refs, without_refs)}
+
+    monkeypatch.setitem(model_zoo.models, "fake-prebake", FakeCondModel("fake-prebake"))
+    monkeypatch.setattr(spk_mgr, "get_speaker_by_id", lambda id: spks.get(id))
+    SpkConditionCache.clear()
+    try:
+        response = client.post(
+            "/v1/speakers/prebake",
+            json={"model_ids": ["fake-prebake"], "speaker_ids": list(spks.keys())},
+        )
+    finally:
+        SpkConditionCache.clear()
+
+    assert response.status_code == 200
+    prebaked = response.json()["data"]["prebaked"]["fake-prebake"]
+    # 没有参考音频的 speaker 不需要预计算
+    assert prebaked == {str(with_refs.id): 1}
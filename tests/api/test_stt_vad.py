@@ -0,0 +1,40 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from modules.core.models.stt.VadCache import VadCache
+
+
+@pytest.mark.stt_api
+def test_stt_vad(client: TestClient):
+    file_path = "./tests/test_inputs/cosyvoice_out1.wav"
+
+    def detect():
+        with open(file_path, "rb") as file:
+            return client.post(
+                "/v1/stt/vad",
+                files={"file": (file_path, file, "audio/wav")},
+                data={"min_silence_duration_ms": 500, "speech_pad_ms": 200},
+            )
+
+    response = detect()
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert data["duration"] > 0
+    regions = data["regions"]
+    assert len(regions) > 0
+    assert all(0 <= r["start"] < r["end"] <= data["duration"] for r in regions)
+    assert [r["start"] for r in regions] == sorted(r["start"] for r in regions)
+
+    # 同一段音频的结果是缓存的
+    hits = VadCache.stats()["hits"]
+    assert detect().json()["data"] == data
+    assert VadCache.stats()["hits"] == hits + 1
+
+
+@pytest.mark.stt_api
+def test_stt_vad_invalid_audio(client: TestClient):
+    response = client.post(
+        "/v1/stt/vad",
+        files={"file": ("input.wav", b"not an audio file" * 100, "audio/wav")},
+    )
+    assert response.status_code == 400
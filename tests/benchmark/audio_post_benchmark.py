@@ -0,0 +1,85 @@
+"""
+后处理 (normalize / silence / gain) 的 micro-benchmark
+
+对比旧的 pydub 实现（ndarray -> wav bytes -> AudioSegment -> ndarray）和现在的 numpy 实现，
+音频时长取短请求常见的几秒
+
+python -m tests.benchmark.audio_post_benchmark
+"""
+
+import argparse
+import io
+import time
+
+import numpy as np
+import soundfile as sf
+from pydub import AudioSegment, effects
+
+from modules.utils import audio_utils
+
+
+def pydub_normalize(audio_data: np.ndarray, headroom: float, sr: int):
+    buffer = io.BytesIO()
+    sf.write(buffer, audio_data, sr, format="wav", subtype="PCM_16")
+    buffer.seek(0)
+    segment = AudioSegment.from_wav(buffer)
+    segment = effects.normalize(seg=segment, headroom=headroom)
+    return audio_utils.pydub_to_np(segment)
+
+
+def pydub_silence(duration_s: float, sr: int):
+    silence = AudioSegment.silent(duration=duration_s * 1000, frame_rate=sr)
+    return sr, np.array(silence.get_array_of_samples(), dtype=np.float32) / 32768
+
+
+def pydub_gain(audio_data: np.ndarray, gain_db: float, sr: int):
+    segment = audio_utils.ndarray_to_segment(audio_data, sr)
+    return audio_utils.pydub_to_np(segment.apply_gain(gain_db))
+
+
+def timeit(func, repeat: int) -> float:
+    func()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - t0) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--sample_rate", type=int, default=24000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    sr = args.sample_rate
+    print(
+        f"{'op':>10} {'audio (s)':>10} {'pydub (ms)':>12} {'numpy (ms)':>12} {'speedup':>8}"
+    )
+    for seconds in args.seconds:
+        audio = np.random.uniform(-0.3, 0.3, int(sr * seconds)).astype(np.float32)
+        out = np.empty_like(audio)
+        cases = {
+            "normalize": (
+                lambda: pydub_normalize(audio, headroom=1, sr=sr),
+                lambda: audio_utils.normalize_np(audio, headroom=1, out=out),
+            ),
+            "silence": (
+                lambda: pydub_silence(seconds, sr=sr),
+                lambda: audio_utils.silence_np(seconds, sample_rate=sr),
+            ),
+            "gain": (
+                lambda: pydub_gain(audio, gain_db=3, sr=sr),
+                lambda: audio_utils.apply_gain_np(audio, gain_db=3, out=out),
+            ),
+        }
+        for name, (old, new) in cases.items():
+            old_cost = timeit(old, args.repeat)
+            new_cost = timeit(new, args.repeat)
+            print(
+                f"{name:>10} {seconds:>10.1f} {old_cost * 1e3:>12.3f} {new_cost * 1e3:>12.3f} {old_cost / new_cost:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
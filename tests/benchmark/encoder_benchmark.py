@@ -0,0 +1,109 @@
+"""
+ffmpeg 编码器 benchmark
+
+对比编码一段 60 秒音频的耗时：
+- realtime: 旧的方式，ffmpeg 以 -re 启动（按实时速度读取输入），每次请求冷启动进程
+- pooled: 当前的方式，全速编码，从 FFmpegPool 取预先启动好的进程
+
+模拟 AudioHandler._enqueue_to_bytes 的流程：write -> close -> read_all
+
+python -m tests.benchmark.encoder_benchmark --formats mp3 ogg --seconds 60
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from modules import config
+from modules.core.handler.encoder.encoders import AacEncoder, Mp3Encoder, OggEncoder
+from modules.core.handler.encoder.FFmpegPool import FFmpegPool
+
+encoder_classes = {
+    "mp3": Mp3Encoder,
+    "ogg": OggEncoder,
+    "aac": AacEncoder,
+}
+
+
+def make_realtime_encoder(encoder_cls):
+    class RealtimeEncoder(encoder_cls):
+        def build_args(self, **kwargs) -> list[str]:
+            args = super().build_args(**kwargs)
+            return args[:1] + ["-re"] + args[1:]
+
+    return RealtimeEncoder()
+
+
+def encode_once(encoder, audio_bytes: bytes, sample_rate: int) -> tuple[float, int]:
+    t0 = time.perf_counter()
+    encoder.set_header(sample_rate=sample_rate)
+    encoder.open()
+    encoder.write(audio_bytes)
+    encoder.close()
+    data = encoder.read_all()
+    encoder.terminate()
+    return time.perf_counter() - t0, len(data)
+
+
+def run_encoder_benchmark(
+    format: str, seconds: float, sample_rate: int, repeat: int, realtime: bool
+):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    audio = (np.sin(2 * np.pi * 220 * t) * 8000).astype(np.int16)
+    audio_bytes = audio.tobytes()
+
+    encoder_cls = encoder_classes[format]
+    if realtime:
+        config.runtime_env_vars.encoder_pool_size = 0
+    else:
+        config.runtime_env_vars.encoder_pool_size = 1
+        # 预热：第一次取进程会触发后台预启动
+        encode_once(encoder_cls(), audio_bytes[: sample_rate * 2], sample_rate)
+        time.sleep(0.5)
+
+    costs = []
+    size = 0
+    for _ in range(repeat):
+        encoder = make_realtime_encoder(encoder_cls) if realtime else encoder_cls()
+        cost, size = encode_once(encoder, audio_bytes, sample_rate)
+        costs.append(cost)
+        if not realtime:
+            # 等待后台补充空闲进程，模拟请求之间的间隔
+            time.sleep(0.5)
+    return float(np.mean(costs)), size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--formats", type=str, nargs="+", default=["mp3", "ogg"])
+    parser.add_argument("--seconds", type=float, default=60)
+    parser.add_argument("--sample_rate", type=int, default=24000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--skip_realtime",
+        action="store_true",
+        help="Skip the -re baseline, it takes about --seconds per run",
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'format':>8} {'mode':>10} {'wall (s)':>10} {'x realtime':>12} {'bytes':>10}"
+    )
+    modes = ["pooled"] if args.skip_realtime else ["realtime", "pooled"]
+    for format in args.formats:
+        for mode in modes:
+            cost, size = run_encoder_benchmark(
+                format=format,
+                seconds=args.seconds,
+                sample_rate=args.sample_rate,
+                repeat=args.repeat,
+                realtime=mode == "realtime",
+            )
+            speed = args.seconds / cost
+            print(f"{format:>8} {mode:>10} {cost:>10.3f} {speed:>12.1f} {size:>10}")
+    FFmpegPool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
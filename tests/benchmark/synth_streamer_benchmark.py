@@ -0,0 +1,73 @@
+"""
+SynthStreamer.read 的 micro-benchmark
+
+模拟流式生成：每个 segment 被切成若干个 chunk 逐个 append ，每 append 一次 read 一次，
+统计随着文档变长，单次 read 的平均耗时是否保持平稳
+
+python -m tests.benchmark.synth_streamer_benchmark
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from modules.core.pipeline.dcls import TTSPipelineContext, TTSSegment
+from modules.core.pipeline.generate.dcls import SynthAudio
+from modules.core.pipeline.generate.SynthSteamer import SynthStreamer
+
+
+def run_streamer_benchmark(
+    num_segments: int, chunks_per_segment: int = 10, chunk_samples: int = 2400
+):
+    segments = [
+        SynthAudio(TTSSegment(_type="audio", text=f"seg{i}"))
+        for i in range(num_segments)
+    ]
+    streamer = SynthStreamer(
+        segments=segments, context=TTSPipelineContext(), model=None
+    )
+    chunk = np.random.uniform(-1, 1, chunk_samples).astype(np.float32)
+
+    reads = 0
+    delivered = 0
+    read_time = 0.0
+    for seg in segments:
+        for _ in range(chunks_per_segment):
+            seg.append(chunk)
+            t0 = time.perf_counter()
+            data = streamer.read()
+            read_time += time.perf_counter() - t0
+            reads += 1
+            delivered += data.size
+        seg.done = True
+
+    assert delivered == num_segments * chunks_per_segment * chunk_samples
+    assert data.dtype == np.float32
+    return read_time / reads
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--segments", type=int, nargs="+", default=[10, 100, 1000, 5000]
+    )
+    parser.add_argument("--chunks_per_segment", type=int, default=10)
+    parser.add_argument("--chunk_samples", type=int, default=2400)
+    args = parser.parse_args()
+
+    print(f"{'segments':>10} {'audio (s)':>12} {'read avg (us)':>15}")
+    for num_segments in args.segments:
+        avg = run_streamer_benchmark(
+            num_segments=num_segments,
+            chunks_per_segment=args.chunks_per_segment,
+            chunk_samples=args.chunk_samples,
+        )
+        duration = (
+            num_segments * args.chunks_per_segment * args.chunk_samples / 24000
+        )
+        print(f"{num_segments:>10} {duration:>12.1f} {avg * 1e6:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+文本归一化 (TN) benchmark
+
+在一份约 1 MB 的中英混合语料上统计：
+- split_string_with_freeze: 按 freeze token 切分整份语料的耗时
+- normalize: 按行 (和 chunker 切分后的 segment 长度相近) 过一遍 TN pipeline 的耗时，
+  以及每个 block 的耗时 (关闭缓存)
+
+python -m tests.benchmark.tn_benchmark --size_kb 1024 --lines 2000
+"""
+
+import argparse
+import random
+import time
+
+from modules import config
+from modules.core.tn.base_tn import BaseTN
+
+freeze_tokens = [
+    "[uv_break]",
+    "[v_break]",
+    "[lbreak]",
+    "[laugh]",
+    *[f"[break_{i}]" for i in range(8)],
+    *[f"[oral_{i}]" for i in range(10)],
+    *[f"[speed_{i}]" for i in range(10)],
+]
+
+sentences = [
+    "ChatTTS是专门为对话场景设计的文本转语音模型，例如LLM助手对话任务。",
+    "明天有62％的概率降雨，气温-3°C到5°C，请拨打13800138000咨询。",
+    "在沙漠、岩石、雪地上行走了很长的时间以后，小王子终于发现了一条大路。",
+    "“你们是什么花？”小王子惊奇地问。",
+    "**加粗** 和 *斜体*，以及 [链接](https://example.com)。",
+    "State-of-the-art Machine Learning for PyTorch, TensorFlow, and JAX.",
+    "It was released on 2024-05-28 and costs $12.5 per month.",
+    "I like eating 🍏 and the price is 3.5 dollars.",
+    "埃隆·马斯克在2023年发布了新的模型（版本2.0）。",
+]
+
+
+def build_corpus(size_kb: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    lines = []
+    size = 0
+    while size < size_kb * 1024:
+        line = rng.choice(sentences)
+        if rng.random() < 0.3:
+            line += rng.choice(freeze_tokens) + rng.choice(sentences)
+        lines.append(line)
+        size += len(line.encode("utf-8")) + 1
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size_kb", type=int, default=1024)
+    parser.add_argument(
+        "--lines",
+        type=int,
+        default=2000,
+        help="Number of lines passed through the full pipeline, 0 for all",
+    )
+    args = parser.parse_args()
+
+    # 关闭缓存，统计的是真实的 TN 耗时
+    config.runtime_env_vars.tn_cache_size = 0
+
+    pipeline = BaseTN.clone()
+    pipeline.freeze_tokens = freeze_tokens
+
+    lines = build_corpus(args.size_kb)
+    corpus = "\n".join(lines)
+    print(f"corpus: {len(corpus.encode('utf-8')) / 1024:.0f} KB, {len(lines)} lines")
+
+    t0 = time.perf_counter()
+    texts = pipeline.split_string_with_freeze(corpus, pipeline.freeze_tokens)
+    elapsed = time.perf_counter() - t0
+    frozen = sum(1 for t in texts if t.type == "freeze")
+    print(f"split_string_with_freeze: {elapsed * 1000:.1f} ms ({frozen} freeze tokens)")
+
+    if args.lines > 0:
+        lines = lines[: args.lines]
+    t0 = time.perf_counter()
+    for line in lines:
+        pipeline.normalize(line)
+    elapsed = time.perf_counter() - t0
+    print(
+        f"normalize: {len(lines)} lines in {elapsed:.2f} s "
+        f"({elapsed / len(lines) * 1000:.2f} ms/line)"
+    )
+
+    print(f"{'block':>34} {'calls':>8} {'total (ms)':>12}")
+    for block in pipeline.stats()["blocks"]:
+        print(f"{block['name']:>34} {block['calls']:>8} {block['total_ms']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
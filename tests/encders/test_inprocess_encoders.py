@@ -0,0 +1,84 @@
+import io
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from modules.core.handler.encoder.InProcessEncoder import (
+    InProcessFlacEncoder,
+    InProcessRawEncoder,
+    InProcessWavEncoder,
+)
+
+
+def make_pcm(sample_rate=24000, seconds=1.0) -> np.ndarray:
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    return (np.sin(2 * np.pi * 440 * t) * 16000).astype(np.int16)
+
+
+def open_encoder(encoder_cls, sample_rate=24000):
+    encoder = encoder_cls()
+    encoder.set_header(sample_rate=sample_rate)
+    encoder.open()
+    encoder.write_header_data()
+    return encoder
+
+
+@pytest.mark.encoders
+def test_wav_encoder_bytes():
+    pcm = make_pcm()
+    encoder = open_encoder(InProcessWavEncoder)
+    encoder.write(pcm.tobytes())
+    encoder.close()
+    data = encoder.read_all()
+    encoder.terminate()
+
+    assert len(data) == 44 + pcm.nbytes
+    wav, sr = sf.read(io.BytesIO(data), dtype="int16")
+    assert sr == 24000
+    assert np.array_equal(wav, pcm)
+
+
+@pytest.mark.encoders
+def test_wav_encoder_stream():
+    pcm = make_pcm()
+    encoder = open_encoder(InProcessWavEncoder)
+    output = b""
+    for chunk in np.array_split(pcm, 8):
+        encoder.write(chunk.tobytes())
+        output += encoder.read()
+    encoder.close()
+    output += encoder.read()
+
+    assert output[44:] == pcm.tobytes()
+
+
+@pytest.mark.encoders
+def test_raw_encoder():
+    pcm = make_pcm()
+    encoder = open_encoder(InProcessRawEncoder)
+    encoder.write(pcm.tobytes())
+    encoder.close()
+    data = encoder.read_all()
+
+    assert data[:4] == b"RIFF"
+    assert data[44:] == pcm.tobytes()
+
+
+@pytest.mark.encoders
+@pytest.mark.parametrize("stream", [False, True])
+def test_flac_encoder(stream):
+    pcm = make_pcm(sample_rate=44100)
+    encoder = open_encoder(InProcessFlacEncoder, sample_rate=44100)
+    output = b""
+    for chunk in np.array_split(pcm, 8):
+        encoder.write(chunk.tobytes())
+        if stream:
+            output += encoder.read()
+    encoder.close()
+    output += encoder.read_all()
+
+    assert output[:4] == b"fLaC"
+    wav, sr = sf.read(io.BytesIO(output), dtype="int16")
+    assert sr == 44100
+    assert np.array_equal(wav, pcm)
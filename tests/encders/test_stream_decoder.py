@@ -0,0 +1,75 @@
+import io
+import threading
+import wave
+
+import numpy as np
+import pytest
+
+from modules.core.handler.encoder.StreamDecoder import AudioDecodeError, StreamDecoder
+
+
+def create_wav_bytes(sr: int = 44100, seconds: float = 3.0, channels: int = 1):
+    t = np.arange(int(sr * seconds)) / sr
+    mono = (np.sin(2 * np.pi * 440 * t) * 0.5 * 32767).astype(np.int16)
+    data = np.repeat(mono[:, None], channels, axis=1)
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(sr)
+        f.writeframes(data.tobytes())
+    return buf.getvalue()
+
+
+def decode(data: bytes, chunk_size: int = 4096, max_queue_size: int = 16):
+    decoder = StreamDecoder(sample_rate=16000, max_queue_size=max_queue_size)
+    decoder.open()
+
+    def feed():
+        try:
+            for i in range(0, len(data), chunk_size):
+                decoder.write(data[i : i + chunk_size])
+        except AudioDecodeError:
+            pass
+        decoder.close_input()
+
+    feeder = threading.Thread(target=feed)
+    feeder.start()
+    try:
+        return [frame for frame in decoder.iter_frames()]
+    finally:
+        feeder.join()
+        decoder.terminate()
+
+
+@pytest.mark.encoders
+def test_stream_decoder_to_16k_mono():
+    frames = decode(create_wav_bytes())
+    audio = np.concatenate(frames)
+
+    assert audio.dtype == np.float32
+    assert abs(len(audio) - 16000 * 3) < 160
+    assert 0.45 < np.abs(audio).max() < 0.55
+    # 每次输出的音频都是有上限的
+    assert max(len(frame) for frame in frames) <= 65536 // 4
+
+
+@pytest.mark.encoders
+def test_stream_decoder_stereo():
+    audio = np.concatenate(decode(create_wav_bytes(channels=2)))
+    assert audio.ndim == 1
+    assert abs(len(audio) - 16000 * 3) < 160
+
+
+@pytest.mark.encoders
+def test_stream_decoder_backpressure():
+    # 队列只能放一个元素，读取慢的时候写入会被阻塞，但结果是完整的
+    frames = decode(create_wav_bytes(seconds=10), max_queue_size=1)
+    assert abs(sum(len(frame) for frame in frames) - 16000 * 10) < 160
+
+
+@pytest.mark.encoders
+def test_stream_decoder_invalid_input():
+    with pytest.raises(AudioDecodeError) as e:
+        decode(b"not an audio file" * 100)
+    assert e.value.decoded == 0
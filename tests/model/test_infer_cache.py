@@ -0,0 +1,190 @@
+import numpy as np
+import pytest
+import torch
+
+from modules import config
+from modules.core.handler.datacls.tts_model import InferConfig
+from modules.core.models.BaseZooModel import digest_model_files
+from modules.core.models.tts.InferCache import InferCache
+from modules.core.models.tts.InferDiskCache import InferDiskCache
+from modules.core.models.TTSModel import TTSModel
+from modules.core.pipeline.dcls import TTSPipelineContext, TTSSegment
+from modules.core.spk.TTSSpeaker import TTSSpeaker
+
+
+def create_audio(size: int, value: float = 0.5):
+    return (24000, np.full(size, value, dtype=np.float32))
+
+
+@pytest.mark.infer_cache
+def test_disk_cache_roundtrip(tmp_path):
+    cache = InferDiskCache(root=tmp_path, max_bytes=1024 * 1024)
+    digest = InferCache.get_digest(text="你好", seed=42)
+    cache.set("chat-tts", digest, [create_audio(10), create_audio(5, 0.25)])
+
+    # 新实例模拟重启/其他 worker
+    cache2 = InferDiskCache(root=tmp_path, max_bytes=1024 * 1024)
+    value = cache2.get("chat-tts", digest)
+    assert [sr for sr, _ in value] == [24000, 24000]
+    assert [data.size for _, data in value] == [10, 5]
+    assert np.allclose(value[1][1], 0.25)
+    assert cache2.get("chat-tts", "missing") is None
+
+    stats = cache2.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["entries"] == 1
+
+
+@pytest.mark.infer_cache
+def test_disk_cache_evicts_over_budget(tmp_path):
+    # 每条 400 bytes 左右（float32 * 100 + npy header）
+    cache = InferDiskCache(root=tmp_path, max_bytes=1000, policy="lru")
+    for i in range(4):
+        cache.set("m", f"d{i}", create_audio(100))
+
+    stats = cache.stats()
+    assert stats["bytes"] <= 1000
+    assert stats["evictions"] >= 2
+    assert cache.get("m", "d3") is not None
+    assert cache.get("m", "d0") is None
+
+
+@pytest.mark.infer_cache
+def test_disk_cache_int16(tmp_path):
+    cache = InferDiskCache(root=tmp_path, max_bytes=1024 * 1024, dtype="int16")
+    cache.set("m", "d", create_audio(8))
+    sr, data = cache.get("m", "d")
+    assert data.dtype == np.float32
+    assert np.allclose(data, 0.5, atol=1e-3)
+
+
+@pytest.mark.infer_cache
+def test_digest_is_stable():
+    d1 = InferCache.get_digest(text="a", top_P=0.7, spk_id=None)
+    d2 = InferCache.get_digest(spk_id=None, top_P=0.7, text="a")
+    assert d1 == d2
+    assert d1 != InferCache.get_digest(text="b", top_P=0.7, spk_id=None)
+
+
+class FakeCachedModel(TTSModel):
+    """
+    和真实模型一样在 generate_batch 中读写 cache ，记录每次真正推理的文本
+    """
+
+    def __init__(self, model_id: str) -> None:
+        super().__init__(model_id)
+        self.generated: list[list[str]] = []
+
+    def generate_batch(self, segments: list[TTSSegment], context: TTSPipelineContext):
+        cached = self.get_cache(segments=segments, context=context)
+        if cached is not None:
+            return cached
+        self.generated.append([seg.text for seg in segments])
+        results = [create_audio(len(seg.text)) for seg in segments]
+        self.set_cache(segments=segments, context=context, value=results)
+        return results
+
+
+def create_segments(texts: list[str], spk=None):
+    return [
+        TTSSegment(_type="audio", text=text, spk=spk, infer_seed=42) for text in texts
+    ]
+
+
+@pytest.mark.infer_cache
+def test_segment_cache_partial_hit():
+    model = FakeCachedModel("fake-segment-cache")
+    context = TTSPipelineContext(infer_config=InferConfig(seed=42))
+
+    model.generate_batch_cached(create_segments(["a", "bb"]), context=context)
+    results = model.generate_batch_cached(
+        create_segments(["bb", "ccc", "a"]), context=context
+    )
+
+    # 只有未命中的 segment 会交给模型
+    assert model.generated == [["a", "bb"], ["ccc"]]
+    assert [data.size for _, data in results] == [2, 3, 1]
+
+
+@pytest.mark.infer_cache
+def test_segment_cache_speaker_fingerprint():
+    model = FakeCachedModel("fake-segment-cache-spk")
+    context = TTSPipelineContext(infer_config=InferConfig(seed=42))
+    spk = TTSSpeaker.from_token(model_id=model.model_id, tokens=[torch.ones(4)])
+
+    model.generate_batch_cached(create_segments(["a"], spk=spk), context=context)
+    model.generate_batch_cached(create_segments(["a"], spk=spk), context=context)
+    assert model.generated == [["a"]]
+
+    # 修改 token 之后不应该命中旧的缓存
+    spk.set_token(tokens=[torch.zeros(4)], model_id=model.model_id)
+    model.generate_batch_cached(create_segments(["a"], spk=spk), context=context)
+    assert model.generated == [["a"], ["a"]]
+
+
+@pytest.mark.infer_cache
+def test_memory_cache_byte_budget_and_admission():
+    env = config.runtime_env_vars
+    env.infer_cache_mb = 1
+    env.infer_cache_total_mb = 2
+    env.infer_cache_admit_mb = 0.5
+    InferCache.clear()
+    try:
+        # 每条略小于 256KB (采样率也计入大小) ，单模型最多 4 条
+        small = create_audio(64 * 1024 - 64)
+        for i in range(6):
+            InferCache.set_cache_val("fake-budget", small, text=f"s{i}")
+        cache = InferCache.get_cache("fake-budget")
+        assert cache.currsize <= 1024 * 1024
+        assert cache.evictions == 2
+        assert InferCache.get_cache_val("fake-budget", text="s0") is None
+        assert InferCache.get_cache_val("fake-budget", text="s5") is not None
+
+        # 768KB 的条目第一次生成不缓存，第二次才缓存
+        large = create_audio(192 * 1024)
+        InferCache.set_cache_val("fake-budget", large, text="long")
+        assert InferCache.get_cache_val("fake-budget", text="long") is None
+        InferCache.set_cache_val("fake-budget", large, text="long")
+        assert InferCache.get_cache_val("fake-budget", text="long") is not None
+        assert cache.rejected == 1
+
+        stats = InferCache.stats()
+        assert stats["models"]["fake-budget"]["bytes"] == cache.currsize
+        assert stats["bytes"] <= stats["max_bytes"]
+    finally:
+        env.infer_cache_mb = None
+        env.infer_cache_total_mb = None
+        env.infer_cache_admit_mb = None
+        InferCache.clear()
+
+
+@pytest.mark.infer_cache
+def test_model_files_digest(tmp_path):
+    weights = tmp_path / "model.pt"
+    weights.write_bytes(b"v1")
+    digest = digest_model_files([tmp_path])
+    assert digest == digest_model_files([tmp_path])
+    assert digest_model_files([]) == ""
+
+    # 替换权重 (大小或修改时间变化) 之后 hash 也会变化
+    weights.write_bytes(b"v2-new")
+    assert digest_model_files([tmp_path]) != digest
+
+
+@pytest.mark.infer_cache
+def test_segment_cache_model_hash(tmp_path):
+    model = FakeCachedModel("fake-segment-cache-hash")
+    model.get_model_paths = lambda: [tmp_path]
+    context = TTSPipelineContext(infer_config=InferConfig(seed=42))
+
+    (tmp_path / "model.pt").write_bytes(b"v1")
+    model.update_hash()
+    model.generate_batch_cached(create_segments(["a"]), context=context)
+    model.generate_batch_cached(create_segments(["a"]), context=context)
+    assert model.generated == [["a"]]
+
+    # 换了权重重新加载之后不应该命中旧的缓存
+    (tmp_path / "model.pt").write_bytes(b"v2-new")
+    model.update_hash()
+    model.generate_batch_cached(create_segments(["a"]), context=context)
+    assert model.generated == [["a"], ["a"]]
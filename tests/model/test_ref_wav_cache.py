@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from modules.core.models.RefWavCache import RefWavCache
+from modules.core.spk.TTSSpeaker import TTSSpeaker
+
+
+def create_spk(sr: int = 16000):
+    wav = (np.sin(np.linspace(0, 100, sr)) * 10000).astype(np.int16)
+    return TTSSpeaker.from_ref_wav(ref_wav=(sr, wav), text="hello")
+
+
+@pytest.mark.ref_wav_cache
+def test_ref_wav_cache_hit():
+    RefWavCache.clear()
+    spk = create_spk()
+
+    wav1, text = RefWavCache.get_spk_ref_wav(spk=spk, target_sr=24000)
+    assert text == "hello"
+    assert wav1.size == 24000
+    assert len(RefWavCache.cache) == 1
+
+    wav2, _ = RefWavCache.get_spk_ref_wav(spk=spk, target_sr=24000)
+    assert np.array_equal(wav1, wav2)
+    assert len(RefWavCache.cache) == 1
+
+    # 返回的是副本，修改不影响缓存
+    wav2[:] = 0
+    wav3, _ = RefWavCache.get_spk_ref_wav(spk=spk, target_sr=24000)
+    assert np.array_equal(wav1, wav3)
+
+    # 不同的目标采样率分开缓存
+    wav4, _ = RefWavCache.get_spk_ref_wav(spk=spk, target_sr=16000)
+    assert wav4.size == 16000
+    assert len(RefWavCache.cache) == 2
+
+
+@pytest.mark.ref_wav_cache
+def test_ref_wav_cache_invalidate():
+    RefWavCache.clear()
+    spk = create_spk()
+    RefWavCache.get_spk_ref_wav(spk=spk, target_sr=24000)
+    RefWavCache.invalidate(spk.id)
+    assert len(RefWavCache.cache) == 0
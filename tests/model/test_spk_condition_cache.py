@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+import torch
+
+from modules import config
+from modules.core.models.BaseZooModel import BaseZooModel
+from modules.core.models.SpkConditionCache import SpkConditionCache
+from modules.core.spk.TTSSpeaker import TTSSpeaker
+
+
+class FakeCondModel(BaseZooModel):
+    def __init__(self) -> None:
+        super().__init__("fake-cond")
+        self.computed = 0
+
+        self.device = "cpu"
+
+    def get_spk_condition(self, spk: TTSSpeaker, emotion: str = ""):
+        def compute(ref):
+            self.computed += 1
+            return torch.tensor([len(ref.wav)], dtype=torch.float32)
+
+        return self.cached_spk_condition(
+            spk=spk, emotion=emotion, kind="fake", compute=compute, device=self.device
+        )
+
+
+def create_spk(seconds: float = 1.0):
+    wav = np.zeros(int(16000 * seconds), dtype=np.int16)
+    return TTSSpeaker.from_ref_wav(ref_wav=(16000, wav), text="hello")
+
+
+@pytest.mark.spk_condition
+def test_spk_condition_computed_once():
+    SpkConditionCache.clear()
+    model = FakeCondModel()
+    spk = create_spk()
+
+    cond1 = model.get_spk_condition(spk)
+    cond2 = model.get_spk_condition(spk)
+    assert model.computed == 1
+    assert torch.equal(cond1, cond2)
+
+    # 参考音频不同就是不同的特征
+    model.get_spk_condition(create_spk(seconds=2.0))
+    assert model.computed == 2
+
+
+@pytest.mark.spk_condition
+def test_spk_condition_persisted(tmp_path):
+    config.runtime_env_vars.spk_cond_cache_dir = str(tmp_path)
+    try:
+        SpkConditionCache.clear()
+        model = FakeCondModel()
+        assert model.prebake_spk(create_spk()) == 1
+        assert model.computed == 1
+
+        # 模拟重启，从磁盘加载
+        SpkConditionCache.clear()
+        cond = model.get_spk_condition(create_spk())
+        assert model.computed == 1
+        assert cond.item() == 32000
+    finally:
+        config.runtime_env_vars.spk_cond_cache_dir = None
+        SpkConditionCache.clear()
+
+
+@pytest.mark.spk_condition
+def test_spk_condition_model_hash():
+    SpkConditionCache.clear()
+    model = FakeCondModel()
+    spk = create_spk()
+
+    model.hash = "v1"
+    model.get_spk_condition(spk)
+    model.get_spk_condition(spk)
+    assert model.computed == 1
+
+    # 换了权重之后不应该命中旧的特征
+    model.hash = "v2"
+    model.get_spk_condition(spk)
+    assert model.computed == 2
+
+
+@pytest.mark.spk_condition
+def test_spk_condition_loaded_to_device(tmp_path):
+    config.runtime_env_vars.spk_cond_cache_dir = str(tmp_path)
+    try:
+        SpkConditionCache.clear()
+        model = FakeCondModel()
+        model.get_spk_condition(create_spk())
+
+        # 从磁盘层加载时放到模型所在的设备上，而不是 cpu
+        SpkConditionCache.clear()
+        model.device = "meta"
+        cond = model.get_spk_condition(create_spk())
+        assert model.computed == 1
+        assert cond.device.type == "meta"
+    finally:
+        config.runtime_env_vars.spk_cond_cache_dir = None
+        SpkConditionCache.clear()
@@ -0,0 +1,303 @@
+import numpy as np
+import pytest
+
+from modules import config
+from modules.core.handler.datacls.stt_model import STTConfig
+from modules.core.models.stt.STTChunker import STTChunkData, STTChunker
+from modules.core.models.stt.STTModel import STTModel
+from modules.core.models.stt.whisper.whisper_dcls import SttResult, SttSegment, SttWord
+
+
+class FakeSTTModel(STTModel):
+    def __init__(self):
+        super().__init__(model_id="fake")
+        self.batches: list[int] = []
+
+    def transcribe_to_result(self, audio, config):
+        sr, data = audio
+        text = f"chunk{int(data[0])}"
+        return SttResult(
+            segments=[
+                SttSegment(
+                    text=text,
+                    start=0.5,
+                    end=1.0,
+                    words=[SttWord(start=0.5, end=1.0, word=text)],
+                )
+            ],
+            language="zh",
+            duration=len(data) / sr,
+        )
+
+    def transcribe_batch_to_result(self, audios, config):
+        self.batches.append(len(audios))
+        return super().transcribe_batch_to_result(audios, config)
+
+
+def create_chunks(count: int):
+    sr = 16000
+    return [
+        STTChunkData(
+            audio=(sr, np.full(sr * 10, i, dtype=np.float32)),
+            start_s=i * 10,
+            end_s=(i + 1) * 10,
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.mark.stt
+def test_stt_chunker_batched_matches_sequential(monkeypatch):
+    monkeypatch.setattr(config.runtime_env_vars, "stt_batch_size", 3, raising=False)
+    model = FakeSTTModel()
+    chunker = STTChunker(model=model)
+    chunks = create_chunks(7)
+    monkeypatch.setattr(chunker, "get_chunks", lambda audio: chunks)
+
+    batched = chunker.transcribe_to_result(audio=None, config=STTConfig())
+    assert model.batches == [3, 3, 1]
+
+    # 有参考文稿时逐个识别
+    sequential = chunker.transcribe_to_result(
+        audio=None, config=STTConfig(refrence_transcript="chunk0 chunk1")
+    )
+    assert model.batches == [3, 3, 1]
+
+    assert [(seg.text, seg.start, seg.end) for seg in batched.segments] == [
+        (seg.text, seg.start, seg.end) for seg in sequential.segments
+    ]
+    assert [seg.text for seg in batched.segments] == [f"chunk{i}" for i in range(7)]
+    assert batched.segments[2].start == 20.5
+    assert batched.segments[2].words[0].end == 21.0
+
+
+def energy_speech_timestamps(audio, vad_options=None):
+    # 用能量代替 silero vad ，非 0 的采样都视为语音，静音超过 2s 才结束
+    speech = np.flatnonzero(np.abs(audio) > 0)
+    if len(speech) == 0:
+        return []
+    min_silence = 2 * 16000
+    gaps = np.flatnonzero(np.diff(speech) > min_silence)
+    starts = np.concatenate([[speech[0]], speech[gaps + 1]])
+    ends = np.concatenate([speech[gaps] + 1, [speech[-1] + 1]])
+    result = [{"start": int(s), "end": int(e)} for s, e in zip(starts, ends)]
+    if len(audio) - result[-1]["end"] < min_silence:
+        result[-1]["end"] = len(audio)
+    return result
+
+
+def create_long_audio():
+    # 20 段 4s 的语音，中间是 3s 的静音，第 i 段语音的值为 i + 1
+    sr = 16000
+    parts = []
+    for i in range(20):
+        parts.append(np.zeros(sr * 3))
+        parts.append(np.full(sr * 4, i + 1))
+    parts.append(np.zeros(sr * 3))
+    return np.concatenate(parts).astype(np.float32)
+
+
+@pytest.mark.stt
+@pytest.mark.parametrize("frame_seconds", [0.5, 7, 1000])
+def test_stt_chunker_iter_chunks(monkeypatch, frame_seconds):
+    from modules.core.models.stt import VadCache as vad_module
+
+    monkeypatch.setattr(vad_module, "get_speech_timestamps", energy_speech_timestamps)
+    chunker = STTChunker(model=FakeSTTModel())
+    audio = create_long_audio()
+    size = int(16000 * frame_seconds)
+    frames = (audio[i : i + size] for i in range(0, len(audio), size))
+
+    chunks = list(chunker.iter_chunks(frames))
+
+    values = []
+    for chunk in chunks:
+        sr, data = chunk.audio
+        assert chunk.end_s - chunk.start_s <= 30
+        assert len(data) == round((chunk.end_s - chunk.start_s) * sr)
+        # chunk 的位置和内容对应
+        start = round(chunk.start_s * sr)
+        assert np.array_equal(data, audio[start : start + len(data)])
+        values.extend(v for v in np.unique(data) if v > 0)
+    # 所有语音都按顺序出现且只出现一次
+    assert values == list(range(1, 21))
+    assert [chunk.start_s for chunk in chunks] == sorted(c.start_s for c in chunks)
+
+
+@pytest.mark.stt
+def test_stt_chunker_transcribe_frames(monkeypatch):
+    from modules.core.models.stt import VadCache as vad_module
+
+    monkeypatch.setattr(vad_module, "get_speech_timestamps", energy_speech_timestamps)
+    model = FakeSTTModel()
+    chunker = STTChunker(model=model)
+    audio = create_long_audio()
+    frames = (audio[i : i + 8000] for i in range(0, len(audio), 8000))
+
+    result = chunker.transcribe_frames(frames, STTConfig())
+    assert result.language == "zh"
+    assert len(result.segments) > 0
+    assert sum(model.batches) == len(result.segments)
+
+
+@pytest.mark.stt
+def test_stt_chunker_get_chunks_cached_vad(monkeypatch):
+    from modules.core.models.stt import VadCache as vad_module
+    from modules.core.models.stt.VadCache import VadCache
+
+    inputs = []
+
+    def speech_timestamps(audio, vad_options=None):
+        inputs.append(len(audio))
+        return energy_speech_timestamps(audio, vad_options)
+
+    monkeypatch.setattr(vad_module, "get_speech_timestamps", speech_timestamps)
+    monkeypatch.setattr(VadCache, "cache", None)
+    VadCache.clear()
+
+    sr = 48000
+    speech = create_long_audio()
+    # 48k int16 ，每个 16k 采样重复 3 次
+    audio = (sr, (np.repeat(speech, 3) * 1000).astype(np.int16))
+    chunker = STTChunker(model=FakeSTTModel())
+
+    chunks = chunker.get_chunks(audio)
+    assert inputs == [len(speech)]
+    assert VadCache.stats()["misses"] == 1
+
+    values = []
+    for chunk in chunks:
+        _, data = chunk.audio
+        assert chunk.end_s - chunk.start_s <= 30
+        start = round(chunk.start_s * sr)
+        assert np.array_equal(data, audio[1][start : start + len(data)])
+        values.extend(v // 1000 for v in np.unique(data) if v > 0)
+    assert values == list(range(1, 21))
+
+    # 同一段音频再次切分时不再做 vad
+    again = chunker.get_chunks((sr, audio[1].copy()))
+    assert inputs == [len(speech)]
+    assert VadCache.stats()["hits"] == 1
+    assert [(c.start_s, c.end_s) for c in again] == [
+        (c.start_s, c.end_s) for c in chunks
+    ]
+
+
+@pytest.mark.stt
+@pytest.mark.parametrize("frame_seconds", [0.5, 7, 1000])
+def test_vad_cache_iter_speech_regions(monkeypatch, frame_seconds):
+    from faster_whisper.vad import VadOptions
+
+    from modules.core.models.stt import VadCache as vad_module
+    from modules.core.models.stt.VadCache import VadCache
+
+    lengths = []
+
+    def speech_timestamps(audio, vad_options=None):
+        lengths.append(len(audio))
+        return energy_speech_timestamps(audio, vad_options)
+
+    monkeypatch.setattr(vad_module, "get_speech_timestamps", speech_timestamps)
+    audio = create_long_audio()
+    size = int(16000 * frame_seconds)
+    frames = (audio[i : i + size] for i in range(0, len(audio), size))
+
+    regions = list(
+        VadCache.iter_speech_regions(frames, VadOptions(max_speech_duration_s=30))
+    )
+
+    # 和对完整音频做 vad 的结果一样
+    assert [(r.start, r.end) for r in regions] == [
+        (s["start"] / 16000, s["end"] / 16000) for s in energy_speech_timestamps(audio)
+    ]
+    # 每次 vad 的输入长度有上限
+    assert max(lengths) <= 16000 * (30 + 30 + 3) + size
+
+
+@pytest.mark.stt
+def test_stt_chunker_iter_chunks_cached_vad(monkeypatch):
+    from modules.core.models.stt import VadCache as vad_module
+    from modules.core.models.stt.VadCache import VadCache
+
+    lengths = []
+
+    def speech_timestamps(audio, vad_options=None):
+        lengths.append(len(audio))
+        return energy_speech_timestamps(audio, vad_options)
+
+    monkeypatch.setattr(vad_module, "get_speech_timestamps", speech_timestamps)
+    monkeypatch.setattr(VadCache, "cache", None)
+    VadCache.clear()
+
+    chunker = STTChunker(model=FakeSTTModel())
+    audio = create_long_audio()
+
+    def iter_chunks():
+        frames = (audio[i : i + 8000] for i in range(0, len(audio), 8000))
+        return list(chunker.iter_chunks(frames, cache_key="key"))
+
+    chunks = iter_chunks()
+    assert len(lengths) > 0
+    assert VadCache.stats()["misses"] == 1
+    duration, regions = VadCache.get_cache()["key"]
+    assert duration == len(audio) / 16000
+    assert len(regions) == 20
+
+    # 命中缓存时不再做 vad ，按缓存的段落切出一样的 chunk
+    vad_count = len(lengths)
+    again = iter_chunks()
+    assert len(lengths) == vad_count
+    assert VadCache.stats()["hits"] == 1
+    assert [(c.start_s, c.end_s) for c in again] == [
+        (c.start_s, c.end_s) for c in chunks
+    ]
+    for chunk, cached in zip(chunks, again):
+        assert np.array_equal(chunk.audio[1], cached.audio[1])
+
+
+@pytest.mark.stt
+@pytest.mark.asyncio
+async def test_stt_handler_upload_cached_vad(monkeypatch):
+    import io
+    import wave
+
+    from fastapi import UploadFile
+
+    from modules.core.handler.STTHandler import STTHandler
+    from modules.core.models.stt import VadCache as vad_module
+    from modules.core.models.stt.VadCache import VadCache
+
+    lengths = []
+
+    def speech_timestamps(audio, vad_options=None):
+        lengths.append(len(audio))
+        return energy_speech_timestamps(audio, vad_options)
+
+    monkeypatch.setattr(vad_module, "get_speech_timestamps", speech_timestamps)
+    monkeypatch.setattr(VadCache, "cache", None)
+    monkeypatch.setattr(STTHandler, "get_model", lambda self: FakeSTTModel())
+    VadCache.clear()
+
+    content = io.BytesIO()
+    with wave.open(content, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(16000)
+        f.writeframes((create_long_audio() * 1000).astype(np.int16).tobytes())
+
+    handler = STTHandler(input_audio=None, stt_config=STTConfig())
+
+    async def transcribe():
+        file = UploadFile(file=io.BytesIO(content.getvalue()), filename="input.wav")
+        return await handler.enqueue_upload(file)
+
+    result = await transcribe()
+    assert len(lengths) > 0
+    assert VadCache.stats()["misses"] == 1
+
+    # 同一个文件再次识别时不再做 vad
+    vad_count = len(lengths)
+    again = await transcribe()
+    assert len(lengths) == vad_count
+    assert VadCache.stats()["hits"] == 1
+    assert again.text == result.text
@@ -0,0 +1,246 @@
+import numpy as np
+import pytest
+
+from modules.core.handler.datacls.stt_model import STTConfig
+from modules.core.models.stt.STTModel import STTModel
+from modules.core.models.stt.STTStreamer import STTStreamer
+from modules.core.models.stt.whisper.whisper_dcls import SttResult, SttSegment, SttWord
+
+SR = 16000
+
+
+class FakeSTTModel(STTModel):
+    """
+    把每段音频识别为 "<音频的值>" ，方便检查输入的是哪一段
+    """
+
+    def __init__(self):
+        super().__init__(model_id="fake")
+
+    def transcribe_to_result(self, audio, config):
+        sr, data = audio
+        value = int(round(data.max() * 10))
+        duration = len(data) / sr
+        return SttResult(
+            segments=[
+                SttSegment(
+                    text=str(value),
+                    start=0.0,
+                    end=duration,
+                    words=[SttWord(start=0.0, end=duration, word=str(value))],
+                )
+            ],
+            language="zh",
+            duration=duration,
+        )
+
+
+class EnergyVadStreamer(STTStreamer):
+    """
+    用能量代替 silero vad ，非 0 的采样都视为语音
+    """
+
+    def get_speech_timestamps(self, audio):
+        speech = np.abs(audio) > 0
+        min_silence = int(0.5 * SR)
+        speeches = []
+        start = None
+        silence = 0
+        for i, is_speech in enumerate(speech):
+            if is_speech:
+                if start is None:
+                    start = i
+                silence = 0
+            elif start is not None:
+                silence += 1
+                if silence >= min_silence:
+                    speeches.append({"start": start, "end": i - silence + 1})
+                    start = None
+        if start is not None:
+            speeches.append({"start": start, "end": len(audio)})
+        return speeches
+
+
+def create_audio():
+    # 1s 静音, 1s 语音(0.3), 1s 静音, 2s 语音(0.5), 1s 静音
+    parts = [
+        np.zeros(SR),
+        np.full(SR, 0.3),
+        np.zeros(SR),
+        np.full(SR * 2, 0.5),
+        np.zeros(SR),
+    ]
+    return np.concatenate(parts).astype(np.float32)
+
+
+def feed_all(streamer: STTStreamer, audio: np.ndarray, frame_size: int = 1600):
+    events = []
+    max_buffer = 0
+    for i in range(0, len(audio), frame_size):
+        events.extend(streamer.feed(audio[i : i + frame_size]))
+        max_buffer = max(max_buffer, len(streamer.buffer))
+    events.extend(streamer.flush())
+    return events, max_buffer
+
+
+@pytest.mark.stt
+def test_stt_streamer_partial_and_final():
+    streamer = EnergyVadStreamer(model=FakeSTTModel(), config=STTConfig())
+    events, _ = feed_all(streamer, create_audio())
+
+    finals = [seg for e in events if e.type == "final" for seg in e.segments]
+    assert [seg.text for seg in finals] == ["3", "5"]
+    assert finals[0].start == pytest.approx(1.0)
+    assert finals[0].end == pytest.approx(2.0)
+    assert finals[1].start == pytest.approx(3.0)
+    assert finals[1].words[0].end == pytest.approx(5.0)
+
+    # 第二句话说完之前，已经有 partial 结果
+    partials = [e for e in events if e.type == "partial"]
+    assert any(e.segments[0].text == "5" for e in partials)
+    index = events.index(next(e for e in events if e.type == "final"))
+    assert any(e.type == "partial" for e in events[:index])
+
+
+@pytest.mark.stt
+def test_stt_streamer_bounded_buffer():
+    streamer = EnergyVadStreamer(
+        model=FakeSTTModel(), config=STTConfig(), max_segment_s=3.0
+    )
+    # 10s 静音之后 10s 不停的语音
+    audio = np.concatenate([np.zeros(SR * 10), np.full(SR * 10, 0.5)]).astype(
+        np.float32
+    )
+    events, max_buffer = feed_all(streamer, audio)
+
+    finals = [seg for e in events if e.type == "final" for seg in e.segments]
+    assert sum(seg.end - seg.start for seg in finals) == pytest.approx(10.0)
+    assert max_buffer < SR * 4
+
+
+@pytest.mark.stt
+def test_stt_streamer_resample():
+    streamer = EnergyVadStreamer(
+        model=FakeSTTModel(), config=STTConfig(), sample_rate=8000
+    )
+    audio = np.concatenate([np.zeros(8000), np.full(8000, 0.5), np.zeros(8000)])
+    events, _ = feed_all(streamer, audio.astype(np.float32), frame_size=800)
+
+    finals = [seg for e in events if e.type == "final" for seg in e.segments]
+    assert len(finals) == 1
+    assert finals[0].start == pytest.approx(1.0, abs=0.01)
+    assert finals[0].end == pytest.approx(2.0, abs=0.01)
+
+
+@pytest.mark.stt
+def test_stt_streamer_whisper_config(monkeypatch):
+    from modules.api.impl.stt_api import StreamTranscriptionsParams
+    from modules.core.models.stt.Whisper import WhisperModel
+
+    model = WhisperModel("whisper.large")
+    fake = FakeSTTModel()
+    calls = []
+
+    def generate_transcribe(audio, config):
+        calls.append(config)
+        return fake.transcribe_to_result(audio, config)
+
+    # 只替换真正调用模型的部分，config 的处理走 WhisperModel.transcribe_to_result
+    monkeypatch.setattr(model, "generate_transcribe", generate_transcribe)
+    monkeypatch.setattr(model, "force_align", None)
+
+    params = StreamTranscriptionsParams()
+    assert params.model == "whisper.large"
+    for config in (params.to_stt_config(), STTConfig(refrence_transcript=None)):
+        streamer = EnergyVadStreamer(model=model, config=config)
+        events, _ = feed_all(streamer, create_audio())
+        finals = [seg for e in events if e.type == "final" for seg in e.segments]
+        assert [seg.text for seg in finals] == ["3", "5"]
+    assert len(calls) > 0
+
+
+@pytest.mark.stt
+def test_ws_close_reason_limit():
+    from modules.api.impl.stt_api import ws_close_reason
+
+    reason = ws_close_reason(Exception("模型加载失败" * 50))
+    assert len(reason.encode("utf-8")) <= 123
+    assert reason.startswith("模型加载失败")
+
+
+class RecordingStreamer(EnergyVadStreamer):
+    """
+    记录每次 vad 和识别输入的音频长度
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.vad_sizes: list[int] = []
+        self.transcribe_sizes: list[int] = []
+        self.feeds = 0
+
+    def get_speech_timestamps(self, audio):
+        self.vad_sizes.append(len(audio))
+        return super().get_speech_timestamps(audio)
+
+    def transcribe(self, start, end):
+        self.transcribe_sizes.append(end - start)
+        return super().transcribe(start, end)
+
+    def feed(self, data):
+        self.feeds += 1
+        return super().feed(data)
+
+
+@pytest.mark.stt
+def test_stt_streamer_bounded_work():
+    streamer = RecordingStreamer(
+        model=FakeSTTModel(), config=STTConfig(), partial_window_s=2.0
+    )
+    # 1s 静音, 12s 不停的语音, 1s 静音
+    audio = np.concatenate([np.zeros(SR), np.full(SR * 12, 0.5), np.zeros(SR)]).astype(
+        np.float32
+    )
+    events, _ = feed_all(streamer, audio)
+
+    finals = [seg for e in events if e.type == "final" for seg in e.segments]
+    assert len(finals) == 1
+    assert finals[0].start == pytest.approx(1.0)
+    assert finals[0].end == pytest.approx(13.0)
+
+    # 说话期间只对新输入的音频和 lookback 做 vad ，句子结束时才对整个 buffer 做一次
+    assert sum(size > SR * 2 for size in streamer.vad_sizes) <= 1
+    # partial 只识别最后 2s ，只有 final 识别整句
+    partials = [size for size in streamer.transcribe_sizes if size > SR * 2]
+    assert partials == [SR * 12]
+
+
+@pytest.mark.stt
+@pytest.mark.asyncio
+async def test_stt_handler_coalesces_frames(monkeypatch):
+    from modules.core.handler import STTHandler as handler_module
+    from modules.core.handler.STTHandler import STTHandler
+
+    streamers: list[RecordingStreamer] = []
+
+    def create_streamer(**kwargs):
+        streamer = RecordingStreamer(**kwargs)
+        streamers.append(streamer)
+        return streamer
+
+    monkeypatch.setattr(STTHandler, "get_model", lambda self: FakeSTTModel())
+    monkeypatch.setattr(handler_module, "STTStreamer", create_streamer)
+
+    audio = create_audio()
+
+    async def frames():
+        for i in range(0, len(audio), 1600):
+            yield audio[i : i + 1600]
+
+    handler = STTHandler(input_audio=None, stt_config=STTConfig())
+    events = [event async for event in handler.enqueue_stream(frames=frames())]
+
+    finals = [seg for e in events if e.type == "final" for seg in e.segments]
+    assert [seg.text for seg in finals] == ["3", "5"]
+    # 识别期间已经收到的帧合并成一次 feed
+    assert streamers[0].feeds < len(audio) // 1600
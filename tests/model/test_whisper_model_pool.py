@@ -0,0 +1,69 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from modules import config
+from modules.core.models.stt.whisper.model_pool import WhisperModelPool
+
+
+@pytest.mark.stt
+def test_whisper_model_pool_limits_concurrency():
+    pool = WhisperModelPool(object(), size=2)
+    lock = threading.Lock()
+    running = 0
+    max_running = 0
+
+    def transcribe(_):
+        nonlocal running, max_running
+        with pool.acquire() as model:
+            assert model is pool.model
+            with lock:
+                running += 1
+                max_running = max(max_running, running)
+            time.sleep(0.05)
+            with lock:
+                running -= 1
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        list(executor.map(transcribe, range(12)))
+
+    assert max_running == 2
+    assert pool.in_use == 0
+
+
+@pytest.mark.stt
+def test_whisper_model_loads_weights_once(monkeypatch):
+    from modules.core.models.stt import Whisper as whisper_module
+    from modules.core.models.stt.Whisper import WhisperModel
+
+    loads = []
+
+    def load_faster_whisper(**kwargs):
+        loads.append(kwargs)
+        return object()
+
+    monkeypatch.setattr(
+        whisper_module.stable_whisper, "load_faster_whisper", load_faster_whisper
+    )
+    monkeypatch.setattr(WhisperModel, "pools", {})
+    monkeypatch.setattr(config.runtime_env_vars, "whisper_workers", 3, raising=False)
+
+    large = WhisperModel("whisper.large")
+    turbo = WhisperModel("whisper.turbo")
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        models = list(executor.map(lambda _: large.load(), range(8)))
+
+    assert len(loads) == 1
+    assert loads[0]["num_workers"] == 3
+    assert all(model is models[0] for model in models)
+    assert large.get_pool().size == 3
+
+    # 不同大小的模型各自加载
+    assert turbo.load() is not models[0]
+    assert len(loads) == 2
+
+    large.unload()
+    assert not large.is_loaded()
+    assert turbo.is_loaded()
@@ -0,0 +1,69 @@
+import pytest
+
+from modules.core.handler.datacls.tts_model import InferConfig
+from modules.core.pipeline.dcls import TTSPipelineContext
+from modules.core.pipeline.generate.Chunker import TTSChunker
+from modules.core.tools.SentenceSplitter import SentenceSplitter
+
+
+def naive_merge(splitter: SentenceSplitter, sentences: list[str]):
+    # 每次都重新 tokenize 合并后的句子 (之前的实现)
+    merged = []
+    temp = ""
+    for sentence in sentences:
+        if splitter.len(temp) + splitter.len(sentence) < splitter.sentence_threshold:
+            temp += SentenceSplitter.SEP_TOKEN + sentence
+        else:
+            merged.append(temp)
+            temp = sentence
+    if temp:
+        merged.append(temp)
+    return merged
+
+
+text = "\n".join(
+    [
+        "今天天气很好！我们去公园散步吧。",
+        "Hello world. How are you? Mr. Smith is fine.",
+        "长句子，没有结束",
+        "",
+        "“你好。”他说。",
+    ]
+    * 20
+)
+
+
+@pytest.mark.parametrize("threshold", [1, 10, 50, 300])
+def test_merge_matches_retokenize(threshold):
+    splitter = SentenceSplitter(
+        threshold=threshold, tokenizer=TTSChunker.tokenizer.encode
+    )
+    sentences = splitter.split_paragraph(text)
+    assert splitter.parse(text) == naive_merge(splitter, sentences)
+
+
+def test_iter_parse_accepts_chunks():
+    splitter = SentenceSplitter(threshold=30)
+    chunks = (text[i : i + 7] for i in range(0, len(text), 7))
+    assert list(splitter.iter_parse(chunks)) == splitter.parse(text)
+
+
+def test_chunker_iter_text_segments():
+    context = TTSPipelineContext(
+        text=text, infer_config=InferConfig(spliter_threshold=30, eos="。")
+    )
+    chunker = TTSChunker(context=context)
+
+    segments = chunker.iter_text_segments()
+    first = next(segments)
+    assert first.text.endswith("。")
+
+    rest = list(segments)
+    assert [seg.text for seg in [first, *rest]] == [
+        seg.text for seg in chunker.text_segments()
+    ]
+
+    lines = iter(text.splitlines(keepends=True))
+    assert [seg.text for seg in chunker.iter_text_segments(lines)] == [
+        seg.text for seg in chunker.text_segments()
+    ]
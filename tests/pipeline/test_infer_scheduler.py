@@ -0,0 +1,130 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from modules.core.handler.datacls.tts_model import InferConfig
+from modules.core.models.TTSModel import TTSModel
+from modules.core.pipeline.dcls import TTSPipelineContext, TTSSegment
+from modules.core.pipeline.generate.BatchGenerate import BatchGenerate
+from modules.core.pipeline.generate.Bucketizer import Bucketizer
+from modules.core.pipeline.generate.dcls import SynthAudio
+from modules.core.pipeline.generate.InferScheduler import InferScheduler
+
+
+class FakeBatchModel(TTSModel):
+    """
+    记录每次 generate_batch 的 batch ，输出长度等于文本长度
+
+    和真实模型一样，context.stop 时提前结束生成，只输出一半
+    """
+
+    def __init__(self, model_id: str) -> None:
+        super().__init__(model_id)
+        self.batches: list[list[str]] = []
+        self.gate = threading.Event()
+        self.entered = threading.Event()
+        self.on_generate = None
+
+    def generate_batch(self, segments: list[TTSSegment], context: TTSPipelineContext):
+        self.entered.set()
+        self.gate.wait(timeout=5)
+        self.batches.append([seg.text for seg in segments])
+        if self.on_generate is not None:
+            self.on_generate(segments)
+        return [
+            (
+                24000,
+                np.full(
+                    len(seg.text) // 2 if context.stop else len(seg.text),
+                    0.1,
+                    dtype=np.float32,
+                ),
+            )
+            for seg in segments
+        ]
+
+
+def create_generator(model: TTSModel, texts: list[str], seed=42):
+    context = TTSPipelineContext(infer_config=InferConfig(batch_size=4, seed=seed))
+    segments = [
+        SynthAudio(TTSSegment(_type="audio", text=text, infer_seed=seed))
+        for text in texts
+    ]
+    buckets = Bucketizer(segments=segments).build_buckets()
+    return segments, BatchGenerate(buckets=buckets, context=context, model=model)
+
+
+def run_merged(model: FakeBatchModel, generators: list[BatchGenerate]):
+    """
+    先用一个请求占住调度线程，等 generators 的 segment 都进入队列之后再放行，
+    保证它们被合并到同一个 batch
+    """
+    _, blocker = create_generator(model, ["z"])
+    threads = [threading.Thread(target=blocker.generate)]
+    threads[0].start()
+    assert model.entered.wait(timeout=5)
+
+    scheduler = InferScheduler.get_scheduler(model)
+    total = sum([len(b.segments) for gen in generators for b in gen.buckets])
+    for gen in generators:
+        thread = threading.Thread(target=gen.generate)
+        thread.start()
+        threads.append(thread)
+    deadline = time.monotonic() + 5
+    while len(scheduler.pending) < total and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(scheduler.pending) == total
+
+    model.gate.set()
+    for t in threads:
+        t.join(timeout=10)
+
+
+@pytest.mark.scheduler
+def test_scheduler_merges_requests():
+    model = FakeBatchModel("fake-scheduler-merge")
+    segs1, gen1 = create_generator(model, ["a", "bb"])
+    segs2, gen2 = create_generator(model, ["ccc", "dddd"])
+
+    run_merged(model, [gen1, gen2])
+
+    assert gen1.is_done() and gen2.is_done()
+    assert [seg.data.size for seg in segs1] == [1, 2]
+    assert [seg.data.size for seg in segs2] == [3, 4]
+    # 两个请求的 segment 在同一个 batch 中
+    assert ["a", "bb", "ccc", "dddd"] in [sorted(b) for b in model.batches]
+    assert all([len(batch) <= 4 for batch in model.batches])
+
+
+@pytest.mark.scheduler
+def test_scheduler_stop_does_not_truncate_other_requests():
+    model = FakeBatchModel("fake-scheduler-stop")
+    segs1, gen1 = create_generator(model, ["aaaa", "bbbb"])
+    segs2, gen2 = create_generator(model, ["cccc", "dddd"])
+
+    def stop_first(segments):
+        # 合并的 batch 推理过程中，第一个请求的客户端断开
+        if len(segments) > 2:
+            gen1.context.stop = True
+
+    model.on_generate = stop_first
+    run_merged(model, [gen1, gen2])
+
+    assert len(model.batches[-1]) == 4
+    assert gen2.is_done()
+    assert [seg.data.size for seg in segs2] == [4, 4]
+
+
+@pytest.mark.scheduler
+def test_scheduler_keeps_incompatible_apart():
+    model = FakeBatchModel("fake-scheduler-split")
+    model.gate.set()
+    _, gen1 = create_generator(model, ["a"], seed=1)
+    _, gen2 = create_generator(model, ["b"], seed=2)
+
+    gen1.generate()
+    gen2.generate()
+
+    assert model.batches == [["a"], ["b"]]
@@ -1,8 +1,11 @@
+import numpy as np
 import pytest
+from pydub import AudioSegment, effects
 
 from modules.core.handler.datacls.audio_model import AdjustConfig
 from modules.core.pipeline.dcls import TTSPipelineContext
 from modules.core.pipeline.factory import PipelineFactory
+from modules.utils import audio_utils
 from tests.pipeline.misc import load_audio, save_audio
 
 
@@ -35,3 +38,79 @@ def test_process_audio():
     )
     # 检查文件不为空
     assert load_audio(out_audio_path)[1].size != 0
+
+
+def make_tone(sr=24000, seconds=1.0, amplitude=0.3):
+    t = np.arange(int(sr * seconds)) / sr
+    return (np.sin(2 * np.pi * 220 * t) * amplitude).astype(np.float32)
+
+
+@pytest.mark.post_process
+@pytest.mark.parametrize("headroom", [0.1, 1, 6])
+def test_normalize_np_matches_pydub(headroom):
+    audio = make_tone()
+    segment = audio_utils.ndarray_to_segment(audio, 24000)
+    _, expected = audio_utils.pydub_to_np(
+        effects.normalize(seg=segment, headroom=headroom)
+    )
+    _, actual = audio_utils.apply_normalize(audio, headroom=headroom, sr=24000)
+
+    assert actual.dtype == np.float32
+    assert actual.shape == expected.shape
+    # pydub 的输入和输出都量化到 int16 ，允许几个 lsb 的误差
+    assert np.abs(actual - expected).max() < 4 / 32768
+
+
+@pytest.mark.post_process
+def test_normalize_np_in_place():
+    audio = make_tone()
+    out = audio_utils.normalize_np(audio, headroom=1, out=audio)
+    assert out is audio
+    assert np.isclose(np.abs(audio).max(), 10 ** (-1 / 20))
+
+
+@pytest.mark.post_process
+def test_silence_and_channels_np():
+    sr, silence = audio_utils.silence_np(duration_s=0.3, sample_rate=24000)
+    expected = AudioSegment.silent(duration=300, frame_rate=24000)
+    assert sr == 24000
+    assert silence.dtype == np.float32
+    assert silence.size == int(expected.frame_count())
+    assert not silence.any()
+
+    audio = make_tone()
+    stereo = audio_utils.to_stereo_np(audio)
+    assert stereo.shape == (audio.size, 2)
+    assert np.array_equal(audio_utils.to_mono_np(stereo), audio)
+
+
+@pytest.mark.post_process
+@pytest.mark.parametrize(
+    "adjust_config, stages",
+    [
+        (AdjustConfig(normalize=False), []),
+        (AdjustConfig(normalize=True), ["normalize"]),
+        (AdjustConfig(normalize=True, volume_gain_db=3), ["normalize+gain"]),
+        (
+            AdjustConfig(normalize=True, volume_gain_db=3, speed_rate=1.5),
+            ["normalize+gain", "AdjusterProcessor"],
+        ),
+        (AdjustConfig(normalize=False, volume_gain_db=3), ["AdjusterProcessor"]),
+    ],
+)
+def test_post_process_plan(adjust_config, stages):
+    audio = make_tone(sr=44100)
+    pipe0 = PipelineFactory.create_postprocess_pipeline(
+        audio=(44100, audio),
+        ctx=TTSPipelineContext(adjust_config=adjust_config),
+    )
+    plan = pipe0.get_plan()
+    assert [stage.name for stage in plan.stages] == stages
+
+    audio_sr, audio_data = pipe0.generate()
+    assert audio_sr == 44100
+    assert "resample" not in plan.ran
+    if stages == ["normalize+gain"]:
+        assert np.isclose(np.abs(audio_data).max(), 10 ** ((3 - 1) / 20), atol=1e-4)
+    if stages == []:
+        assert np.array_equal(audio_data, audio)
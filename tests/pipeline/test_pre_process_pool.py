@@ -0,0 +1,65 @@
+import threading
+
+import numpy as np
+import pytest
+
+from modules.core.handler.datacls.tts_model import InferConfig
+from modules.core.models.TTSModel import TTSModel
+from modules.core.pipeline.dcls import TTSPipelineContext, TTSSegment
+from modules.core.pipeline.generate.BatchGenerate import BatchGenerate
+from modules.core.pipeline.generate.Bucketizer import Bucketizer
+from modules.core.pipeline.generate.dcls import SynthAudio
+from modules.core.pipeline.processor import SegmentProcessor
+
+
+class FakeModel(TTSModel):
+    def __init__(self, model_id: str) -> None:
+        super().__init__(model_id)
+        self.batches: list[list[str]] = []
+        self.first_batch = threading.Event()
+
+    def generate_batch(self, segments: list[TTSSegment], context: TTSPipelineContext):
+        self.batches.append([seg.text for seg in segments])
+        self.first_batch.set()
+        return [
+            (24000, np.full(len(seg.text), 0.1, dtype=np.float32)) for seg in segments
+        ]
+
+
+class UpperTN(SegmentProcessor):
+    """
+    第一个 batch 之后的 segment 要等到第一个 batch 开始推理才能处理完，
+    如果推理要等全部 TN 完成，这里会超时
+    """
+
+    text_only = True
+
+    def __init__(self, model: FakeModel, batch_size: int) -> None:
+        self.model = model
+        self.batch_size = batch_size
+        self.pipelined = True
+
+    def pre_process(self, segment: TTSSegment, context: TTSPipelineContext):
+        if int(segment.text.split("-")[1]) >= self.batch_size:
+            self.pipelined &= self.model.first_batch.wait(timeout=5)
+        segment.text = segment.text.upper()
+        return segment
+
+
+@pytest.mark.pre_process
+def test_tn_pipelined_with_inference():
+    model = FakeModel("fake-pre-process")
+    tn = UpperTN(model=model, batch_size=2)
+    context = TTSPipelineContext(infer_config=InferConfig(batch_size=2), modules=[tn])
+    texts = [f"s-{i}" for i in range(6)]
+    segments = [SynthAudio(TTSSegment(_type="audio", text=text)) for text in texts]
+    buckets = Bucketizer(segments=segments).build_buckets()
+    generator = BatchGenerate(buckets=buckets, context=context, model=model)
+
+    # 不经过 InferScheduler ，保证 batch 划分是确定的
+    generator.use_scheduler = lambda: False
+    generator.generate()
+
+    assert tn.pipelined
+    assert model.batches == [["S-0", "S-1"], ["S-2", "S-3"], ["S-4", "S-5"]]
+    assert [seg.seg.text for seg in segments] == [text.upper() for text in texts]
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from scipy.signal import resample_poly
+
+from modules.core.models.AudioReshaper import AudioReshaper
+from modules.core.pipeline.plan import PostProcessPlan
+from modules.utils import resampler
+
+
+def make_noise(size, seed=0):
+    return np.random.default_rng(seed).normal(0, 0.3, size).astype(np.float32)
+
+
+@pytest.mark.parametrize(
+    "src_sr, dst_sr", [(22050, 24000), (24000, 44100), (44100, 16000)]
+)
+def test_resample_matches_scipy(src_sr, dst_sr):
+    data = make_noise(src_sr + 123)
+    out = resampler.resample(data, src_sr=src_sr, dst_sr=dst_sr)
+
+    r = resampler.get_resampler(src_sr, dst_sr)
+    expected = resample_poly(data, r.up, r.down, window=r.filter)
+    assert out.dtype == np.float32
+    assert out.size == r.output_size(data.size)
+    assert np.allclose(out, expected, atol=1e-6)
+
+
+def test_get_resampler_cached():
+    assert resampler.get_resampler(24000, 16000) is resampler.get_resampler(
+        24000, 16000
+    )
+    assert resampler.get_resampler(24000, 16000) is not resampler.get_resampler(
+        24000, 16000, "high"
+    )
+
+
+@pytest.mark.parametrize(
+    "src_sr, dst_sr", [(22050, 24000), (24000, 44100), (44100, 16000)]
+)
+@pytest.mark.parametrize("chunk", [1, 997, 2400])
+def test_stream_resampler_matches_full(src_sr, dst_sr, chunk):
+    data = make_noise(src_sr // 2 + 7)
+    stream = AudioReshaper.create_stream_resampler(sr=src_sr, target_sr=dst_sr)
+    outputs = [stream.push(data[i : i + chunk]) for i in range(0, data.size, chunk)]
+    outputs.append(stream.flush())
+    out = np.concatenate(outputs)
+
+    _, expected = AudioReshaper.resample_audio((src_sr, data), target_sr=dst_sr)
+    assert out.size == expected.size
+    assert np.allclose(out, expected, atol=1e-5)
+
+
+def test_resample_keeps_frequency():
+    t = np.arange(24000) / 24000
+    data = np.sin(2 * np.pi * 440 * t).astype(np.float32)
+    sr, out = AudioReshaper.resample_audio((24000, data), target_sr=16000)
+
+    assert sr == 16000
+    spectrum = np.abs(np.fft.rfft(out * np.hanning(out.size)))
+    assert abs(np.argmax(spectrum) * sr / out.size - 440) < 2
+
+
+def test_plan_stream_resample_matches_full():
+    data = make_noise(24000)
+    plan = PostProcessPlan(stages=[], target_sr=44100)
+    outputs = []
+    for i in range(0, data.size, 2400):
+        audio = plan.process_chunk((24000, data[i : i + 2400]))
+        if audio is not None:
+            assert audio[0] == 44100
+            outputs.append(audio[1])
+    outputs.append(plan.flush()[1])
+    out = np.concatenate(outputs)
+
+    _, expected = PostProcessPlan(stages=[], target_sr=44100).run((24000, data))
+    assert out.size == expected.size
+    assert np.allclose(out, expected, atol=1e-5)
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from modules.core.pipeline.processors.Streaming import (
+    LookaheadLimiter,
+    OverlapAddStream,
+    StreamNormalizer,
+)
+from modules.utils import audio_utils
+
+
+def make_speech_like(sr=24000, seconds=3.0, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(sr * seconds)) / sr
+    envelope = 0.2 + 0.8 * np.abs(np.sin(2 * np.pi * 1.5 * t))
+    audio = np.sin(2 * np.pi * 220 * t) * envelope * 0.6
+    audio += rng.normal(0, 0.01, audio.size)
+    return audio.astype(np.float32)
+
+
+def run_stream(stream, audio, sr=24000, chunk=2400):
+    outputs = []
+    for start in range(0, audio.size, chunk):
+        _, data = stream.process_chunk((sr, audio[start : start + chunk]))
+        outputs.append(data)
+    rest = stream.flush()
+    if rest is not None:
+        outputs.append(rest[1])
+    return np.concatenate(outputs)
+
+
+@pytest.mark.post_process
+def test_limiter_stream_matches_full():
+    audio = make_speech_like() * 2
+    full = run_stream(
+        LookaheadLimiter(threshold=0.9, sample_rate=24000), audio, chunk=audio.size
+    )
+    chunked = run_stream(LookaheadLimiter(threshold=0.9, sample_rate=24000), audio)
+
+    assert full.size == audio.size
+    assert chunked.size == audio.size
+    assert np.abs(chunked).max() <= 0.9 + 1e-6
+    assert np.allclose(full, chunked, atol=1e-5)
+
+
+@pytest.mark.post_process
+def test_stream_normalizer():
+    audio = make_speech_like()
+    stream = StreamNormalizer(headroom=1)
+    out = run_stream(stream, audio)
+
+    assert out.size == audio.size
+    assert np.abs(out).max() <= 10 ** (-1 / 20) + 1e-6
+    # 峰值稳定之后和非流式的归一化结果一致
+    expected = audio_utils.normalize_np(audio, headroom=1)
+    ratio = np.abs(out[-12000:]).max() / np.abs(expected[-12000:]).max()
+    assert abs(ratio - 1) < 0.03
+
+
+@pytest.mark.post_process
+def test_overlap_add_identity():
+    audio = make_speech_like()
+    stream = OverlapAddStream(lambda audio: audio)
+    out = run_stream(stream, audio)
+
+    assert out.size == audio.size
+    assert np.allclose(out, audio, atol=1e-6)
+
+
+@pytest.mark.post_process
+def test_overlap_add_stretch_length():
+    audio = make_speech_like()
+
+    def stretch(audio):
+        sr, data = audio
+        x = np.linspace(0, data.size - 1, data.size * 2)
+        return sr, np.interp(x, np.arange(data.size), data).astype(np.float32)
+
+    out = run_stream(OverlapAddStream(stretch), audio)
+    assert abs(out.size - audio.size * 2) <= 2400
@@ -0,0 +1,102 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from modules.core.handler.datacls.tts_model import InferConfig
+from modules.core.models.TTSModel import TTSModel
+from modules.core.pipeline.dcls import TTSPipelineContext, TTSSegment
+from modules.core.pipeline.generate.BatchSynth import BatchSynth
+from modules.core.pipeline.generate.dcls import SynthAudio
+from modules.core.pipeline.generate.SynthSteamer import SynthStreamer
+
+
+def create_streamer(num_segments: int):
+    segments = [
+        SynthAudio(TTSSegment(_type="audio", text=str(i)))
+        for i in range(num_segments)
+    ]
+    streamer = SynthStreamer(
+        segments=segments, context=TTSPipelineContext(), model=None
+    )
+    return segments, streamer
+
+
+@pytest.mark.streamer
+def test_streamer_reads_only_new_samples():
+    segments, streamer = create_streamer(2)
+
+    segments[0].append(np.ones(3))
+    first = streamer.read()
+    assert first.dtype == np.float32
+    assert first.tolist() == [1, 1, 1]
+
+    # 第二个 segment 在第一个结束前不会被读取
+    segments[1].append(np.full(2, 3, dtype=np.float32))
+    segments[0].append(np.full(2, 2, dtype=np.float32))
+    assert streamer.read().tolist() == [2, 2]
+
+    segments[0].done = True
+    assert streamer.read().tolist() == [3, 3]
+
+    segments[1].done = True
+    assert streamer.read().size == 0
+
+
+@pytest.mark.streamer
+def test_streamer_reads_whole_data():
+    segments, streamer = create_streamer(2)
+    segments[0].data = np.arange(4, dtype=np.float64)
+    segments[1].data = np.arange(2, dtype=np.float32)
+    for seg in segments:
+        seg.done = True
+
+    data = streamer.read()
+    assert data.dtype == np.float32
+    assert data.tolist() == [0, 1, 2, 3, 0, 1]
+
+
+class FakeStreamModel(TTSModel):
+    def generate_batch_stream(self, segments, context):
+        for _ in range(3):
+            yield [(24000, np.ones(4, dtype=np.float32)) for _ in segments]
+
+
+@pytest.mark.streamer
+@pytest.mark.asyncio
+async def test_batch_synth_pushes_chunks():
+    context = TTSPipelineContext(infer_config=InferConfig(stream=True))
+    synth = BatchSynth(
+        input_segments=[TTSSegment(_type="audio", text="a")],
+        context=context,
+        model=FakeStreamModel("fake-stream"),
+    )
+    synth.bind_loop(asyncio.get_running_loop(), stream=True)
+    synth.start_generate()
+
+    received = 0
+    while True:
+        data = await synth.next_chunk(timeout=5)
+        if data is None:
+            break
+        received += data.size
+    assert received == 12
+
+
+@pytest.mark.streamer
+def test_synth_audio_data_concatenates_once():
+    audio = SynthAudio(TTSSegment(_type="audio", text="a"))
+    assert audio.data.size == 0
+
+    audio.append(np.ones(2))
+    audio.append(np.full(3, 2, dtype=np.float32))
+    data = audio.data
+    assert data.tolist() == [1, 1, 2, 2, 2]
+    # 没有新的 chunk 时直接返回同一个数组
+    assert audio.data is data
+
+    audio.append(np.full(1, 3, dtype=np.float32))
+    assert audio.data.tolist() == [1, 1, 2, 2, 2, 3]
+
+    audio.data = np.zeros(2)
+    assert audio.data.tolist() == [0, 0]
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from modules.utils import time_stretch
+
+SR = 24000
+
+
+def make_tone(freq=220, seconds=1.0, sr=SR):
+    t = np.arange(int(sr * seconds)) / sr
+    return (np.sin(2 * np.pi * freq * t) * 0.5).astype(np.float32)
+
+
+def dominant_freq(audio, sr=SR):
+    spectrum = np.abs(np.fft.rfft(audio * np.hanning(audio.size)))
+    return np.argmax(spectrum) * sr / audio.size
+
+
+@pytest.mark.parametrize("rate", [0.5, 0.8, 1.25, 2.0])
+def test_time_stretch_keeps_pitch(rate):
+    audio = make_tone()
+    out = time_stretch.time_stretch(audio, rate=rate, sr=SR)
+
+    assert out.dtype == np.float32
+    assert out.size == round(audio.size / rate)
+    assert abs(dominant_freq(out) - 220) < 5
+    # 稳态部分的幅度不变
+    middle = out[out.size // 4 : out.size * 3 // 4]
+    assert abs(np.abs(middle).max() - 0.5) < 0.05
+
+
+def test_time_stretch_batch_matches_single():
+    audios = [make_tone(freq, seconds) for freq, seconds in [(150, 0.3), (300, 1.2)]]
+    rates = [1.5, 0.7]
+    batch = time_stretch.time_stretch_batch(audios + [audios[0]], rates + [1], sr=SR)
+
+    for audio, rate, out in zip(audios, rates, batch):
+        assert np.allclose(out, time_stretch.time_stretch(audio, rate, sr=SR))
+    # rate 为 1 的原样返回
+    assert np.array_equal(batch[2], audios[0])
+
+
+@pytest.mark.parametrize("rate", [0.75, 1.5])
+def test_wsola_stream_matches_batch(rate):
+    audio = make_tone(seconds=1.5)
+    stream = time_stretch.WsolaStream(rate=rate, sr=SR)
+    outputs = [stream.push(audio[i : i + 2400]) for i in range(0, audio.size, 2400)]
+    outputs.append(stream.flush())
+    out = np.concatenate(outputs)
+
+    expected = time_stretch.time_stretch(audio, rate=rate, sr=SR)
+    assert out.size == expected.size
+    assert np.allclose(out, expected, atol=1e-5)
+
+
+@pytest.mark.parametrize("n_steps", [-5, 4])
+def test_pitch_shift(n_steps):
+    audio = make_tone()
+    out = time_stretch.pitch_shift(audio, sr=SR, n_steps=n_steps)
+
+    assert out.size == audio.size
+    expected_freq = 220 * 2 ** (n_steps / 12)
+    assert abs(dominant_freq(out) - expected_freq) < 5
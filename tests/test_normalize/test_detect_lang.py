@@ -0,0 +1,57 @@
+import pytest
+
+from modules.utils.detect_lang import (
+    count_scripts,
+    guess_lang,
+    guess_lang_batch,
+    identify_langs,
+)
+
+
+@pytest.mark.normalize
+def test_guess_lang_batch_matches_guess_lang():
+    texts = ["你好", "hello", "ChatTTS是模型", "123，。", "", "Ça va", "ひらがな"]
+    assert guess_lang_batch(texts) == [guess_lang(text) for text in texts]
+
+
+@pytest.mark.normalize
+def test_count_scripts():
+    counts = count_scripts(["ab中", "", "日本語のテキスト"])
+    assert counts.shape[0] == 3
+    assert counts[0].sum() == 3
+    assert counts[1].sum() == 0
+    assert counts[2].sum() == 8
+
+
+@pytest.mark.normalize
+@pytest.mark.parametrize(
+    "text, zh_or_en, lang",
+    [
+        ("今天天气很好", "zh", "zh"),
+        ("The weather is nice today", "en", "en"),
+        ("日本語のテキストです", "zh", "ja"),
+        ("안녕하세요", "zh", "ko"),
+        ("Привет мир", "zh", "ru"),
+    ],
+)
+def test_identify_langs(text, zh_or_en, lang):
+    [(guessed, detected)] = identify_langs([text])
+    assert guessed == zh_or_en
+    assert max(detected, key=detected.get) == lang
+
+
+@pytest.mark.normalize
+def test_identify_langs_fallback():
+    text = "ChatTTS是一个模型 for dialogue"
+    [(_, detected)] = identify_langs([text], threshold=0.0)
+    assert set(detected) == {"zh", "en"}
+
+    # 置信度低于 threshold 时使用 langdetect 的结果
+    [(_, detected)] = identify_langs([text], threshold=1.0)
+    assert all(isinstance(prob, float) for prob in detected.values())
+    assert identify_langs([text], threshold=1.0) == [("zh", detected)]
+
+
+@pytest.mark.normalize
+def test_identify_langs_without_letters():
+    assert identify_langs(["123，。"]) == [("zh", {"zh": 1.0, "en": 0.0})]
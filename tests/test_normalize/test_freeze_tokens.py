@@ -0,0 +1,40 @@
+import pytest
+
+from modules.core.tn.TNPipeline import TNPipeline
+
+
+def split(text: str, freeze_tokens: list[str]):
+    texts = TNPipeline().split_string_with_freeze(text, freeze_tokens)
+    return [(t.text, t.type) for t in texts]
+
+
+@pytest.mark.normalize
+@pytest.mark.parametrize(
+    "text, freeze_tokens, expected",
+    [
+        ("abc", [], [("abc", "normal")]),
+        (
+            "你好[laugh]世界[uv_break]",
+            ["[uv_break]", "[laugh]"],
+            [
+                ("你好", "normal"),
+                ("[laugh]", "freeze"),
+                ("世界", "normal"),
+                ("[uv_break]", "freeze"),
+            ],
+        ),
+        # 最早结束的 token 优先
+        (
+            "xabcd",
+            ["abcd", "bc"],
+            [("xa", "normal"), ("bc", "freeze"), ("d", "normal")],
+        ),
+        # 同一位置结束时，列表中靠前的优先
+        ("xabc", ["bc", "abc"], [("xa", "normal"), ("bc", "freeze")]),
+        ("xabc", ["abc", "bc"], [("x", "normal"), ("abc", "freeze")]),
+        # 切分后 token 不会跨过切分位置
+        ("aab", ["aa", "ab"], [("", "normal"), ("aa", "freeze"), ("b", "normal")]),
+    ],
+)
+def test_split_string_with_freeze(text, freeze_tokens, expected):
+    assert split(text, freeze_tokens) == expected
@@ -0,0 +1,64 @@
+import pytest
+
+from modules.core.handler.datacls.tn_model import TNConfig
+from modules.core.tn.TNPipeline import GuessLang, TNPipeline
+
+
+def create_pipeline():
+    pipeline = TNPipeline()
+    calls = []
+
+    @pipeline.block()
+    def upper(text: str, guess_lang: GuessLang):
+        calls.append(text)
+        return text.upper()
+
+    @pipeline.block(enabled=False)
+    def exclaim(text: str, guess_lang: GuessLang):
+        return text + "!"
+
+    return pipeline, calls
+
+
+@pytest.mark.normalize
+def test_tn_cache_hit():
+    TNPipeline.clear_cache()
+    pipeline, calls = create_pipeline()
+
+    assert pipeline.normalize("hello") == "HELLO"
+    assert pipeline.normalize("hello") == "HELLO"
+    assert calls == ["hello"]
+
+    stats = pipeline.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert {block["name"] for block in stats["blocks"]} == {"guess_langs", "upper"}
+    assert all(block["calls"] == 1 for block in stats["blocks"])
+
+
+@pytest.mark.normalize
+def test_tn_cache_keyed_by_blocks():
+    TNPipeline.clear_cache()
+    pipeline, calls = create_pipeline()
+
+    assert pipeline.normalize("hello") == "HELLO"
+    assert pipeline.normalize("hello", TNConfig(enabled=["exclaim"])) == "HELLO!"
+    assert pipeline.normalize("hello", TNConfig(disabled=["upper"])) == "hello"
+    assert pipeline.normalize("hello", TNConfig(enabled=["exclaim"])) == "HELLO!"
+    assert pipeline.stats()["hits"] == 1
+
+    pipeline.remove_block("upper")
+    assert pipeline.normalize("hello") == "hello"
+
+
+@pytest.mark.normalize
+def test_tn_cache_separates_clones():
+    TNPipeline.clear_cache()
+    pipeline, calls = create_pipeline()
+    cloned = pipeline.clone()
+    cloned.freeze_tokens = ["[x]"]
+
+    assert pipeline.normalize("a[x]b") == "A[X]B"
+    assert cloned.normalize("a[x]b") == "A\n[x]\nB"
+    assert cloned.stats()["misses"] == 1
+    assert cloned.stats()["hits"] == 0